@@ -0,0 +1,318 @@
+# Copyright 2015-2019 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = 'Copyright 2015-2019 Altova GmbH'
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+
+# Downloads remote documents into a local mirror used by the testsuite runner scripts (dqc_testsuite.py, dqc_testsuite_xule.py,
+# dqc_testsuite_xule_travis.py) and creates the XML catalog mapping the remote URLs to the mirrored files.
+#
+# Documents are fetched concurrently over pooled keep-alive HTTP(S) connections and retried on transient errors. The content of
+# each document is stored once under .objects/<sha256> in the mirror directory and linked to <netloc>/<path>, the layout the
+# catalogs have always used. The ETag and Last-Modified headers are kept in .index.json, so that later runs only revalidate
+# documents with conditional requests instead of downloading them again.
+#
+# The ArchiveCache keeps the zip archives referenced by the variations in the same mirror and reads the member names of each
+# archive only once per run.
+
+import concurrent.futures
+import hashlib
+import http.client
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import zipfile
+
+catalog_template = """<?xml version='1.0' encoding='UTF-8'?>
+<catalog xmlns='urn:oasis:names:tc:entity:xmlns:xml:catalog' xmlns:xsi='http://www.w3.org/2001/XMLSchema-instance' xsi:schemaLocation='urn:oasis:names:tc:entity:xmlns:xml:catalog Catalog.xsd'>
+%(mappings)s
+</catalog>
+"""
+uri_mapping_template = """<uri name="%(source)s" uri="%(target)s"/>"""
+
+
+class DownloadError(Exception):
+    """Raised if a document cannot be downloaded."""
+
+
+def xml_attr_escape(value):
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;')
+
+
+class ConnectionPool:
+    """Keeps idle keep-alive connections per (scheme, host) for reuse by subsequent requests."""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, scheme, netloc):
+        with self.lock:
+            connections = self.idle.get((scheme, netloc))
+            if connections:
+                return connections.pop()
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def release(self, scheme, netloc, connection):
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(connection)
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle = {}
+
+
+class Downloader:
+    """Concurrent downloader storing documents in a content-addressed local mirror."""
+
+    def __init__(self, target_dir, max_workers=8, retries=3, timeout=60, revalidate=True):
+        self.target_dir = target_dir
+        self.objects_dir = os.path.join(target_dir, '.objects')
+        self.index_path = os.path.join(target_dir, '.index.json')
+        self.max_workers = max_workers
+        self.retries = retries
+        self.revalidate = revalidate
+        self.pool = ConnectionPool(timeout)
+        self.lock = threading.Lock()
+        self.url_locks = {}
+        self.index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                logging.warning('Ignoring invalid download index %s', self.index_path)
+
+    def mirror_path(self, url):
+        """Returns the path of the mirrored document in the <netloc>/<path> layout."""
+        url_parts = urllib.parse.urlparse(url)
+        path = url_parts.path[1:] if url_parts.path.startswith('/') else url_parts.path
+        return os.path.join(self.target_dir, url_parts.netloc, *path.split('/'))
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _url_lock(self, url):
+        with self.lock:
+            return self.url_locks.setdefault(url, threading.Lock())
+
+    def _request(self, url, headers):
+        """Performs a GET request following redirects and returns (status, response headers, temporary file, digest); the body of 200 responses is streamed into the temporary file."""
+        for _ in range(10):
+            url_parts = urllib.parse.urlsplit(url)
+            path = urllib.parse.urlunsplit(('', '', url_parts.path or '/', url_parts.query, ''))
+            connection = self.pool.acquire(url_parts.scheme, url_parts.netloc)
+            try:
+                connection.request('GET', path, headers=dict(headers, **{'Accept-Encoding': 'identity'}))
+                response = connection.getresponse()
+                if response.status in (301, 302, 303, 307, 308):
+                    response.read()
+                    location = response.getheader('Location')
+                    self.pool.release(url_parts.scheme, url_parts.netloc, connection)
+                    if not location:
+                        raise DownloadError('Redirect without location for %s' % url)
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                tmp, digest = None, None
+                if response.status == 200:
+                    os.makedirs(self.objects_dir, exist_ok=True)
+                    h = hashlib.sha256()
+                    fd, tmp = tempfile.mkstemp(dir=self.objects_dir, prefix='.download-')
+                    with os.fdopen(fd, 'wb') as f:
+                        for chunk in iter(lambda: response.read(1 << 16), b''):
+                            h.update(chunk)
+                            f.write(chunk)
+                    digest = h.hexdigest()
+                else:
+                    response.read()
+                result = response.status, response, tmp, digest
+                if response.will_close:
+                    connection.close()
+                else:
+                    self.pool.release(url_parts.scheme, url_parts.netloc, connection)
+                return result
+            except BaseException:
+                connection.close()
+                raise
+        raise DownloadError('Too many redirects for %s' % url)
+
+    def _store(self, url, tmp, digest):
+        """Moves the downloaded file into the content-addressed store and links it to its mirror path."""
+        object_path = self.object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            os.remove(tmp)
+        else:
+            os.replace(tmp, object_path)
+        self._link(object_path, self.mirror_path(url))
+
+    def _link(self, object_path, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '%s.tmp%d-%d' % (path, os.getpid(), threading.get_ident())
+        try:
+            os.link(object_path, tmp)
+        except OSError:
+            shutil.copyfile(object_path, tmp)
+        os.replace(tmp, path)
+
+    def fetch(self, url):
+        """Downloads the url into the mirror unless an up-to-date copy exists and returns the path of the mirrored document."""
+        path = self.mirror_path(url)
+        with self._url_lock(url):
+            with self.lock:
+                entry = self.index.get(url)
+            if entry and os.path.exists(self.object_path(entry['sha256'])):
+                if not os.path.exists(path):
+                    self._link(self.object_path(entry['sha256']), path)
+                if not self.revalidate:
+                    return path
+            else:
+                entry = None
+
+            headers = {}
+            if entry and entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry and entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+            for attempt in range(self.retries + 1):
+                try:
+                    status, response, tmp, digest = self._request(url, headers)
+                except (OSError, http.client.HTTPException) as e:
+                    status, error = None, e
+                else:
+                    if status == 304 and entry:
+                        logging.info('Not modified %s', url)
+                        return path
+                    if status == 200:
+                        logging.info('Downloaded %s => %s', url, path)
+                        self._store(url, tmp, digest)
+                        with self.lock:
+                            self.index[url] = {
+                                'sha256': digest,
+                                'etag': response.getheader('ETag'),
+                                'last_modified': response.getheader('Last-Modified'),
+                            }
+                        return path
+                    error = DownloadError('HTTP status %d for %s' % (status, url))
+                    if status < 500 and status != 429:
+                        break
+                if attempt < self.retries:
+                    time.sleep(0.5 * 2 ** attempt)
+            raise DownloadError('Failed to download %s: %s' % (url, error))
+
+    def fetch_all(self, urls):
+        """Downloads all urls concurrently and returns a dict mapping each successfully mirrored url to its local path."""
+        paths = {}
+        urls = sorted(set(urls))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch, url): url for url in urls}
+            for future in concurrent.futures.as_completed(futures):
+                url = futures[future]
+                try:
+                    paths[url] = future.result()
+                except DownloadError as e:
+                    logging.error('%s', e)
+                except Exception:
+                    logging.exception('Exception raised while downloading %s:', url)
+        self.save_index()
+        return paths
+
+    def save_index(self):
+        os.makedirs(self.target_dir, exist_ok=True)
+        with self.lock:
+            # Several worker processes may share the mirror, so each one writes its own temporary file
+            fd, tmp = tempfile.mkstemp(dir=self.target_dir, prefix='.index-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.index, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.index_path)
+
+    def write_catalog(self, catalog_path, paths):
+        """Writes an XML catalog mapping the urls to their mirrored files relative to the catalog location."""
+        catalog_dir = os.path.dirname(os.path.abspath(catalog_path))
+        lines = []
+        for url, path in sorted(paths.items()):
+            target = urllib.request.pathname2url(os.path.relpath(path, catalog_dir))
+            lines.append(uri_mapping_template % {'source': xml_attr_escape(url), 'target': xml_attr_escape(target)})
+        os.makedirs(catalog_dir, exist_ok=True)
+        with open(catalog_path, 'w') as f:
+            f.write(catalog_template % {'mappings': '\n  '.join(lines)})
+
+    def close(self):
+        self.pool.close()
+
+
+class ArchiveCache:
+    """Per-run cache of zip archives which are downloaded once into the mirror and whose member names are read only once."""
+
+    def __init__(self, target_dir):
+        self.downloader = Downloader(target_dir, max_workers=1, revalidate=False)
+        self.lock = threading.Lock()
+        self.uri_locks = {}
+        self.member_uris = {}
+
+    def archive_path(self, uri):
+        """Returns the local path of the archive, downloading remote archives into the mirror unless they are already present."""
+        url_parts = urllib.parse.urlparse(uri)
+        if url_parts.scheme == 'file':
+            return urllib.request.url2pathname(url_parts.path)
+        if not url_parts.scheme or len(url_parts.scheme) == 1:
+            return uri
+        path = self.downloader.fetch(uri)
+        self.downloader.save_index()
+        return path
+
+    def member_uri(self, uri, select):
+        """Returns the file:...%7Czip/<member> uri of the archive member chosen by select from the list of member names.
+        The result is remembered per archive uri, so select must be the same function for all calls."""
+        with self.lock:
+            if uri in self.member_uris:
+                return self.member_uris[uri]
+            uri_lock = self.uri_locks.setdefault(uri, threading.Lock())
+        with uri_lock:
+            with self.lock:
+                if uri in self.member_uris:
+                    return self.member_uris[uri]
+            path = self.archive_path(uri)
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+            member_uri = 'file:{0}%7Czip/{1}'.format(urllib.request.pathname2url(os.path.abspath(path)), select(names))
+            with self.lock:
+                self.member_uris[uri] = member_uri
+            return member_uri
+
+    def close(self):
+        self.downloader.close()
+
+
+def download_and_create_catalog(urls, target_dir, catalog_path=None, max_workers=8):
+    """Mirrors the urls into target_dir and writes the catalog (default target_dir/catalog.xml). Returns the dict of mirrored paths."""
+    downloader = Downloader(target_dir, max_workers=max_workers)
+    try:
+        paths = downloader.fetch_all(urls)
+        downloader.write_catalog(catalog_path or os.path.join(target_dir, 'catalog.xml'), paths)
+        return paths
+    finally:
+        downloader.close()
@@ -0,0 +1,484 @@
+# Copyright 2015-2019 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = 'Copyright 2015-2019 Altova GmbH'
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+
+# Compares the native DQC implementation (dqc_validation.py) with the DQC XULE rulesets (dqc_validation_xule.py) on a local corpus of filings.
+#
+# Each filing is loaded once and then validated by both engines. The script records the wall time per filing and per rule, and diffs
+# the number of findings reported per DQC.US.nnnn.mmm error code. The CSV report contains one line per rule with the aggregated timings of both
+# engines and the number of findings only reported by one of them; the JSON report contains all details per filing.
+#
+# Timings are always taken with tracemalloc disabled, as tracing slows down every Python allocation and therefore only the native
+# engine. With --memory the filings are validated once more in a separate pass which records the Python peak memory and the fact
+# lookups of the native rules. tracemalloc cannot see the allocations of the XULE engine outside of Python, so the peak memory of
+# both engines is not comparable; the PeakRSS column covers the whole process.
+#
+# Example usage:
+#
+# Show available options
+#   raptorxmlxbrl script dqc_benchmark.py -h
+# Compare both engines on all filings in a directory
+#   raptorxmlxbrl script dqc_benchmark.py /path/to/filings --dqc-repository /path/to/dqc_us_rules-8.0.0/ --csv-report dqc_benchmark.csv --json-report dqc_benchmark.json
+# Time the XULE rules individually for the rules implemented natively
+#   raptorxmlxbrl script dqc_benchmark.py /path/to/filings --dqc-repository /path/to/dqc_us_rules-8.0.0/ --xule-per-rule --csv-report dqc_benchmark.csv
+# Profile only the native engine including its memory usage and fact lookups
+#   raptorxmlxbrl script dqc_benchmark.py /path/to/filings --engine native --memory --json-report dqc_benchmark.json
+
+import altova_api.v2.xml as xml
+import altova_api.v2.xbrl as xbrl
+import dqc_validation
+import dqc_validation_xule
+
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import fnmatch
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+try:
+    import resource
+except ImportError:
+    resource = None
+
+re_linkbase_name = re.compile(r'.+_(cal|def|lab|pre|ref)\.xml$')
+re_error_code = re.compile(r'\[(DQC\.US\.\d+\.\d+)\] ')
+re_rule_number = re.compile(r'DQC[._](?:US\.)?(\d+)')
+
+
+def peak_rss():
+    """Returns the peak resident set size of the process in bytes or None if it cannot be determined on this platform."""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+_measurements = threading.local()
+
+
+class Measurement:
+    """Context manager which measures the wall time and, while tracemalloc is tracing, the Python peak memory allocated within its scope (memory is None otherwise).
+    Nested measurements report their peaks to the enclosing one, as resetting the tracemalloc peak would otherwise hide them."""
+
+    def __enter__(self):
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            self.stack = _measurements.__dict__.setdefault('stack', [])
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            self.base, _ = tracemalloc.get_traced_memory()
+            self.peak = self.base
+            self.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.time = time.perf_counter() - self.start
+        self.memory = None
+        if self.tracing:
+            self.stack.pop()
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak)
+            self.memory = max(self.peak - self.base, 0)
+            if self.stack:
+                self.stack[-1].peak = max(self.stack[-1].peak, self.peak)
+        return False
+
+
+def rule_base(code):
+    """Returns the base rule name (e.g. DQC.US.0015) of a DQC rule id or error code (e.g. DQC_0015 or DQC.US.0015.1234)."""
+    return 'DQC.US.%04d' % int(re_rule_number.match(code).group(1))
+
+
+class FindingsLog:
+    """Error log which collects the DQC.US.nnnn.mmm error codes of the findings reported by the native DQC rules."""
+
+    def __init__(self):
+        self.findings = []
+
+    def report(self, error):
+        m = re_error_code.search(error.text)
+        if m:
+            self.findings.append(m.group(1))
+
+
+def find_filings(paths, pattern):
+    """Returns the sorted list of instance files in the given files and directories."""
+    filings = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                for filename in filenames:
+                    if fnmatch.fnmatch(filename, pattern) and not re_linkbase_name.match(filename):
+                        filings.add(os.path.join(dirpath, filename))
+        else:
+            filings.add(path)
+    return sorted(filings)
+
+
+def run_native(instance, args, count_facts=False):
+    """Executes all applicable native DQC rules one by one and returns the per-rule timings and findings. The fact lookups are only counted
+    if count_facts is set, as the counting proxies of the profiler slow down the rules."""
+    namespaces = dqc_validation.standard_namespaces(instance.dts)
+    rules = []
+    if 'dei' in namespaces:
+        rules = [rule for rule in dqc_validation.selected_rules({'dqcRules': args.rules}) if dqc_validation.is_applicable_rule(rule, namespaces)]
+
+    log = FindingsLog()
+    entries = []
+    with Measurement() as total:
+        models = dqc_validation.ModelCache(instance, namespaces)
+        for rule in rules:
+            profile = [] if count_facts else None
+            findings = len(log.findings)
+            with Measurement() as m:
+                try:
+                    dqc_validation.run_rule(rule, instance, log, set(), namespaces, models, profile)
+                except RuntimeError as e:
+                    if str(e) != 'Error limit exceeded':
+                        raise
+            entries.append(collections.OrderedDict([
+                ('rule', rule_base(rule.id)),
+                ('time', m.time),
+                ('memory', m.memory),
+                ('facts', profile[0]['facts'] if profile else None),
+                ('findings', len(log.findings) - findings),
+            ]))
+    return total, entries, log.findings
+
+
+def run_xule(instance, xp, args):
+    """Executes the DQC XULE rules and returns the timings and findings. If xule_per_rule is set, the natively implemented rules are executed and timed one by one."""
+    findings = []
+    entries = []
+
+    def execute(run_only=None):
+        results = xp.execute(instance, run_only) if run_only else xp.execute(instance)
+        count = 0
+        for result in results:
+            if result.severity == xbrl.xule.Severity.ERROR:
+                findings.append(result.effective_rule_name)
+                count += 1
+        return count
+
+    with Measurement() as total:
+        if args.xule_per_rule:
+            for rule in dqc_validation.selected_rules({'dqcRules': args.rules}):
+                name = rule_base(rule.id)
+                with Measurement() as m:
+                    count = execute(name)
+                entries.append(collections.OrderedDict([
+                    ('rule', name),
+                    ('time', m.time),
+                    ('memory', m.memory),
+                    ('findings', count),
+                ]))
+        else:
+            execute()
+
+    if not args.xule_per_rule:
+        # Without per-rule timings only the number of findings per rule is known
+        counts = collections.Counter(rule_base(code) for code in findings)
+        entries = [collections.OrderedDict([('rule', name), ('time', None), ('memory', None), ('findings', count)]) for name, count in sorted(counts.items())]
+    return total, entries, findings
+
+
+def diff_findings(native, xule):
+    """Returns the findings only reported by the native engine and only reported by the XULE engine as sorted lists of (code, count) tuples."""
+    native_counts = collections.Counter(native)
+    xule_counts = collections.Counter(xule)
+    only_native = sorted((native_counts - xule_counts).items())
+    only_xule = sorted((xule_counts - native_counts).items())
+    return only_native, only_xule
+
+
+def load_filing(path, catalog):
+    """Loads the filing and returns the (instance, error log, measurement) tuple."""
+    uri = path if '://' in path else 'file:' + urllib.request.pathname2url(os.path.abspath(path))
+    with Measurement() as m:
+        instance, error_log = xbrl.Instance.create_from_url(uri, error_limit=500, catalog=catalog)
+    return instance, error_log, m
+
+
+def run_engines(instance, xp, args, count_facts=False):
+    """Validates the instance with the selected engines and returns a dict mapping the engine names to (measurement, rule entries, findings) tuples."""
+    engines = {}
+    if args.engine in ('native', 'both'):
+        engines['native'] = run_native(instance, args, count_facts)
+    if args.engine in ('xule', 'both'):
+        engines['xule'] = run_xule(instance, xp, args)
+    return engines
+
+
+def benchmark_filing(path, xp, catalog, args):
+    """Loads a single filing and validates it with the selected engines. Only the wall time is measured, as tracing allocations would slow down the native engine only."""
+    logging.info('[%s] Start benchmarking filing', path)
+    result = collections.OrderedDict([('filing', path)])
+
+    instance, error_log, m = load_filing(path, catalog)
+    result['load'] = collections.OrderedDict([('time', m.time), ('memory', m.memory)])
+    if not instance:
+        result['error'] = '\n'.join(error.text for error in error_log)
+        logging.error('[%s] Failed to load filing', path)
+        return result
+
+    engines = run_engines(instance, xp, args)
+
+    for engine, (total, entries, findings) in engines.items():
+        result[engine] = collections.OrderedDict([
+            ('time', total.time),
+            ('memory', total.memory),
+            ('findings', len(findings)),
+            ('rules', entries),
+        ])
+    result['peak_rss'] = peak_rss()
+
+    if len(engines) == 2:
+        native_findings = engines['native'][2]
+        xule_findings = engines['xule'][2]
+        # XULE findings of rules which are not selected or not implemented natively are not comparable
+        names = set(rule_base(rule.id) for rule in dqc_validation.selected_rules({'dqcRules': args.rules}))
+        xule_findings = [code for code in xule_findings if rule_base(code) in names]
+        only_native, only_xule = diff_findings(native_findings, xule_findings)
+        result['only_native'] = [list(_) for _ in only_native]
+        result['only_xule'] = [list(_) for _ in only_xule]
+
+    logging.info('[%s] Finished benchmarking filing: %s', path, ', '.join('%s %.3fs' % (engine, result[engine]['time']) for engine in engines))
+    return result
+
+
+def measure_filing_memory(path, xp, catalog, args, result):
+    """Validates the filing once more while tracemalloc is tracing and adds the Python peak memory and the fact lookups to the result of the timing pass."""
+    logging.info('[%s] Start measuring memory of filing', path)
+    instance, error_log, m = load_filing(path, catalog)
+    if not instance:
+        return
+    result['load']['memory'] = m.memory
+    for engine, (total, entries, findings) in run_engines(instance, xp, args, count_facts=True).items():
+        result[engine]['memory'] = total.memory
+        for timed, measured in zip(result[engine]['rules'], entries):
+            if timed['rule'] != measured['rule']:
+                continue
+            timed['memory'] = measured['memory']
+            if 'facts' in measured:
+                timed['facts'] = measured['facts']
+
+
+def run_benchmark(filings, args):
+    """Benchmarks all filings and returns the list of per filing results."""
+    logging.info('Start benchmarking %d filings', len(filings))
+    start = time.time()
+
+    catalog = None
+    if args.catalog:
+        catalog, error_log = xml.Catalog.create_from_url(args.catalog)
+        if not catalog:
+            raise RuntimeError('\n'.join(error.text for error in error_log))
+
+    xp = None
+    if args.engine in ('xule', 'both'):
+        with Measurement() as m:
+            xp = dqc_validation_xule.cached_xule_processor(args.dqc_repository)
+        logging.info('Loaded XULE rulesets in %fs', m.time)
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        futures = {executor.submit(benchmark_filing, path, xp, catalog, args): path for path in filings}
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except:
+                results[path] = collections.OrderedDict([('filing', path), ('error', 'exception')])
+                logging.exception('[%s] Exception raised during benchmark:', path)
+
+    if args.memory:
+        # Separate sequential pass, as tracemalloc traces all threads and slows down every Python allocation
+        tracemalloc.start()
+        try:
+            for path in filings:
+                if 'error' in results[path]:
+                    continue
+                try:
+                    measure_filing_memory(path, xp, catalog, args, results[path])
+                except:
+                    logging.exception('[%s] Exception raised during memory measurement:', path)
+        finally:
+            tracemalloc.stop()
+
+    runtime = time.time() - start
+    logging.info('Finished benchmarking filings in %fs', runtime)
+    return [results[path] for path in filings], runtime
+
+
+def summarize_rules(results):
+    """Aggregates the per filing results to a dict of per rule totals."""
+    summary = collections.OrderedDict()
+
+    def entry(rule):
+        if rule not in summary:
+            summary[rule] = collections.OrderedDict([
+                ('native_time', 0.0), ('native_memory', None), ('native_findings', 0),
+                ('xule_time', None), ('xule_memory', None), ('xule_findings', 0),
+                ('only_native', 0), ('only_xule', 0), ('filings_disagree', 0),
+            ])
+        return summary[rule]
+
+    for result in results:
+        for rule in result.get('native', {}).get('rules', []):
+            e = entry(rule['rule'])
+            e['native_time'] += rule['time']
+            if rule['memory'] is not None:
+                e['native_memory'] = max(e['native_memory'] or 0, rule['memory'])
+            e['native_findings'] += rule['findings']
+        for rule in result.get('xule', {}).get('rules', []):
+            e = entry(rule['rule'])
+            if rule['time'] is not None:
+                e['xule_time'] = (e['xule_time'] or 0.0) + rule['time']
+            if rule['memory'] is not None:
+                e['xule_memory'] = max(e['xule_memory'] or 0, rule['memory'])
+            e['xule_findings'] += rule['findings']
+        disagree = set()
+        for key in ('only_native', 'only_xule'):
+            for code, count in result.get(key, []):
+                e = entry(rule_base(code))
+                e[key] += count
+                disagree.add(rule_base(code))
+        for rule in disagree:
+            summary[rule]['filings_disagree'] += 1
+    return collections.OrderedDict(sorted(summary.items()))
+
+
+def faster_engine(e):
+    if e['xule_time'] is None:
+        return ''
+    return 'native' if e['native_time'] < e['xule_time'] else 'xule'
+
+
+def write_csv_report(path, results, runtime):
+    """Writes the per rule comparison and the per filing totals to a csv file."""
+    summary = summarize_rules(results)
+    with open(path, 'w') as csvfile:
+        csvfile.write('Date,Filings,Runtime\n')
+        csvfile.write('"{:%Y-%m-%d %H:%M:%S}",{},{:.1f}\n'.format(datetime.datetime.now(), len(results), runtime))
+        csvfile.write('Rule,NativeTime,XuleTime,Faster,NativePythonPeakMemory,XulePythonPeakMemory,NativeFindings,XuleFindings,OnlyNative,OnlyXule,FilingsDisagree\n')
+        for rule, e in summary.items():
+            csvfile.write('{},{:.3f},{},{},{},{},{},{},{},{},{}\n'.format(
+                rule, e['native_time'], '%.3f' % e['xule_time'] if e['xule_time'] is not None else '', faster_engine(e),
+                e['native_memory'] if e['native_memory'] is not None else '', e['xule_memory'] if e['xule_memory'] is not None else '',
+                e['native_findings'], e['xule_findings'], e['only_native'], e['only_xule'], e['filings_disagree']))
+        csvfile.write('Filing,LoadTime,NativeTime,XuleTime,NativePythonPeakMemory,XulePythonPeakMemory,PeakRSS,OnlyNative,OnlyXule,Error\n')
+        for result in results:
+            native = result.get('native', {})
+            xule = result.get('xule', {})
+            csvfile.write('"{}",{},{},{},{},{},{},{},{},"{}"\n'.format(
+                result['filing'],
+                '%.3f' % result['load']['time'] if 'load' in result else '',
+                '%.3f' % native['time'] if native else '',
+                '%.3f' % xule['time'] if xule else '',
+                native.get('memory') if native.get('memory') is not None else '', xule.get('memory') if xule.get('memory') is not None else '', result.get('peak_rss') or '',
+                sum(_[1] for _ in result.get('only_native', [])), sum(_[1] for _ in result.get('only_xule', [])),
+                result.get('error', '').replace('"', '""')))
+
+
+def write_json_report(path, results, runtime):
+    """Writes all per filing and per rule details to a json file."""
+    report = collections.OrderedDict([
+        ('date', '{:%Y-%m-%dT%H:%M:%S}'.format(datetime.datetime.now())),
+        ('runtime', runtime),
+        ('rules', summarize_rules(results)),
+        ('filings', results),
+    ])
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def print_results(results, runtime):
+    """Writes the per rule comparison to console."""
+    for rule, e in summarize_rules(results).items():
+        xule_time = '%.3fs' % e['xule_time'] if e['xule_time'] is not None else 'n/a'
+        print('%s: native %.3fs, xule %s, findings %d/%d, only native %d, only xule %d' % (rule, e['native_time'], xule_time, e['native_findings'], e['xule_findings'], e['only_native'], e['only_xule']))
+    print('Benchmarked %d filings in %.1fs' % (len(results), runtime))
+
+
+def setup_logging(args):
+    """Initializes Python logging module."""
+    if args.log_file:
+        levels = {'ERROR': logging.ERROR, 'WARNING': logging.WARNING, 'INFO': logging.INFO, 'DEBUG': logging.DEBUG}
+        logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', filename=args.log_file, filemode='w', level=levels[args.log_level])
+    else:
+        logging.getLogger().addHandler(logging.NullHandler())
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    console.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    logging.getLogger().addHandler(console)
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Compare the native and the XULE DQC validation using Altova RaptorXML+XBRL')
+    parser.add_argument('filings', metavar='FILING', nargs='+', help='instance file or directory containing instance files')
+    parser.add_argument('--pattern', metavar='PATTERN', dest='pattern', default='*.xml', help='file name pattern of instance files in directories (default *.xml)')
+    parser.add_argument('--engine', dest='engine', choices=['native', 'xule', 'both'], default='both', help='DQC engines to run (native|xule|both)')
+    parser.add_argument('--dqc-repository', metavar='DQC_REPOSITORY', dest='dqc_repository', help='path to the DQC XULE rules repository')
+    parser.add_argument('--rules', metavar='RULES', dest='rules', help='limit execution to the given DQC rules separated by | characters')
+    parser.add_argument('--xule-per-rule', dest='xule_per_rule', action='store_true', help='execute and time the XULE rules implemented natively one by one')
+    parser.add_argument('--catalog', metavar='CATALOG', dest='catalog', help='catalog file used to load the filings')
+    parser.add_argument('--memory', dest='memory', action='store_true', help='measure the Python peak memory and the native fact lookups in a separate pass with tracemalloc (timings are always taken without tracing; allocations of the XULE engine outside of Python are not traced)')
+    parser.add_argument('-l', '--log', metavar='LOG_FILE', dest='log_file', help='log output file')
+    parser.add_argument('--log-level', metavar='LOG_LEVEL', dest='log_level', choices=['ERROR', 'WARNING', 'INFO', 'DEBUG'], default='INFO', help='log level (ERROR|WARNING|INFO|DEBUG)')
+    parser.add_argument('--csv-report', metavar='CSV_FILE', dest='csv_file', help='write benchmark results to csv')
+    parser.add_argument('--json-report', metavar='JSON_FILE', dest='json_file', help='write benchmark results to json')
+    parser.add_argument('-w', '--workers', metavar='MAX_WORKERS', type=int, dest='max_workers', default=1, help='limit number of workers of the timing pass (default 1, as concurrent filings distort the timings)')
+    return parser.parse_args()
+
+
+def main():
+    # Parse command line arguments
+    args = parse_args()
+
+    # Setup logging
+    setup_logging(args)
+
+    try:
+        filings = find_filings(args.filings, args.pattern)
+        results, runtime = run_benchmark(filings, args)
+        logging.info('Start generating benchmark report')
+        if args.csv_file:
+            write_csv_report(args.csv_file, results, runtime)
+        if args.json_file:
+            write_json_report(args.json_file, results, runtime)
+        if not args.csv_file and not args.json_file:
+            print_results(results, runtime)
+        logging.info('Finished generating benchmark report')
+    except:
+        logging.exception('Benchmark run aborted with exception:')
+
+
+if __name__ == '__main__':
+    start = time.time()
+    main()
+    end = time.time()
+    logging.info('Finished benchmark run in %fs', end-start)
@@ -30,11 +30,22 @@ __license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
 #   raptorxmlxbrl script dqc_testsuite.py /path/to/DQC_Testcases_Release_All_V5/index.xml --log dqc_testsuite.log --xml-report dqc_testsuite.xml
 # Run only specific testcases
 #   raptorxmlxbrl script dqc_testsuite.py /path/to/DQC_Testcases_Release_All_V5/index.xml --log dqc_testsuite.log --csv-report dqc_testsuite.xml --testcase DQC_0004 DQC_0005
+# Re-execute all variations even if their inputs and the validation scripts did not change
+#   raptorxmlxbrl script dqc_testsuite.py /path/to/DQC_Testcases_Release_All_V5/index.xml --log dqc_testsuite.log --csv-report dqc_testsuite.csv --force
+# Run the testsuite on two hosts and merge the reports
+#   raptorxmlxbrl script dqc_testsuite.py /path/to/DQC_Testcases_Release_All_V5/index.xml --csv-report dqc_shard1.csv --shard 1/2
+#   raptorxmlxbrl script dqc_testsuite.py /path/to/DQC_Testcases_Release_All_V5/index.xml --csv-report dqc_shard2.csv --shard 2/2
+#   raptorxmlxbrl script dqc_testsuite.py merge /path/to/DQC_Testcases_Release_All_V5/index.xml dqc_shard1.csv dqc_shard2.csv --csv-report dqc_testsuite.csv
+# Execute the variations in a pool of worker processes
+#   raptorxmlxbrl script dqc_testsuite.py /path/to/DQC_Testcases_Release_All_V5/index.xml --log dqc_testsuite.log --csv-report dqc_testsuite.csv --executor process
 
 import altova_api.v2.xml as xml
 import altova_api.v2.xsd as xsd
 import altova_api.v2.xbrl as xbrl
+from altova_api.v2 import ProductInfo
 import dqc_validation
+import downloader
+import testsuite_cache
 
 import argparse
 import collections
@@ -44,11 +55,10 @@ import logging
 import multiprocessing
 import os
 import re
-import tempfile
+import sys
 import time
 import urllib.parse
 import urllib.request
-import zipfile
 
 re_error_code = re.compile(r'\[(DQC\.US\.\d+\.\d+)\] ')
 
@@ -188,11 +198,18 @@ def load_testcase(testcase_uri):
     return testcase
 
 
-def load_testsuite(index_uri):
-    """Loads the testcases specified in the given testsuite index file and returns a dict with all testcase meta-information."""
+def load_testsuite(index_uri, max_workers=None, cache_path=None):
+    """Loads the testcases specified in the given testsuite index file concurrently and returns a dict with all testcase meta-information.
+    The result is cached in cache_path as long as the index, the testcase files and this script remain unchanged."""
     logging.info('Start loading testsuite index %s', index_uri)
     start = time.time()
 
+    context = {'runner': 'dqc_testsuite', 'script': testsuite_cache.file_digest(os.path.abspath(__file__))}
+    testsuite = testsuite_cache.load_testsuite_model(cache_path, index_uri, context)
+    if testsuite is not None:
+        logging.info('Finished loading testsuite index %s from cache %s in %fs', index_uri, cache_path, time.time() - start)
+        return testsuite
+
     # Load the testcase index file
     instance, log = xml.Instance.create_from_url(index_uri)
     # Check for any fatal errors
@@ -206,8 +223,8 @@ def load_testsuite(index_uri):
         'date': attr_val(documentation_elem, 'date')
     }
 
-    # Iterate over all <testcase> child elements and parse the testcase file
-    testcases = []
+    # Iterate over all <testcase> child elements and parse the testcase files concurrently
+    testcase_uris = []
     for testcases_elem in documentation_elem.element_children():
         if testcases_elem.local_name == 'testcases':
             root = urllib.parse.urljoin(testcases_elem.base_uri, attr_val(testcases_elem, 'root')+'/')
@@ -215,53 +232,90 @@ def load_testsuite(index_uri):
                 if testcase_elem.local_name == 'testcase':
                     # Get the value of the @uri attribute and make any relative uris absolute to the base uri
                     uri = urllib.parse.urljoin(root, attr_val(testcase_elem, 'uri'))
-                    # Load the testcase file
-                    testcases.append(load_testcase(uri))
-    testsuite['testcases'] = testcases
+                    testcase_uris.append(uri)
+    testsuite['testcases'] = testsuite_cache.load_testcases(testcase_uris, load_testcase, max_workers)
+    testsuite_cache.save_testsuite_model(cache_path, index_uri, context, testsuite)
 
     runtime = time.time() - start
     logging.info('Finished loading testsuite index %s in %fs', index_uri, runtime)
     return testsuite
 
 
-def instance_name_from_zip(path):
-    """Determines the instance filename within a SEC EDGAR zip archive."""
+def instance_name_from_zip(names):
+    """Determines the instance filename from the member names of a SEC EDGAR zip archive."""
     re_instance_name = re.compile(r'.+-\d{8}\.xml')
-    for name in zipfile.ZipFile(path).namelist():
+    for name in names:
         if re_instance_name.fullmatch(name):
             return name
     raise RuntimeError('Zip archive does not contain a valid SEC instance file.')
 
 
+# Zip archives of the variations, downloaded once per run into the testsuite directory (set up by init_archive_cache)
+archive_cache = None
+
+
+def init_archive_cache(target_dir):
+    global archive_cache
+    archive_cache = downloader.ArchiveCache(target_dir)
+
+
 def get_uri_in_zip(zipURI, catalog):
     if catalog is not None:
         zipURI = catalog.resolve_uri(zipURI)
-    urlparseResult = urllib.parse.urlparse(zipURI)
+    return archive_cache.member_uri(zipURI, instance_name_from_zip)
 
-    if urlparseResult.scheme != 'file':
-        tmpzip = tempfile.NamedTemporaryFile(suffix='.zip', delete=False).name
-        logging.info('Downloading archive %s to %s', zipURI, tmpzip)
-        urllib.request.urlretrieve(zipURI, tmpzip)
-        zipPath = tmpzip
-    else:
-        zipPath = file_uri_to_os_path(zipURI)
-    uri = 'file:{0}%7Czip/{1}'.format(urllib.request.pathname2url(zipPath), instance_name_from_zip(zipPath))
-    return uri
 
+class VariationErrorLog:
+    """Error log of a single variation which starts with the errors of the shared instance load and collects the DQC findings."""
 
-def execute_variation(testcase, variation, catalog, args):
-    """Peforms the actual XBRL instance or taxonomy validation and returns 'PASS' if the actual outcome is conformant with the result specified in the variation."""
-    logging.info('[%s] Start executing variation', variation['id'])
+    def __init__(self, load_errors, error_limit=500):
+        self.errors = list(load_errors)
+        self.error_limit = error_limit
+
+    def report(self, error):
+        self.errors.append(error)
+        if len(self.errors) > self.error_limit:
+            raise RuntimeError('Error limit exceeded')
 
+    def has_errors(self):
+        return any(error.severity == xml.ErrorSeverity.ERROR for error in self.errors)
+
+    def __iter__(self):
+        return iter(self.errors)
+
+
+def variation_entry_point(variation, catalog):
+    """Returns the uri of the instance to be validated for the given variation."""
     if 'readMeFirst' in variation['data']:
         readMeFirstURI = variation['data']['readMeFirst']
-        uri = get_uri_in_zip(readMeFirstURI, catalog) if readMeFirstURI.endswith('.zip') else readMeFirstURI
+        return get_uri_in_zip(readMeFirstURI, catalog) if readMeFirstURI.endswith('.zip') else readMeFirstURI
     else:
         raise RuntimeError('Unknown entry point in variation %s' % variation['id'])
 
-    logging.info('[%s] Validating instance %s', variation['id'], uri)
+
+def load_variation_instance(uri, catalog):
+    """Loads the instance and returns an (instance, load errors, models) tuple which can be shared by all variations with the same entry point."""
     instance, error_log = xbrl.Instance.create_from_url(uri, error_limit=500, catalog=catalog)
-    dqc_validation.validate(instance, error_log, **{'suppressErrors': variation['results']['blockedMessageCodes']})
+    models = dqc_validation.ModelCache(instance, dqc_validation.standard_namespaces(instance.dts)) if instance else None
+    return instance, list(error_log), models
+
+
+def execute_variation(testcase, variation, catalog, args, loaded=None):
+    """Peforms the actual XBRL instance or taxonomy validation and returns 'PASS' if the actual outcome is conformant with the result specified in the variation."""
+    logging.info('[%s] Start executing variation', variation['id'])
+
+    uri = variation_entry_point(variation, catalog)
+
+    logging.info('[%s] Validating instance %s', variation['id'], uri)
+    if loaded is None:
+        loaded = load_variation_instance(uri, catalog)
+    instance, load_errors, models = loaded
+    error_log = VariationErrorLog(load_errors)
+    try:
+        dqc_validation.validate(instance, error_log, models=models, **{'suppressErrors': variation['results']['blockedMessageCodes']})
+    except RuntimeError as e:
+        if str(e) != 'Error limit exceeded':
+            raise
     if error_log.has_errors() and logging.getLogger().isEnabledFor(logging.DEBUG):
         logging.debug('[%s] Error log:\n%s', variation['id'], '\n'.join(error.text for error in error_log))
 
@@ -283,25 +337,25 @@ def execute_variation(testcase, variation, catalog, args):
     return 'PASS' if passed else 'FAIL', error_counts
 
 
-def write_doc(path, content, mode="wb"):
-    dir, file = os.path.split(path)
-    if not os.path.exists(dir):
-        os.makedirs(dir)
-    f = open(path, mode)
-    f.write(content)
-    f.close()
-
-
-def download_doc(url, target):
-    logging.info('Downloading %s => %s' % (url, target))
-    content = urllib.request.urlopen(url).read()
-    write_doc(target, content, "wb")
-
-
-def remote_uri_to_os_path(target_dir, uri):
-    url_parts = urllib.parse.urlparse(uri)
-    path = url_parts.path[1:] if url_parts.path.startswith("/") else url_parts.path
-    return os.path.join(target_dir, url_parts.netloc, path)
+def execute_variation_group(group, catalog, args):
+    """Loads the instance shared by all (testcase, variation) pairs in group once and executes the variations against it. Returns a list of (variation key, result, runtime) tuples; the shared instance load is accounted to the first variation."""
+    start = time.perf_counter()
+    loaded = None
+    if len(group) > 1:
+        uri = variation_entry_point(group[0][1], catalog)
+        logging.info('Loading instance %s once for %d variations', uri, len(group))
+        loaded = load_variation_instance(uri, catalog)
+    results = []
+    for testcase, variation in group:
+        variation_key = (testcase['uri'], variation['id'])
+        try:
+            result = execute_variation(testcase, variation, catalog, args, loaded)
+        except:
+            result = 'EXCEPTION', collections.Counter()
+            logging.exception('[%s] Exception raised during testcase execution:', variation['id'])
+        results.append((variation_key, result, time.perf_counter() - start))
+        start = time.perf_counter()
+    return results
 
 
 def is_remote(uri):
@@ -314,30 +368,10 @@ def file_uri_to_os_path(uri):
     return urllib.request.url2pathname(url_parts.path)
 
 
-def os_path_to_file_uri(path):
-    return urllib.request.pathname2url(path)
-
-
-def download_files_and_create_catalog(doc_uris, target_dir):
+def download_files_and_create_catalog(doc_uris, target_dir, max_workers):
+    """Mirrors the remote documents into target_dir using a pool of keep-alive connections and writes catalog.xml mapping them to the local copies."""
     logging.info('Start downloading files and creating catalog')
-
-    catalog_template = """<?xml version='1.0' encoding='UTF-8'?>
-<catalog xmlns='urn:oasis:names:tc:entity:xmlns:xml:catalog' xmlns:xsi='http://www.w3.org/2001/XMLSchema-instance' xsi:schemaLocation='urn:oasis:names:tc:entity:xmlns:xml:catalog Catalog.xsd'>
-%(mappings)s
-</catalog>
-"""
-    uri_mapping_template = """<uri name="%(source)s" uri="%(target)s"/>"""
-
-    lines = []
-    catalog_path = os.path.join(target_dir, "catalog.xml")
-    for uri in doc_uris:
-        target_abs = remote_uri_to_os_path(target_dir, uri)
-        target_rel = os_path_to_file_uri(os.path.relpath(target_abs, target_dir))
-        download_doc(uri, target_abs)
-        lines.append(uri_mapping_template % {"source": uri, "target": target_rel})
-
-    catalog_content = catalog_template % {"mappings": "\n  ".join(lines)}
-    write_doc(catalog_path, catalog_content, "w")
+    downloader.download_and_create_catalog(doc_uris, target_dir, os.path.join(target_dir, "catalog.xml"), max_workers=max_workers)
     logging.info('Finished downloading files and creating catalog')
 
 
@@ -386,6 +420,60 @@ def collect_remote_uris(testsuite, args):
     return list(remote_uris)
 
 
+# Per process state of the process pool workers, set up once by init_worker
+worker_state = {}
+
+
+def load_catalog(catalog_path):
+    """Loads the catalog file if it exists."""
+    if not os.path.exists(catalog_path):
+        return None
+    catalog, error_log = xml.Catalog.create_from_url(catalog_path)
+    # Check for any fatal errors
+    if not catalog:
+        raise ValidationError('\n'.join(error.text for error in error_log))
+    return catalog
+
+
+def init_worker(catalog_path, args):
+    """Initializes a process pool worker by setting up logging and loading the catalog and the archive cache once per process."""
+    setup_logging(args, worker=True)
+    worker_state['catalog'] = load_catalog(catalog_path)
+    init_archive_cache(os.path.dirname(catalog_path))
+
+
+def execute_variation_group_in_worker(group, args):
+    """Executes the variation group within a process pool worker and returns the picklable list of (variation key, (status, error counts), runtime) tuples."""
+    return execute_variation_group(group, worker_state['catalog'], args)
+
+
+def create_result_cache(catalog_path, args):
+    """Returns the result cache for the current validation scripts, data files and catalog or None if disabled."""
+    if not args.result_cache:
+        return None
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    context = {
+        'runner': 'dqc_testsuite',
+        'product': ProductInfo.full_product_name,
+        'scripts': testsuite_cache.files_digest([os.path.join(script_dir, name) for name in ('dqc_testsuite.py', 'dqc_validation.py', 'dqc_data')]),
+        'catalog': testsuite_cache.file_digest(catalog_path),
+    }
+    return testsuite_cache.ResultCache(args.result_cache, context)
+
+
+def variation_cache_key(cache, testcase, variation, catalog):
+    """Returns the result cache key of the variation from its meta-information and the digests of all its input files."""
+    data = variation.get('data', {})
+    uris = [uri for kind in ('instances', 'linkbases', 'schemas') for uri in data.get(kind, [])]
+    meta = {'testcase': testcase['number'], 'variation': variation}
+    return cache.key(meta, [testsuite_cache.uri_digest(uri, catalog) for uri in uris])
+
+
+def timing_name(testcase, variation):
+    """Returns the name of the variation in the timing database."""
+    return '%s/%s' % (testcase['number'], variation['id'])
+
+
 def execute_testsuite(testsuite, args):
     """Runs all testcase variations in parallel and returns a dict with the results of each testcase variation."""
     logging.info('Start executing %s variations in %d testcases', sum(len(testcase['variations']) for testcase in testsuite['testcases']), len(testsuite['testcases']))
@@ -393,35 +481,88 @@ def execute_testsuite(testsuite, args):
 
     testsuite_path, testsuite_index = os.path.split(file_uri_to_os_path(testsuite['uri']))
     catalog_path = os.path.join(testsuite_path, "catalog.xml")
+    init_archive_cache(testsuite_path)
+
+    catalog = load_catalog(catalog_path)
+    if args.executor == 'process':
+        # Each worker process loads the catalog itself, only the testcase metadata and the results are pickled
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.max_workers, mp_context=multiprocessing.get_context('fork'), initializer=init_worker, initargs=(catalog_path, args))
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers)
 
-    catalog = None
-    if os.path.exists(catalog_path):
-        catalog, error_log = xml.Catalog.create_from_url(catalog_path)
-        # Check for any fatal errors
-        if not catalog:
-            raise ValidationError('\n'.join(error.text for error in error_log))
+    cache = create_result_cache(catalog_path, args)
+    cache_keys = {}
+    timings = testsuite_cache.TimingDatabase(args.timing_db)
 
     results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+    with executor:
 
-        # Schedule processing of all variations as futures
-        futures = {}
+        # Group the variations by their entry point so that each instance is only loaded once
+        groups = collections.OrderedDict()
         for testcase in testsuite['testcases']:
             if args.testcase_numbers and testcase['number'] not in args.testcase_numbers:
                 continue
+            testcase_info = {key: value for key, value in testcase.items() if key != 'variations'} if args.executor == 'process' else testcase
             for variation in testcase['variations']:
                 if args.variation_ids and variation['id'] not in args.variation_ids:
                     continue
-                futures[executor.submit(execute_variation, testcase, variation, catalog, args)] = (testcase['uri'], variation['id'])
+                group_key = variation['data'].get('readMeFirst', (testcase['uri'], variation['id']))
+                groups.setdefault(group_key, []).append((testcase_info, variation))
+
+        # Select the groups of this shard; groups are never split so that each instance is only loaded by one shard
+        predict_group = lambda group: sum(timings.predict(timing_name(testcase, variation)) for testcase, variation in group)
+        shard_groups = testsuite_cache.select_shard(list(groups.values()), lambda group: timing_name(*group[0]), args.shard, predict_group if args.shard_by == 'runtime' else None)
+
+        # Skip variations with cached results
+        pending_groups = []
+        for group in shard_groups:
+            pending = []
+            for testcase, variation in group:
+                if cache is not None:
+                    variation_key = (testcase['uri'], variation['id'])
+                    cache_keys[variation_key] = variation_cache_key(cache, testcase, variation, catalog)
+                    cached = cache.get(cache_keys[variation_key]) if not args.force else None
+                    if cached is not None:
+                        logging.info('[%s] Using cached result: %s', variation['id'], cached[0])
+                        results[variation_key] = cached
+                        continue
+                pending.append((testcase, variation))
+            if pending:
+                pending_groups.append(pending)
+
+        # Schedule processing of all variation groups as futures, longest first according to the timings of previous runs
+        ordered_groups = testsuite_cache.longest_first(pending_groups, predict_group)
+        predicted = testsuite_cache.predict_makespan([predict_group(group) for group in ordered_groups], args.max_workers)
+        submitted = time.time()
+        futures = {}
+        for group in ordered_groups:
+            if args.executor == 'process':
+                future = executor.submit(execute_variation_group_in_worker, group, args)
+            else:
+                future = executor.submit(execute_variation_group, group, catalog, args)
+            futures[future] = group
 
         # Wait for all futures to finish
+        runtimes = []
         for future in concurrent.futures.as_completed(futures):
-            variation_key = futures[future]
+            group = futures[future]
             try:
-                results[variation_key] = future.result()
+                group_results = future.result()
+                for (testcase, variation), (_, _, variation_runtime) in zip(group, group_results):
+                    timings.record(timing_name(testcase, variation), variation_runtime)
+                runtimes.append(sum(variation_runtime for _, _, variation_runtime in group_results))
             except:
-                results[variation_key] = 'EXCEPTION', collections.Counter()
-                logging.exception('[%s] Exception raised during testcase execution:', variation_key[1])
+                group_results = [((testcase['uri'], variation['id']), ('EXCEPTION', collections.Counter()), None) for testcase, variation in group]
+                logging.exception('[%s] Exception raised during testcase execution:', ' '.join(variation['id'] for testcase, variation in group))
+            for variation_key, result, _ in group_results:
+                results[variation_key] = result
+                if cache is not None:
+                    cache.put(cache_keys[variation_key], result)
+        testsuite_cache.report_makespan(predicted, time.time() - submitted, runtimes, args.max_workers)
+
+    if cache is not None:
+        cache.save()
+    timings.save()
 
     runtime = time.time() - start
     logging.info('Finished executing testcase variations in %fs', runtime)
@@ -527,11 +668,11 @@ def print_results(testsuite, results, runtime):
 def run_xbrl_testsuite(uri, args):
     """Load and execute the conformance testsuite."""
     try:
-        testsuite = load_testsuite(uri)
+        testsuite = load_testsuite(uri, args.max_workers, args.testsuite_cache)
         if args.create_catalog:
             target_dir = os.path.dirname(file_uri_to_os_path(testsuite['uri']))
             remote_uris = collect_remote_uris(testsuite, args)
-            download_files_and_create_catalog(remote_uris, target_dir)
+            download_files_and_create_catalog(remote_uris, target_dir, args.max_workers)
         results, runtime = execute_testsuite(testsuite, args)
         logging.info('Start generating testsuite report')
         if args.csv_file:
@@ -545,11 +686,14 @@ def run_xbrl_testsuite(uri, args):
         logging.exception('Testsuite run aborted with exception:')
 
 
-def setup_logging(args):
-    """Initializes Python logging module."""
+def setup_logging(args, worker=False):
+    """Initializes Python logging module. Process pool workers append to the log file of the main process."""
+    if worker:
+        for handler in logging.getLogger().handlers[:]:
+            logging.getLogger().removeHandler(handler)
     if args.log_file:
         levels = {'ERROR': logging.ERROR, 'WARNING': logging.WARNING, 'INFO': logging.INFO, 'DEBUG': logging.DEBUG}
-        logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', filename=args.log_file, filemode='w', level=levels[args.log_level])
+        logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', filename=args.log_file, filemode='a' if worker else 'w', level=levels[args.log_level])
     else:
         logging.getLogger().addHandler(logging.NullHandler())
     console = logging.StreamHandler()
@@ -570,11 +714,57 @@ def parse_args():
     parser.add_argument('-t', '--testcase', metavar='TESTCASE_NUMBER', dest='testcase_numbers', nargs='*', help='limit execution to only this testcase number')
     parser.add_argument('-v', '--variation', metavar='VARIATION_ID', dest='variation_ids', nargs='*', help='limit execution to only this variation id')
     parser.add_argument('-w', '--workers', metavar='MAX_WORKERS', type=int, dest='max_workers', default=multiprocessing.cpu_count(), help='limit number of workers')
+    parser.add_argument('--executor', dest='executor', choices=['thread', 'process'], default='thread', help='execute variations in a thread or process pool (thread|process); process pools fork the RaptorXML process and are therefore not available on Windows')
+    parser.add_argument('--result-cache', metavar='CACHE_FILE', dest='result_cache', default='dqc_testsuite_results.json', help='cache file for the results of unchanged variations (default dqc_testsuite_results.json, empty to disable)')
+    parser.add_argument('--force', dest='force', action='store_true', help='re-execute all variations and ignore cached results')
+    parser.add_argument('--timing-db', metavar='TIMING_FILE', dest='timing_db', default='dqc_testsuite_timings.json', help='file with the runtimes of previous runs used for longest-first scheduling (default dqc_testsuite_timings.json, empty to disable)')
+    parser.add_argument('--testsuite-cache', metavar='CACHE_FILE', dest='testsuite_cache', default='dqc_testsuite_index.pickle', help='cache file for the parsed testsuite index and testcase files (default dqc_testsuite_index.pickle, empty to disable)')
     parser.add_argument('--create-catalog', dest='create_catalog', action='store_true', help='download all remote files and create a catalog for them')
-    return parser.parse_args()
+    parser.add_argument('--shard', metavar='INDEX/COUNT', dest='shard', type=testsuite_cache.parse_shard, help='execute only the INDEX-th of COUNT slices of the variations (INDEX counting from 1)')
+    parser.add_argument('--shard-by', dest='shard_by', choices=['hash', 'runtime'], default='hash', help='partition variations by a stable hash of their id or balance the runtimes of a timing database shared by all shards (hash|runtime)')
+    args = parser.parse_args()
+    if args.executor == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+        # Spawned workers would start sys.executable, which is the RaptorXML binary and not a Python interpreter
+        parser.error('--executor process requires the fork start method which is not available on this platform')
+    return args
+
+
+def parse_merge_args():
+    """Parse command line arguments of the merge subcommand"""
+    parser = argparse.ArgumentParser(prog='dqc_testsuite.py merge', description='Merge the CSV reports of several testsuite shards into a single report')
+    parser.add_argument('uri', metavar='INDEX', help='main testsuite index file')
+    parser.add_argument('shard_reports', metavar='SHARD_CSV', nargs='+', help='csv report of a testsuite shard')
+    parser.add_argument('-l', '--log', metavar='LOG_FILE', dest='log_file', help='log output file')
+    parser.add_argument('--log-level', metavar='LOG_LEVEL', dest='log_level', choices=['ERROR', 'WARNING', 'INFO', 'DEBUG'], default='INFO', help='log level (ERROR|WARNING|INFO|DEBUG)')
+    parser.add_argument('--csv-report', metavar='CSV_FILE', dest='csv_file', help='write merged testsuite results to csv')
+    parser.add_argument('--xml-report', metavar='XML_FILE', dest='xml_file', help='write merged testsuite results to xml')
+    parser.add_argument('--relative-uris', dest='relative_uris', action='store_true', help='write testcase uris relative to testsuite index file')
+    parser.add_argument('--testsuite-cache', metavar='CACHE_FILE', dest='testsuite_cache', default='dqc_testsuite_index.pickle', help='cache file for the parsed testsuite index and testcase files (default dqc_testsuite_index.pickle, empty to disable)')
+    return parser.parse_args(sys.argv[2:])
+
+
+def merge_shard_reports(args):
+    """Combines the per-shard CSV reports and writes the merged report."""
+    try:
+        testsuite = load_testsuite(args.uri, cache_path=args.testsuite_cache)
+        results, runtime = testsuite_cache.merge_csv_reports(args.shard_reports, testsuite)
+        if args.csv_file:
+            write_csv_report(args.csv_file, testsuite, results, runtime, args.relative_uris)
+        if args.xml_file:
+            write_xml_report(args.xml_file, testsuite, results, runtime, args.relative_uris)
+        if not args.csv_file and not args.xml_file:
+            print_results(testsuite, results, runtime)
+    except:
+        logging.exception('Merging shard reports aborted with exception:')
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        args = parse_merge_args()
+        setup_logging(args)
+        merge_shard_reports(args)
+        return
+
     # Parse command line arguments
     args = parse_args()
 
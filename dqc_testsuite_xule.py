@@ -30,6 +30,10 @@ __license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
 #   raptorxmlxbrl script dqc_testsuite_xule.py /path/to/DQC_Testcases_Release_All_V6/index.xml --log dqc_testsuite.log --xml-report dqc_testsuite.xml
 # Run only specific testcases
 #   raptorxmlxbrl script dqc_testsuite_xule.py /path/to/DQC_Testcases_Release_All_V6/index.xml --log dqc_testsuite.log --csv-report dqc_testsuite.xml --testcase DQC_0004 DQC_0005
+# Run the testsuite on two hosts and merge the reports
+#   raptorxmlxbrl script dqc_testsuite_xule.py /path/to/DQC_Testcases_Release_All_V6/index.xml --csv-report dqc_shard1.csv --shard 1/2
+#   raptorxmlxbrl script dqc_testsuite_xule.py /path/to/DQC_Testcases_Release_All_V6/index.xml --csv-report dqc_shard2.csv --shard 2/2
+#   raptorxmlxbrl script dqc_testsuite_xule.py merge /path/to/DQC_Testcases_Release_All_V6/index.xml dqc_shard1.csv dqc_shard2.csv --csv-report dqc_testsuite.csv
 
 import argparse
 import collections
@@ -41,14 +45,15 @@ import multiprocessing
 import os
 import pickle
 import re
-import tempfile
+import sys
 import time
 import urllib.parse
 import urllib.request
-import zipfile
 
 from altova_api.v2 import xml, xsd, xbrl, beta, ProductInfo
 xbrl.xule = beta.xbrl.xule
+import downloader
+import testsuite_cache
 
 class ValidationError(Exception):
     """User-defined exception representing a validation error."""
@@ -196,11 +201,18 @@ def load_testcase(testcase_uri):
     return testcase
 
 
-def load_testsuite(index_uri):
-    """Loads the testcases specified in the given testsuite index file and returns a dict with all testcase meta-information."""
+def load_testsuite(index_uri, max_workers=None, cache_path=None):
+    """Loads the testcases specified in the given testsuite index file concurrently and returns a dict with all testcase meta-information.
+    The result is cached in cache_path as long as the index, the testcase files and this script remain unchanged."""
     logging.info('Start loading testsuite index %s', index_uri)
     start = time.time()
 
+    context = {'runner': 'dqc_testsuite_xule', 'script': testsuite_cache.file_digest(os.path.abspath(__file__))}
+    testsuite = testsuite_cache.load_testsuite_model(cache_path, index_uri, context)
+    if testsuite is not None:
+        logging.info('Finished loading testsuite index %s from cache %s in %fs', index_uri, cache_path, time.time() - start)
+        return testsuite
+
     # Load the testcase index file
     instance, log = xml.Instance.create_from_url(index_uri)
     # Check for any fatal errors
@@ -214,8 +226,8 @@ def load_testsuite(index_uri):
         'date': attr_val(documentation_elem, 'date')
     }
 
-    # Iterate over all <testcase> child elements and parse the testcase file
-    testcases = []
+    # Iterate over all <testcase> child elements and parse the testcase files concurrently
+    testcase_uris = []
     for testcases_elem in documentation_elem.element_children():
         if testcases_elem.local_name == 'testcases':
             root = urllib.parse.urljoin(testcases_elem.base_uri, attr_val(testcases_elem, 'root')+'/')
@@ -223,38 +235,37 @@ def load_testsuite(index_uri):
                 if testcase_elem.local_name == 'testcase':
                     # Get the value of the @uri attribute and make any relative uris absolute to the base uri
                     uri = urllib.parse.urljoin(root, attr_val(testcase_elem, 'uri'))
-                    # Load the testcase file
-                    testcases.append(load_testcase(uri))
-    testsuite['testcases'] = testcases
+                    testcase_uris.append(uri)
+    testsuite['testcases'] = testsuite_cache.load_testcases(testcase_uris, load_testcase, max_workers)
+    testsuite_cache.save_testsuite_model(cache_path, index_uri, context, testsuite)
 
     runtime = time.time() - start
     logging.info('Finished loading testsuite index %s in %fs', index_uri, runtime)
     return testsuite
 
 
-def instance_name_from_zip(path):
-    """Determines the instance filename within a SEC EDGAR zip archive."""
+def instance_name_from_zip(names):
+    """Determines the instance filename from the member names of a SEC EDGAR zip archive."""
     re_instance_name = re.compile(r'.+-\d{8}\.xml')
-    for name in zipfile.ZipFile(path).namelist():
+    for name in names:
         if re_instance_name.fullmatch(name):
             return name
     raise RuntimeError('Zip archive does not contain a valid SEC instance file.')
 
 
+# Zip archives of the variations, downloaded once per run into the testsuite directory (set up by init_archive_cache)
+archive_cache = None
+
+
+def init_archive_cache(target_dir):
+    global archive_cache
+    archive_cache = downloader.ArchiveCache(target_dir)
+
+
 def get_uri_in_zip(zipURI, catalog):
     if catalog is not None:
         zipURI = catalog.resolve_uri(zipURI)
-    urlparseResult = urllib.parse.urlparse(zipURI)
-
-    if urlparseResult.scheme != 'file':
-        tmpzip = tempfile.NamedTemporaryFile(suffix='.zip', delete=False).name
-        logging.info('Downloading archive %s to %s', zipURI, tmpzip)
-        urllib.request.urlretrieve(zipURI, tmpzip)
-        zipPath = tmpzip
-    else:
-        zipPath = file_uri_to_os_path(zipURI)
-    uri = 'file:{0}%7Czip/{1}'.format(urllib.request.pathname2url(zipPath), instance_name_from_zip(zipPath))
-    return uri
+    return archive_cache.member_uri(zipURI, instance_name_from_zip)
 
 
 def execute_variation(testcase, variation, xp, catalog, args):
@@ -294,27 +305,6 @@ def execute_variation(testcase, variation, xp, catalog, args):
     return 'PASS' if passed else 'FAIL', error_counts
 
 
-def write_doc(path, content, mode="wb"):
-    dir, file = os.path.split(path)
-    if not os.path.exists(dir):
-        os.makedirs(dir)
-    f = open(path, mode)
-    f.write(content)
-    f.close()
-
-
-def download_doc(url, target):
-    logging.info('Downloading %s => %s' % (url, target))
-    content = urllib.request.urlopen(url).read()
-    write_doc(target, content, "wb")
-
-
-def remote_uri_to_os_path(target_dir, uri):
-    url_parts = urllib.parse.urlparse(uri)
-    path = url_parts.path[1:] if url_parts.path.startswith("/") else url_parts.path
-    return os.path.join(target_dir, url_parts.netloc, path)
-
-
 def is_remote(uri):
     url_parts = urllib.parse.urlparse(uri)
     return url_parts.scheme != "file"
@@ -325,30 +315,10 @@ def file_uri_to_os_path(uri):
     return urllib.request.url2pathname(url_parts.path)
 
 
-def os_path_to_file_uri(path):
-    return urllib.request.pathname2url(path)
-
-
-def download_files_and_create_catalog(doc_uris, target_dir):
+def download_files_and_create_catalog(doc_uris, target_dir, max_workers):
+    """Mirrors the remote documents into target_dir using a pool of keep-alive connections and writes catalog.xml mapping them to the local copies."""
     logging.info('Start downloading files and creating catalog')
-
-    catalog_template = """<?xml version='1.0' encoding='UTF-8'?>
-<catalog xmlns='urn:oasis:names:tc:entity:xmlns:xml:catalog' xmlns:xsi='http://www.w3.org/2001/XMLSchema-instance' xsi:schemaLocation='urn:oasis:names:tc:entity:xmlns:xml:catalog Catalog.xsd'>
-%(mappings)s
-</catalog>
-"""
-    uri_mapping_template = """<uri name="%(source)s" uri="%(target)s"/>"""
-
-    lines = []
-    catalog_path = os.path.join(target_dir, "catalog.xml")
-    for uri in doc_uris:
-        target_abs = remote_uri_to_os_path(target_dir, uri)
-        target_rel = os_path_to_file_uri(os.path.relpath(target_abs, target_dir))
-        download_doc(uri, target_abs)
-        lines.append(uri_mapping_template % {"source": uri, "target": target_rel})
-
-    catalog_content = catalog_template % {"mappings": "\n  ".join(lines)}
-    write_doc(catalog_path, catalog_content, "w")
+    downloader.download_and_create_catalog(doc_uris, target_dir, os.path.join(target_dir, "catalog.xml"), max_workers=max_workers)
     logging.info('Finished downloading files and creating catalog')
 
 
@@ -423,6 +393,7 @@ def execute_testsuite(testsuite, args):
 
     testsuite_path, testsuite_index = os.path.split(file_uri_to_os_path(testsuite['uri']))
     catalog_path = os.path.join(testsuite_path, "catalog.xml")
+    init_archive_cache(testsuite_path)
 
     catalog = None
     if os.path.exists(catalog_path):
@@ -433,11 +404,13 @@ def execute_testsuite(testsuite, args):
 
     xp = setup_xule_processor(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(args.uri)))), catalog)
             
+    timings = testsuite_cache.TimingDatabase(args.timing_db)
+
     results = {}
     with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
 
-        # Schedule processing of all variations as futures
-        futures = {}
+        # Collect all variations which need to be executed
+        tasks = []
         for testcase in testsuite['testcases']:
             if args.testcase_numbers and testcase['number'] not in args.testcase_numbers:
                 continue
@@ -446,16 +419,33 @@ def execute_testsuite(testsuite, args):
             for variation in testcase['variations']:
                 if args.variation_ids and variation['id'] not in args.variation_ids:
                     continue
-                futures[executor.submit(execute_variation, testcase, variation, xp, catalog, args)] = (testcase['uri'], variation['id'])
+                tasks.append(((testcase['uri'], variation['id']), '%s/%s' % (testcase['number'], variation['id']), testcase, variation))
+
+        # Select the variations of this shard
+        tasks = testsuite_cache.select_shard(tasks, lambda task: task[1], args.shard, (lambda task: timings.predict(task[1])) if args.shard_by == 'runtime' else None)
+
+        # Schedule processing of all variations as futures, longest first according to the timings of previous runs
+        tasks = testsuite_cache.longest_first(tasks, lambda task: timings.predict(task[1]))
+        predicted = testsuite_cache.predict_makespan([timings.predict(task[1]) for task in tasks], args.max_workers)
+        submitted = time.time()
+        futures = {}
+        for variation_key, name, testcase, variation in tasks:
+            futures[executor.submit(testsuite_cache.timed_call, execute_variation, testcase, variation, xp, catalog, args)] = (variation_key, name)
 
         # Wait for all futures to finish
+        runtimes = []
         for future in concurrent.futures.as_completed(futures):
-            variation_key = futures[future]
+            variation_key, name = futures[future]
             try:
-                results[variation_key] = future.result()
+                results[variation_key], variation_runtime = future.result()
+                timings.record(name, variation_runtime)
+                runtimes.append(variation_runtime)
             except:
                 results[variation_key] = 'EXCEPTION', collections.Counter()
                 logging.exception('[%s] Exception raised during testcase execution:', variation_key[1])
+        testsuite_cache.report_makespan(predicted, time.time() - submitted, runtimes, args.max_workers)
+
+    timings.save()
 
     runtime = time.time() - start
     logging.info('Finished executing testcase variations in %fs', runtime)
@@ -561,11 +551,11 @@ def print_results(testsuite, results, runtime):
 def run_xbrl_testsuite(uri, args):
     """Load and execute the conformance testsuite."""
     try:
-        testsuite = load_testsuite(uri)
+        testsuite = load_testsuite(uri, args.max_workers, args.testsuite_cache)
         if args.create_catalog:
             target_dir = os.path.dirname(file_uri_to_os_path(testsuite['uri']))
             remote_uris = collect_remote_uris(testsuite, args)            
-            download_files_and_create_catalog(remote_uris, target_dir)
+            download_files_and_create_catalog(remote_uris, target_dir, args.max_workers)
         results, runtime = execute_testsuite(testsuite, args)
         logging.info('Start generating testsuite report')
         if args.csv_file:
@@ -606,10 +596,49 @@ def parse_args():
     parser.add_argument('-v', '--variation', metavar='VARIATION_ID', dest='variation_ids', nargs='*', help='limit execution to only this variation id')
     parser.add_argument('-w', '--workers', metavar='MAX_WORKERS', type=int, dest='max_workers', default=multiprocessing.cpu_count(), help='limit number of workers')
     parser.add_argument('--create-catalog', dest='create_catalog', action='store_true', help='download all remote files and create a catalog for them')
+    parser.add_argument('--timing-db', metavar='TIMING_FILE', dest='timing_db', default='dqc_testsuite_xule_timings.json', help='file with the runtimes of previous runs used for longest-first scheduling (default dqc_testsuite_xule_timings.json, empty to disable)')
+    parser.add_argument('--testsuite-cache', metavar='CACHE_FILE', dest='testsuite_cache', default='dqc_testsuite_xule_index.pickle', help='cache file for the parsed testsuite index and testcase files (default dqc_testsuite_xule_index.pickle, empty to disable)')
+    parser.add_argument('--shard', metavar='INDEX/COUNT', dest='shard', type=testsuite_cache.parse_shard, help='execute only the INDEX-th of COUNT slices of the variations (INDEX counting from 1)')
+    parser.add_argument('--shard-by', dest='shard_by', choices=['hash', 'runtime'], default='hash', help='partition variations by a stable hash of their id or balance the runtimes of a timing database shared by all shards (hash|runtime)')
     return parser.parse_args()
 
 
+def parse_merge_args():
+    """Parse command line arguments of the merge subcommand"""
+    parser = argparse.ArgumentParser(prog='dqc_testsuite_xule.py merge', description='Merge the CSV reports of several testsuite shards into a single report')
+    parser.add_argument('uri', metavar='INDEX', help='main testsuite index file')
+    parser.add_argument('shard_reports', metavar='SHARD_CSV', nargs='+', help='csv report of a testsuite shard')
+    parser.add_argument('-l', '--log', metavar='LOG_FILE', dest='log_file', help='log output file')
+    parser.add_argument('--log-level', metavar='LOG_LEVEL', dest='log_level', choices=['ERROR', 'WARNING', 'INFO', 'DEBUG'], default='INFO', help='log level (ERROR|WARNING|INFO|DEBUG)')
+    parser.add_argument('--csv-report', metavar='CSV_FILE', dest='csv_file', help='write merged testsuite results to csv')
+    parser.add_argument('--xml-report', metavar='XML_FILE', dest='xml_file', help='write merged testsuite results to xml')
+    parser.add_argument('--relative-uris', dest='relative_uris', action='store_true', help='write testcase uris relative to testsuite index file')
+    parser.add_argument('--testsuite-cache', metavar='CACHE_FILE', dest='testsuite_cache', default='dqc_testsuite_xule_index.pickle', help='cache file for the parsed testsuite index and testcase files (default dqc_testsuite_xule_index.pickle, empty to disable)')
+    return parser.parse_args(sys.argv[2:])
+
+
+def merge_shard_reports(args):
+    """Combines the per-shard CSV reports and writes the merged report."""
+    try:
+        testsuite = load_testsuite(args.uri, cache_path=args.testsuite_cache)
+        results, runtime = testsuite_cache.merge_csv_reports(args.shard_reports, testsuite)
+        if args.csv_file:
+            write_csv_report(args.csv_file, testsuite, results, runtime, args.relative_uris)
+        if args.xml_file:
+            write_xml_report(args.xml_file, testsuite, results, runtime, args.relative_uris)
+        if not args.csv_file and not args.xml_file:
+            print_results(testsuite, results, runtime)
+    except:
+        logging.exception('Merging shard reports aborted with exception:')
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        args = parse_merge_args()
+        setup_logging(args)
+        merge_shard_reports(args)
+        return
+
     # Parse command line arguments
     args = parse_args()
 
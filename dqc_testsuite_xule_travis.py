@@ -49,6 +49,7 @@ import zipfile
 
 from altova_api.v2 import xml, xsd, xbrl, beta, ProductInfo
 xbrl.xule = beta.xbrl.xule
+import downloader
 
 Result = collections.namedtuple('Result', ['code', 'message', 'severity'])
 
@@ -73,42 +74,27 @@ def load_instance(file,catalog=None):
             raise ValidationError(log)
     return inst        
         
-def write_doc(path, content, mode='wb'):
-    dir, file = os.path.split(path)
-    if not os.path.exists(dir):
-        os.makedirs(dir)
-    f = open(path, mode)
-    f.write(content)
-    f.close()
-
-def download_url(url, path):
-    content = urllib.request.urlopen(url).read()
-    write_doc(path, content, 'wb')
-
-def remote_url_to_path(url, target_dir):
-    url_parts = urllib.parse.urlparse(url)
-    path = url_parts.path[1:] if url_parts.path.startswith('/') else url_parts.path
-    return os.path.join(target_dir, url_parts.netloc, path)
-
 def is_remote(url):
     url_parts = urllib.parse.urlparse(url)
     return len(url_parts.scheme)>0 and url_parts.scheme != 'file'
 
 def collect_remote_urls(testsuite, catalog=None):
-    for i, entry in enumerate(testsuite['variations']):
-        print('%d/%d'%(i+1,len(testsuite['variations'])), entry['file'])
-        if is_remote(entry['file']):
-            yield entry['file']
+    # Several variations share the same instance file which only needs to be loaded once
+    files = sorted(set(entry['file'] for entry in testsuite['variations']))
+    for i, file in enumerate(files):
+        print('%d/%d'%(i+1,len(files)), file)
+        if is_remote(file):
+            yield file
         try:
-            inst = load_instance(entry['file'] if is_remote(entry['file']) else os.path.join(root_dir,entry['file']), catalog=catalog)
+            inst = load_instance(file, catalog=catalog)
             for doc in inst.dts.documents:
                 if is_remote(doc.uri):
                     yield doc.uri
         except Exception as ex:
             print(ex)        
         
-def download_remote_urls(testsuite, target_dir, catalog=None):
-    entries = []
+def collect_catalog_urls(testsuite, catalog=None):
+    """Returns the remote urls of the DQC resource files and of all documents referenced by the testsuite instances."""
     urls = [
         'https://raw.githubusercontent.com/DataQualityCommittee/dqc_us_rules/master/dqc_us_rules/resources/DQC_US_0011/dqc_0011.csv',
         'https://raw.githubusercontent.com/DataQualityCommittee/dqc_us_rules/master/dqc_us_rules/resources/DQC_US_0015/dqc_15_concepts.csv',        
@@ -131,28 +117,13 @@ def download_remote_urls(testsuite, target_dir, catalog=None):
         'https://raw.githubusercontent.com/DataQualityCommittee/dqc_us_rules/v8/dqc_us_rules/resources/DQC_US_0079/dqc_0079.csv',
         'https://raw.githubusercontent.com/DataQualityCommittee/dqc_us_rules/v8/dqc_us_rules/resources/DQC_IFRS_0080/dqc_0080_ifrs_2018_concepts.csv',
     ]
-    urls.extend(list(collect_remote_urls(testsuite, catalog=catalog)))
-    for url in urls:
-        print(url)
-        path = remote_url_to_path(url, target_dir)
-        print(path)
-        if not os.path.exists(path):
-            download_url(url, path)
-        entries.append((url, path))
-    return entries
-
-def write_catalog(catalog_dir, entries):
-    with open(os.path.join(catalog_dir,'catalog.xml'),'w') as f:
-        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        f.write('<catalog xmlns="urn:oasis:names:tc:entity:xmlns:xml:catalog" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n')
-        for url, path in entries:
-            f.write('\t<uri name="{url}" uri=".{path}"/>\n'.format(url=url, path=path[len(catalog_dir):].replace('\\','/')))
-        f.write("</catalog>")
-
-def create_catalog(testsuite, root_dir, catalog=None):
+    urls.extend(collect_remote_urls(testsuite, catalog=catalog))
+    return urls
+
+def create_catalog(testsuite, root_dir, catalog=None, max_workers=8):
     catalog_dir = os.path.join(root_dir, 'tests', 'input')
-    entries = download_remote_urls(testsuite, catalog_dir, catalog=catalog)
-    write_catalog(catalog_dir, entries)                
+    urls = collect_catalog_urls(testsuite, catalog=catalog)
+    downloader.download_and_create_catalog(urls, catalog_dir, os.path.join(catalog_dir, 'catalog.xml'), max_workers=max_workers)
 
 def load_catalog(root_dir):
     catalog_path = os.path.join(root_dir, 'tests', 'input', 'catalog.xml')
@@ -212,9 +183,10 @@ def load_testsuite(root_dir):
         'variations': variations
     }
 
-def execute_variation(variation, xp, catalog):
-    logging.info('[%s: %s] Validating instance', variation['file'], variation['xule_run_only'])
-    inst = load_instance(variation['file'], catalog)
+def execute_variation(variation, xp, catalog, inst=None):
+    if inst is None:
+        logging.info('[%s: %s] Validating instance', variation['file'], variation['xule_run_only'])
+        inst = load_instance(variation['file'], catalog)
 
     logging.info('[%s: %s] Start executing rule', variation['file'], variation['xule_run_only'])
     results = set()
@@ -261,6 +233,21 @@ def execute_variation(variation, xp, catalog):
     logging.debug('[%s: %s] Results:\n%s', variation['file'], variation['xule_run_only'], results)
     return conformance, results
 
+def execute_variation_group(file, variations, xp, catalog):
+    """Loads the instance file once and executes all variations for that file against it. Returns a list of (variation key, result) tuples."""
+    logging.info('[%s] Validating instance for %d rules', file, len(variations))
+    inst = load_instance(file, catalog)
+
+    results = []
+    for variation in variations:
+        variation_key = (variation['file'], variation['xule_run_only'])
+        try:
+            results.append((variation_key, execute_variation(variation, xp, catalog, inst)))
+        except:
+            results.append((variation_key, ('EXCEPTION', collections.Counter())))
+            logging.exception('[%s: %s] Exception raised during testcase execution:', *variation_key)
+    return results
+
 def execute_testsuite(testsuite, args):
 
     catalog = load_catalog(args.dir)
@@ -270,23 +257,29 @@ def execute_testsuite(testsuite, args):
     start = time.time()  
     
     results = {}
+    # Group the variations by instance file so that each filing is only loaded once
+    groups = collections.OrderedDict()
+    for variation in testsuite['variations']:
+        if args.variation_uris and variation['file'] not in args.variation_uris:
+            continue
+        groups.setdefault(variation['file'], []).append(variation)
+
     with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
         futures = {}
-        for variation in testsuite['variations']:
-            if args.variation_uris and variation['file'] not in args.variation_uris:
-                continue
-            futures[executor.submit(execute_variation, variation, xp, catalog)] = variation
+        for file, variations in groups.items():
+            futures[executor.submit(execute_variation_group, file, variations, xp, catalog)] = variations
         
         for future in concurrent.futures.as_completed(futures,):
-            variation = futures[future]
-            variation_key = (variation['file'], variation['xule_run_only'])
+            variations = futures[future]
             try:
+                group_results = future.result()
+            except:
+                group_results = [((variation['file'], variation['xule_run_only']), ('EXCEPTION', collections.Counter())) for variation in variations]
+                logging.exception('[%s] Exception raised during testcase execution:', variations[0]['file'])
+            for variation_key, result in group_results:
                 if variation_key in results:
                     logging.warning('[%s: %s] Duplicate variation', *variation_key)
-                results[variation_key] = future.result()
-            except:
-                results[variation_key] = 'EXCEPTION', collections.Counter()
-                logging.exception('[%s: %s] Exception raised during testcase execution:', *variation_key)
+                results[variation_key] = result
                                 
     runtime = time.time() - start
     logging.info('Finished executing testcase variations in %fs', runtime)                                
@@ -359,7 +352,7 @@ def run_xbrl_testsuite(args):
     try:
         testsuite = load_testsuite(args.dir)
         if args.create_catalog:
-            create_catalog(testsuite, args.dir)
+            create_catalog(testsuite, args.dir, max_workers=args.max_workers)
         results, runtime = execute_testsuite(testsuite, args)
         logging.info('Start generating testsuite report')
         if args.csv_file:
@@ -21,6 +21,11 @@ __version__ = '5.1.0'
 # The following script parameters can be additionally specified:
 #
 #   suppressErrors                  A list of DQC.US.nnnn.mmm error codes separated by | characters.
+#   dqcRules                        A list of DQC rules (e.g. DQC_0015 or 0015) separated by | characters. Only these rules are executed.
+#   dqcSkipRules                    A list of DQC rules separated by | characters which are not executed.
+#   dqcProfile                      Set to true to report the wall time, fact lookups and findings of each executed rule as INFO messages.
+#   dqcProfileFile                  Path of a JSON file to which the per-rule profile is written (implies dqcProfile).
+#   dqcWorkers                      Number of threads used to execute the DQC rules concurrently (default 1). Findings are still reported in rule order.
 #
 # Example invocations
 #
@@ -28,6 +33,8 @@ __version__ = '5.1.0'
 #   raptorxmlxbrl valxbrl --script=dqc_validation.py instance.xml
 # Suppress a specific error
 #   raptorxmlxbrl valxbrl --script=dqc_validation.py --script-param=suppressErrors:DQC.US.0004.16 instance.xml
+# Execute only some rules and profile them
+#   raptorxmlxbrl valxbrl --script=dqc_validation.py --script-param=dqcRules:DQC_0015|DQC_0043 --script-param=dqcProfile:true instance.xml
 # Validate a single filing using EFM and DQC rules
 #   raptorxmlxbrl valxbrl --script=efm_validation.py --script-param=enableDqcValidation:true instance.xml
 #
@@ -45,18 +52,29 @@ __version__ = '5.1.0'
 
 
 import collections
+import concurrent.futures
 import datetime
 import decimal
+import functools
+import itertools
 import json
 import operator
 import os
 import re
 import sys
+import threading
+import time
 import altova_api.v2.xml as xml
 import altova_api.v2.xsd as xsd
 import altova_api.v2.xbrl as xbrl
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 RuleInfo = collections.namedtuple('ruleInfo', ['ruleVersion', 'releaseDate', 'url'])
+CompiledMsg = collections.namedtuple('CompiledMsg', ['msg', 'content', 'hints', 'version'])
 
 re_namespaces = {
     'country':  re.compile(r'http://xbrl\.(?:us|sec\.gov)/country/([0-9]{4})-([0-9]{2})-([0-9]{2})'),
@@ -278,27 +296,42 @@ def handle_param(msg_parts, msg_params, param_parts, param, param_value):
         msg_params[param] = xbrl.Error.Param(str(param_value), quotes=False)
 
 
-def create_error(msg, location, severity, children, **kargs):
-    """Creates a xbrl.Error object from a message template msg and other arguments depending on the template."""
-    msg_parts = []
-    msg_params = {}
+def compile_msg_template(msg):
+    """Splits a message template into a tuple of literal text parts and (param, param_parts) tuples for each ${...} placeholder."""
+    tokens = []
 
     text_start = 0
     while True:
         param_start = msg.find('${', text_start)
         if param_start == -1:
-            msg_parts.append(msg[text_start:])
+            tokens.append(msg[text_start:])
             break
         if text_start < param_start:
-            msg_parts.append(msg[text_start:param_start])
+            tokens.append(msg[text_start:param_start])
 
         param_start += 2
         param_end = msg.find('}', param_start)
         param = msg[param_start:param_end]
-        param_parts = param.split('.')
-        param = param.replace(':', '_')
-        param_values = kargs
+        tokens.append((param.replace(':', '_'), tuple(param.split('.'))))
 
+        text_start = param_end+1
+
+    return tuple(tokens)
+
+
+def bind_msg_template(tokens, location, severity, children, **kargs):
+    """Creates a xbrl.Error object from a compiled message template and other arguments depending on the template."""
+    msg_parts = []
+    msg_params = {}
+
+    param_values = kargs
+    for token in tokens:
+        if isinstance(token, str):
+            msg_parts.append(token)
+            continue
+
+        param, param_parts = token
+        param_parts = list(param_parts)
         if param_parts[0] not in param_values:
             raise KeyError('Missing value for parameter '+param_parts[0])
 
@@ -313,57 +346,82 @@ def create_error(msg, location, severity, children, **kargs):
             for param_value in param_values[param_parts[0]]:
                 if param_index > 1:
                     msg_parts.append(", ")
-                handle_param(msg_parts, msg_params, param_parts, "%s_%d" % (param, param_index), param_value)
+                handle_param(msg_parts, msg_params, list(param_parts), "%s_%d" % (param, param_index), param_value)
                 param_index += 1
         else:
             handle_param(msg_parts, msg_params, param_parts, param, param_values[param_parts[0]])
 
-        text_start = param_end+1
-
     return xbrl.Error.create(''.join(msg_parts), location=location, severity=severity, children=children, **msg_params)
 
 
+def create_error(msg, location, severity, children, **kargs):
+    """Creates a xbrl.Error object from a message template msg and other arguments depending on the template."""
+    return bind_msg_template(compile_msg_template(msg), location, severity, children, **kargs)
+
+
+def compile_msg(msg, rule_version):
+    """Compiles a single message entry (msg, content and hint templates) from dqc_msg_templates.json."""
+    content = msg.get('content', [])
+    if not isinstance(content, list):
+        content = [content]
+
+    hints = msg.get('hint', [])
+    if not isinstance(hints, list):
+        hints = [hints]
+
+    return CompiledMsg(compile_msg_template(msg['msg']), [compile_msg_template(submsg) for submsg in content], [compile_msg_template(hint) for hint in hints], rule_version)
+
+
+def compile_msg_templates(templates):
+    """Returns a dict with the compiled messages keyed by error code. Entries with variations are stored as dict of compiled messages keyed by variation name."""
+    compiled_templates = {}
+    for rule_id, msg in templates.items():
+        rule_version = RuleInfo(*msg['version'])
+        if 'variations' in msg:
+            compiled_templates[rule_id] = {variation: compile_msg(submsg, rule_version) for variation, submsg in msg['variations'].items()}
+        else:
+            compiled_templates[rule_id] = compile_msg(msg, rule_version)
+    return compiled_templates
+
+
+compiled_msg_templates = compile_msg_templates(msg_templates)
+compiled_msg_template_properties_title = compile_msg_template(msg_template_properties[0])
+compiled_msg_template_properties = [(compile_msg_template(line), 'fact1' in line) for line in msg_template_properties[1:]]
+
+
 def report_error(error_log, suppress_errors, rule_id, location=None, variation=None, **kargs):
     """Constructs and reports an error given an error code and additional arguments. This function creates xbrl.Error objects according to the associated message template and adds it to the error log."""
     if rule_id in suppress_errors or rule_id.rsplit('.', 1)[0] in suppress_errors:
         return
-    if rule_id in msg_templates:
-        msg = msg_templates[rule_id]
+    if rule_id in compiled_msg_templates:
+        msg = compiled_msg_templates[rule_id]
     else:
         # Remove test case number
-        msg = msg_templates[rule_id.rsplit('.', 1)[0]]
-    kargs['ruleVersion'] = RuleInfo(*msg['version'])
+        msg = compiled_msg_templates[rule_id.rsplit('.', 1)[0]]
     if variation is not None:
-        msg = msg['variations'][variation]
+        msg = msg[variation]
+    kargs['ruleVersion'] = msg.version
 
     property_lines = []
-    for line in msg_template_properties[1:]:
-        if 'fact1' not in line or 'fact1' in kargs:
-            property_lines.append(create_error(line, None, xml.ErrorSeverity.OTHER, None, **kargs))
+    for line, uses_fact1 in compiled_msg_template_properties:
+        if not uses_fact1 or 'fact1' in kargs:
+            property_lines.append(bind_msg_template(line, None, xml.ErrorSeverity.OTHER, None, **kargs))
 
     child_lines = []
-    content = msg.get('content', [])
-    if not isinstance(content, list):
-        content = [content]
-
-    hints = msg.get('hint', [])
-    if not isinstance(hints, list):
-        hints = [hints]
-
-    for submsg in content:
-        child_lines.append(create_error(submsg, None, xml.ErrorSeverity.OTHER, None, **kargs))
+    for submsg in msg.content:
+        child_lines.append(bind_msg_template(submsg, None, xml.ErrorSeverity.OTHER, None, **kargs))
 
-    for hint in hints:
-        child_lines.append(create_error(hint, None, xml.ErrorSeverity.INFO, None, **kargs))
+    for hint in msg.hints:
+        child_lines.append(bind_msg_template(hint, None, xml.ErrorSeverity.INFO, None, **kargs))
 
     if 'fact1' in kargs:
         location = kargs['fact1']
-        child_lines.append(create_error(msg_template_properties[0], None, xml.ErrorSeverity.OTHER, property_lines, **kargs))
+        child_lines.append(bind_msg_template(compiled_msg_template_properties_title, None, xml.ErrorSeverity.OTHER, property_lines, **kargs))
     elif property_lines:
         child_lines.extend(property_lines)
 
-    msg_text = '[%s] %s' % (rule_id, msg['msg'])
-    error_log.report(create_error(msg_text, location, xml.ErrorSeverity.ERROR, child_lines, **kargs))
+    msg_text = ('[%s] ' % rule_id,) + msg.msg
+    error_log.report(bind_msg_template(msg_text, location, xml.ErrorSeverity.ERROR, child_lines, **kargs))
 
 
 def decimal_comparison(fact1, fact2, cmp):
@@ -388,6 +446,68 @@ def less_or_equal(val1, val2, decimals=None):
     return val1 <= val2
 
 
+def _scaled_int(value, decimals):
+    """Returns the Decimal value, which is already rounded to decimals, as an exact int scaled by 10**decimals or None if it is not a multiple of 10**-decimals."""
+    if not value.is_finite():
+        return None
+    sign, digits, exponent = value.as_tuple()
+    n = int(''.join(map(str, digits)))
+    shift = exponent + decimals
+    if shift >= 0:
+        n *= 10 ** shift
+    else:
+        n, remainder = divmod(n, 10 ** -shift)
+        if remainder:
+            return None
+    return -n if sign else n
+
+
+# Comparison functions on scaled integers (both values rounded to the same decimals) for each supported decimal_comparison cmp function.
+_scaled_comparisons = {
+    equal_within_tolerance: lambda a, b: abs(a - b) <= 2,
+    less_or_equal: lambda a, b: a <= b,
+}
+
+# Scaled integers with a larger magnitude are not compared with numpy int64 arrays, so that a - b cannot overflow.
+_int64_limit = 2 ** 62
+
+
+def bulk_decimal_comparison(pairs, cmp):
+    """Returns a list with the result of decimal_comparison(fact1, fact2, cmp) for each (fact1, fact2) pair.
+
+    Each fact is rounded only once per decimals value and converted to a scaled integer. The comparisons are then done on numpy int64 arrays if numpy is available and all values fit, otherwise on exact Python ints. Pairs with infinite decimals, values which cannot be scaled exactly or unsupported cmp functions use decimal_comparison()."""
+    scaled_cmp = _scaled_comparisons.get(cmp)
+    if scaled_cmp is None:
+        return [decimal_comparison(fact1, fact2, cmp) for fact1, fact2 in pairs]
+
+    results = [None] * len(pairs)
+    scaled_values = {}
+    bulk_indices, bulk_values1, bulk_values2 = [], [], []
+    for i, (fact1, fact2) in enumerate(pairs):
+        decimals = min(fact1.inferred_decimals, fact2.inferred_decimals)
+        if decimals != float('inf'):
+            values = []
+            for fact in (fact1, fact2):
+                key = (fact, decimals)
+                if key not in scaled_values:
+                    scaled_values[key] = _scaled_int(fact.round_numeric_value(decimals), decimals)
+                values.append(scaled_values[key])
+            if values[0] is not None and values[1] is not None:
+                bulk_indices.append(i)
+                bulk_values1.append(values[0])
+                bulk_values2.append(values[1])
+                continue
+        results[i] = decimal_comparison(fact1, fact2, cmp)
+
+    if numpy is not None and bulk_indices and all(-_int64_limit < _ < _int64_limit for _ in itertools.chain(bulk_values1, bulk_values2)):
+        bulk_results = scaled_cmp(numpy.array(bulk_values1, dtype=numpy.int64), numpy.array(bulk_values2, dtype=numpy.int64)).tolist()
+    else:
+        bulk_results = [scaled_cmp(a, b) for a, b in zip(bulk_values1, bulk_values2)]
+    for i, result in zip(bulk_indices, bulk_results):
+        results[i] = result
+    return results
+
+
 def dimension_value(fact, dim):
     """Returns the domain member for the given dimension aspect or None if fact does not have this dimension aspect."""
     aspect_value = fact.dimension_aspect_value(dim)
@@ -412,23 +532,12 @@ def reporting_period_ends(instance, dei_namespace):
     return reporting_period_end_for_legal_entity
 
 
-def textblock_facts(instance):
-    """Returns an xbrl.FactSet object with facts whose concept's item type is or is derived from textBlockItemType."""
+def textblock_facts(instance, concept_classifier):
+    """Returns an xbrl.FactSet object with facts whose concept's item type is or is derived from the DTR textBlockItemType."""
     facts = xbrl.FactSet()
-
-    type_textBlockItemType = instance.dts.schema.resolve_type_definition(xml.QName('textBlockItemType', 'http://www.xbrl.org/dtr/type/non-numeric'))
-    if type_textBlockItemType:
-
-        is_textblock_cache = {}
-        for fact in instance.facts:
-            is_textblock = is_textblock_cache.get(fact.concept, None)
-            if is_textblock is None:
-                is_textblock = fact.concept.type_definition.is_derived_from(type_textBlockItemType)
-                is_textblock_cache[fact.concept] = is_textblock
-
-            if is_textblock:
-                facts.add(fact)
-
+    for fact in instance.facts:
+        if concept_classifier.kind(fact.concept).dtr_textblock:
+            facts.add(fact)
     return facts
 
 
@@ -448,39 +557,531 @@ def is_extension(namespace):
     return re_standard_ns.match(namespace) is None
 
 
-def _subtree_children_iterate(network, concept, children):
-    for rel in network.relationships_from(concept):
-        children.append(rel)
-        _subtree_children_iterate(network, rel.target, children)
-
-
-def _subtree_children(network, concept):
-    children = []
-    _subtree_children_iterate(network, concept, children)
-    return children
-
-
-def _get_dimension_values_iterate(network, concept, dims):
-    if isinstance(concept, xbrl.xdt.Dimension):
-        dims[concept] = list(_subtree_children(network, concept))
-        return
-    for rel in network.relationships_from(concept):
-        _get_dimension_values_iterate(network, rel.target, dims)
-
-
-def _get_dimension_values(network):
-    dims = {}
-    for root in network.roots:
-        _get_dimension_values_iterate(network, root, dims)
-    return dims
-
-
-def dqc_0001(instance, error_log, suppress_errors, namespaces):
+CalcArc = collections.namedtuple('CalcArc', ['source_concept', 'target_concept', 'weight', 'arc', 'role'])
+
+
+class CalcGraph:
+    """Summation-item calculation graph of a DTS shared by the DQC calculation tree rules.
+
+    The calculation networks are fetched only once per link role. The adjacency lists (parent -> [CalcArc, ...] in relationship order), the merged cross-role view and the descendant sets are built on first use and cached."""
+
+    def __init__(self, dts):
+        self.link_roles = list(dts.calculation_link_roles(arcrole_summation_item))
+        self._networks = {linkrole: dts.calculation_network(linkrole, arcrole_summation_item) for linkrole in self.link_roles}
+        self._children = {linkrole: {} for linkrole in self.link_roles}
+        self._parents = {linkrole: {} for linkrole in self.link_roles}
+        self._relationships = {}
+        self._roots = {}
+        self._descendants = {linkrole: {} for linkrole in self.link_roles}
+        self._ancestors = {}
+        self._merged_children = {}
+        self._merged_descendants = {}
+
+    def has_link_role(self, linkrole):
+        """Returns True if the DTS contains a summation-item network for the given link role."""
+        return linkrole in self._networks
+
+    def _calc_arcs(self, linkrole, rels):
+        return [CalcArc(rel.source_concept, rel.target_concept, rel.weight, rel.arc, linkrole) for rel in rels]
+
+    def relationships(self, linkrole):
+        """Returns a list with all CalcArc tuples of the given link role."""
+        arcs = self._relationships.get(linkrole)
+        if arcs is None:
+            arcs = self._calc_arcs(linkrole, self._networks[linkrole].relationships)
+            self._relationships[linkrole] = arcs
+        return arcs
+
+    def roots(self, linkrole):
+        """Returns a list with the root concepts of the given link role."""
+        roots = self._roots.get(linkrole)
+        if roots is None:
+            roots = list(self._networks[linkrole].roots)
+            self._roots[linkrole] = roots
+        return roots
+
+    def children(self, linkrole, concept):
+        """Returns a list with the outgoing CalcArc tuples of concept within the given link role."""
+        children = self._children[linkrole]
+        arcs = children.get(concept)
+        if arcs is None:
+            arcs = self._calc_arcs(linkrole, self._networks[linkrole].relationships_from(concept))
+            children[concept] = arcs
+        return arcs
+
+    def parents(self, linkrole, concept):
+        """Returns a list with the incoming CalcArc tuples of concept within the given link role."""
+        parents = self._parents[linkrole]
+        arcs = parents.get(concept)
+        if arcs is None:
+            arcs = self._calc_arcs(linkrole, self._networks[linkrole].relationships_to(concept))
+            parents[concept] = arcs
+        return arcs
+
+    def merged_children(self, concept):
+        """Returns a list with the outgoing CalcArc tuples of concept across all link roles."""
+        arcs = self._merged_children.get(concept)
+        if arcs is None:
+            arcs = [arc for linkrole in self.link_roles for arc in self.children(linkrole, concept)]
+            self._merged_children[concept] = arcs
+        return arcs
+
+    def _collect_descendants(self, concept, children):
+        descendants = set()
+        todo = [concept]
+        while todo:
+            for arc in children(todo.pop()):
+                if arc.target_concept not in descendants:
+                    descendants.add(arc.target_concept)
+                    todo.append(arc.target_concept)
+        return frozenset(descendants)
+
+    def descendants(self, linkrole, concept):
+        """Returns a frozenset with all concepts reachable from concept within the given link role."""
+        descendants = self._descendants[linkrole].get(concept)
+        if descendants is None:
+            descendants = self._collect_descendants(concept, lambda x: self.children(linkrole, x))
+            self._descendants[linkrole][concept] = descendants
+        return descendants
+
+    def _build_ancestors(self, linkrole):
+        """Returns a dict with the ancestor frozenset of every concept within the given link role.
+
+        The strongly connected components are found with an iterative Tarjan walk along the parent edges, which emits each component after all components containing its ancestors. The ancestor sets can therefore be composed in emission order and concepts within a cycle share one set which includes the cycle members themselves."""
+        parents = {}
+        for arc in self.relationships(linkrole):
+            parents.setdefault(arc.source_concept, [])
+            parents.setdefault(arc.target_concept, []).append(arc.source_concept)
+
+        ancestors = {}
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        for start in parents:
+            if start in index:
+                continue
+            index[start] = lowlink[start] = len(index)
+            stack.append(start)
+            on_stack.add(start)
+            work = [(start, iter(parents[start]))]
+            while work:
+                concept, it = work[-1]
+                for parent in it:
+                    if parent not in index:
+                        index[parent] = lowlink[parent] = len(index)
+                        stack.append(parent)
+                        on_stack.add(parent)
+                        work.append((parent, iter(parents[parent])))
+                        break
+                    elif parent in on_stack:
+                        lowlink[concept] = min(lowlink[concept], index[parent])
+                else:
+                    work.pop()
+                    if work:
+                        lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[concept])
+                    if lowlink[concept] == index[concept]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.add(member)
+                            if member == concept:
+                                break
+                        result = set()
+                        for member in component:
+                            for parent in parents[member]:
+                                if parent in component:
+                                    result.update(component)
+                                else:
+                                    result.add(parent)
+                                    result.update(ancestors[parent])
+                        result = frozenset(result)
+                        for member in component:
+                            ancestors[member] = result
+        return ancestors
+
+    def ancestors(self, linkrole, concept):
+        """Returns a frozenset with all concepts from which concept is reachable within the given link role."""
+        ancestors = self._ancestors.get(linkrole)
+        if ancestors is None:
+            ancestors = self._build_ancestors(linkrole)
+            self._ancestors[linkrole] = ancestors
+        return ancestors.get(concept, frozenset())
+
+    def is_ancestor_of(self, linkrole, ancestor, descendant):
+        """Returns True if ancestor is descendant or one of its ancestors within the given link role."""
+        return ancestor == descendant or ancestor in self.ancestors(linkrole, descendant)
+
+    def merged_descendants(self, concept):
+        """Returns a frozenset with all concepts reachable from concept across all link roles."""
+        descendants = self._merged_descendants.get(concept)
+        if descendants is None:
+            descendants = self._collect_descendants(concept, self.merged_children)
+            self._merged_descendants[concept] = descendants
+        return descendants
+
+
+class StatementClassifier:
+    """Classifies the presentation link roles of a DTS once into statement kinds.
+
+    Each link role is tagged as one of 'cashFlow', 'balanceSheet', 'incomeStatement', 'parenthetical', 'statement' (any other statement), 'disclosure', 'document' or 'other'. The cash flow classification is the one which was used by the DQC 0048, 0049, 0057 and 0062 rules."""
+
+    def __init__(self, dts, ns):
+        self.link_roles = list(dts.presentation_link_roles(arcrole_parent_child))
+        self.kinds = {}
+        self.definitions = {}
+        abstracts = {}
+        for kind, name in (('cashFlow', 'StatementOfCashFlowsAbstract'), ('balanceSheet', 'StatementOfFinancialPositionAbstract'), ('incomeStatement', 'IncomeStatementAbstract')):
+            concept = dts.resolve_concept(xml.QName(name, ns)) if ns else None
+            if concept is not None:
+                abstracts[kind] = concept
+        for linkrole in self.link_roles:
+            roleDef = dts.role_definition(linkrole)
+            self.definitions[linkrole] = roleDef
+            self.kinds[linkrole] = self._classify(dts, linkrole, roleDef, abstracts)
+
+    @staticmethod
+    def _classify(dts, linkrole, roleDef, abstracts):
+        linkrole_lower = linkrole.lower()
+        if roleDef and roleDef.find('- Statement') != -1:
+            if linkrole_lower.find('parenthetical') != -1:
+                return 'parenthetical'
+            if linkrole_lower.find('cashflow') != -1:
+                return 'cashFlow'
+            nw = dts.presentation_network(linkrole, arcrole_parent_child)
+            for kind in ('cashFlow', 'balanceSheet', 'incomeStatement'):
+                if kind in abstracts and any(nw.relationships_from(abstracts[kind])):
+                    return kind
+            if any(linkrole_lower.find(_) != -1 for _ in ('balancesheet', 'financialposition', 'financialcondition')):
+                return 'balanceSheet'
+            if any(linkrole_lower.find(_) != -1 for _ in ('income', 'operations', 'earnings')):
+                return 'incomeStatement'
+            return 'statement'
+        if roleDef and roleDef.find('- Disclosure') != -1:
+            return 'disclosure'
+        if roleDef and roleDef.find('- Document') != -1:
+            return 'document'
+        return 'other'
+
+    def kind(self, linkrole):
+        """Returns the statement kind of the given link role."""
+        return self.kinds.get(linkrole, 'other')
+
+    def link_roles_of(self, kind):
+        """Returns a list with all link roles of the given statement kind in DTS order."""
+        return [linkrole for linkrole in self.link_roles if self.kinds[linkrole] == kind]
+
+    @property
+    def cashflow_link_roles(self):
+        """The link roles of cash flow statements."""
+        return self.link_roles_of('cashFlow')
+
+
+class PresentationTree:
+    """Parent-child presentation trees of a DTS shared by the DQC presentation rules.
+
+    Each presentation network is fetched only once per link role. Child lists, subtree relationship lists, subtree concept sets and the axis -> members map of each link role are built on first use and cached. Subtrees are walked iteratively and every concept is expanded at most once, so cycles in a network are harmless."""
+
+    def __init__(self, dts):
+        self.link_roles = list(dts.presentation_link_roles(arcrole_parent_child))
+        self._networks = {linkrole: dts.presentation_network(linkrole, arcrole_parent_child) for linkrole in self.link_roles}
+        self._roots = {}
+        self._children = {linkrole: {} for linkrole in self.link_roles}
+        self._subtrees = {linkrole: {} for linkrole in self.link_roles}
+        self._subtree_concepts = {linkrole: {} for linkrole in self.link_roles}
+        self._dimension_values = {}
+
+    def roots(self, linkrole):
+        """Returns a list with the root concepts of the given link role."""
+        roots = self._roots.get(linkrole)
+        if roots is None:
+            roots = list(self._networks[linkrole].roots)
+            self._roots[linkrole] = roots
+        return roots
+
+    def children(self, linkrole, concept):
+        """Returns a list with the outgoing relationships of concept within the given link role."""
+        children = self._children[linkrole]
+        rels = children.get(concept)
+        if rels is None:
+            rels = list(self._networks[linkrole].relationships_from(concept))
+            children[concept] = rels
+        return rels
+
+    def relationships(self, linkrole):
+        """Returns a list with all relationships of the given link role."""
+        return list(self._networks[linkrole].relationships)
+
+    def subtree(self, linkrole, concept):
+        """Returns a list with all relationships below concept within the given link role in depth-first order."""
+        subtrees = self._subtrees[linkrole]
+        rels = subtrees.get(concept)
+        if rels is None:
+            rels = []
+            expanded = {concept}
+            todo = [iter(self.children(linkrole, concept))]
+            while todo:
+                for rel in todo[-1]:
+                    rels.append(rel)
+                    if rel.target_concept not in expanded:
+                        expanded.add(rel.target_concept)
+                        todo.append(iter(self.children(linkrole, rel.target_concept)))
+                    break
+                else:
+                    todo.pop()
+            subtrees[concept] = rels
+        return rels
+
+    def subtree_concepts(self, linkrole, concept):
+        """Returns a frozenset with all concepts below concept within the given link role."""
+        subtree_concepts = self._subtree_concepts[linkrole]
+        concepts = subtree_concepts.get(concept)
+        if concepts is None:
+            concepts = frozenset(rel.target_concept for rel in self.subtree(linkrole, concept))
+            subtree_concepts[concept] = concepts
+        return concepts
+
+    def dimension_values(self, linkrole):
+        """Returns a dict with the subtree relationships of each dimension (axis) within the given link role."""
+        dims = self._dimension_values.get(linkrole)
+        if dims is None:
+            dims = {}
+            roots = self.roots(linkrole)
+            expanded = set(roots)
+            todo = list(reversed(roots))
+            while todo:
+                concept = todo.pop()
+                if isinstance(concept, xbrl.xdt.Dimension):
+                    dims[concept] = self.subtree(linkrole, concept)
+                    continue
+                for rel in reversed(self.children(linkrole, concept)):
+                    if rel.target_concept not in expanded:
+                        expanded.add(rel.target_concept)
+                        todo.append(rel.target_concept)
+            self._dimension_values[linkrole] = dims
+        return dims
+
+
+dtr_nonnumeric_namespace = 'http://www.xbrl.org/dtr/type/non-numeric'
+
+ConceptKind = collections.namedtuple('ConceptKind', ['textblock', 'escaped', 'domain_item', 'dtr_textblock'])
+
+
+class ConceptClassifier:
+    """Classifies the concepts of a DTS by their item types once and shares the result between the EFM and DQC rules.
+
+    The textblock, escaped and domain_item flags refer to textBlockItemType, escapedItemType and domainItemType in any of the given type namespaces, dtr_textblock always refers to the DTR textBlockItemType."""
+
+    def __init__(self, dts, type_namespaces):
+        self.schema = dts.schema
+        self.type_namespaces = list(type_namespaces)
+        self._base_to_derived_types = None
+        self._derived_types = {}
+        self._kinds = {}
+        self.domain_item_types = self._derived_types_in_namespaces('domainItemType')
+        self.textblock_types = self._derived_types_in_namespaces('textBlockItemType')
+        self.escaped_types = self._derived_types_in_namespaces('escapedItemType')
+        self.dtr_textblock_type = self.schema.resolve_type_definition(xml.QName('textBlockItemType', dtr_nonnumeric_namespace))
+
+    def derived_types(self, name, namespace):
+        """Returns a frozenset with the given type definition and all type definitions derived from it."""
+        key = (name, namespace)
+        types = self._derived_types.get(key)
+        if types is None:
+            if self._base_to_derived_types is None:
+                self._base_to_derived_types = {}
+                for type in self.schema.type_definitions:
+                    self._base_to_derived_types.setdefault(type.base_type_definition, []).append(type)
+            types = set()
+            type = self.schema.resolve_type_definition(xml.QName(name, namespace))
+            todo = [type] if type is not None else []
+            while todo:
+                type = todo.pop()
+                if type not in types:
+                    types.add(type)
+                    todo.extend(self._base_to_derived_types.get(type, []))
+            types = frozenset(types)
+            self._derived_types[key] = types
+        return types
+
+    def _derived_types_in_namespaces(self, name):
+        types = set()
+        for namespace in self.type_namespaces:
+            types.update(self.derived_types(name, namespace))
+        return frozenset(types)
+
+    def kind(self, concept):
+        """Returns the ConceptKind of the given concept."""
+        kind = self._kinds.get(concept)
+        if kind is None:
+            type = concept.type_definition
+            kind = ConceptKind(
+                textblock=type in self.textblock_types,
+                escaped=type in self.escaped_types,
+                domain_item=type in self.domain_item_types,
+                dtr_textblock=self.dtr_textblock_type is not None and type.is_derived_from(self.dtr_textblock_type))
+            self._kinds[concept] = kind
+        return kind
+
+
+class FilingProfile:
+    """DEI information of a filing which is looked up once and shared between the EFM and DQC rules.
+
+    The cik and required_contexts attributes are only available if they were determined by the EFM context validation."""
+
+    def __init__(self, instance, dei_namespace, us_gaap_namespace=None, us_gaap_year=0):
+        self.instance = instance
+        self.dei_namespace = dei_namespace
+        self.us_gaap_namespace = us_gaap_namespace
+        self.us_gaap_year = int(us_gaap_year)
+        self.cik = None
+        self.required_contexts = None
+        self.legal_entity_axis = instance.dts.resolve_concept(xml.QName('LegalEntityAxis', dei_namespace))
+        self._concepts = {}
+        self._facts = {}
+        self._period_ends = None
+        self._fiscal_period_focus = None
+        self._document_period_end_checks = None
+
+    def concept(self, name):
+        """Returns the DEI concept with the given local name or None."""
+        if name not in self._concepts:
+            self._concepts[name] = self.instance.dts.resolve_concept(xml.QName(name, self.dei_namespace))
+        return self._concepts[name]
+
+    def facts(self, name):
+        """Returns an xbrl.FactSet with all facts (including nil facts) of the DEI concept with the given local name."""
+        facts = self._facts.get(name)
+        if facts is None:
+            concept = self.concept(name)
+            facts = self.instance.facts.filter(concept) if concept else xbrl.FactSet()
+            self._facts[name] = facts
+        return facts
+
+    @property
+    def document_type(self):
+        """The value of the dei:DocumentType fact or None if the filing does not contain exactly one such fact."""
+        facts = self.facts('DocumentType')
+        return facts[0].normalized_value if len(facts) == 1 else None
+
+    def legal_entity(self, fact):
+        """Returns the LegalEntityAxis member of fact or None."""
+        return dimension_value(fact, self.legal_entity_axis)
+
+    @property
+    def period_ends(self):
+        """A dict of DocumentPeriodEndDate fact and end date tuples keyed by the legal entity domain member (see reporting_period_ends())."""
+        if self._period_ends is None:
+            self._period_ends = reporting_period_ends(self.instance, self.dei_namespace)
+        return self._period_ends
+
+    @property
+    def fiscal_period_focus(self):
+        """A dict of DocumentFiscalPeriodFocus facts keyed by the legal entity domain member."""
+        if self._fiscal_period_focus is None:
+            self._fiscal_period_focus = {self.legal_entity(fact): fact for fact in self.facts('DocumentFiscalPeriodFocus')}
+        return self._fiscal_period_focus
+
+    @property
+    def document_period_end_checks(self):
+        """A list of (DocumentPeriodEndDate fact, is_valid) tuples where is_valid is True if the fact value is within 3 days of its context period end."""
+        if self._document_period_end_checks is None:
+            checks = []
+            for fact in self.facts('DocumentPeriodEndDate'):
+                end_date = datetime.datetime.combine(fact.element.schema_actual_value.value, datetime.time()) + datetime.timedelta(days=1)
+                checks.append((fact, abs((end_date - fact.period_aspect_value.end).days) <= 3))
+            self._document_period_end_checks = checks
+        return self._document_period_end_checks
+
+
+class ModelCache:
+    """Per-filing models which are computed on first use and shared between all DQC rules.
+
+    Model creation is guarded by a lock so that concurrently executed rules build each model only once. The models themselves are only read afterwards; their internal memo tables may at worst compute an entry twice."""
+
+    def __init__(self, instance, namespaces, filing_profile=None, concept_classifier=None):
+        self.instance = instance
+        self.namespaces = namespaces
+        self._models = {}
+        self._lock = threading.RLock()
+        if filing_profile is not None:
+            self._models['filing_profile'] = filing_profile
+        if concept_classifier is not None:
+            self._models['concept_classifier'] = concept_classifier
+
+    def _model(self, name, factory):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = factory()
+                    self._models[name] = model
+        return model
+
+    @property
+    def filing_profile(self):
+        """The FilingProfile of the instance."""
+        return self._model('filing_profile', lambda: FilingProfile(self.instance, get_namespace(self.namespaces, 'dei'), *get_namespace_and_year(self.namespaces, 'us-gaap')))
+
+    @property
+    def concept_classifier(self):
+        """The ConceptClassifier of the instance DTS."""
+        return self._model('concept_classifier', lambda: ConceptClassifier(self.instance.dts, [dtr_nonnumeric_namespace]))
+
+    @property
+    def calc_graph(self):
+        """The CalcGraph of the instance DTS."""
+        return self._model('calc_graph', lambda: CalcGraph(self.instance.dts))
+
+    @property
+    def statements(self):
+        """The StatementClassifier of the instance DTS."""
+        return self._model('statements', lambda: StatementClassifier(self.instance.dts, get_namespace(self.namespaces, 'us-gaap')))
+
+    @property
+    def presentation(self):
+        """The PresentationTree of the instance DTS."""
+        return self._model('presentation', lambda: PresentationTree(self.instance.dts))
+
+    @property
+    def reported_concepts(self):
+        """A frozenset with the (namespace, local name) pairs of all concepts with facts (including nil facts) in the instance."""
+        return self._model('reported_concepts', lambda: frozenset((fact.qname.namespace_name, fact.qname.local_name) for fact in self.instance.facts))
+
+    def _build_network_concepts(self):
+        concepts = set()
+        for graph in (self.calc_graph, self.presentation):
+            for linkrole in graph.link_roles:
+                for rel in graph.relationships(linkrole):
+                    concepts.add((rel.source_concept.target_namespace, rel.source_concept.name))
+                    concepts.add((rel.target_concept.target_namespace, rel.target_concept.name))
+        return frozenset(concepts)
+
+    @property
+    def network_concepts(self):
+        """A frozenset with the (namespace, local name) pairs of all concepts used in calculation or presentation networks."""
+        return self._model('network_concepts', self._build_network_concepts)
+
+    def is_reported(self, namespace, *names):
+        """Returns True if facts of all the given concepts are reported in the instance."""
+        reported_concepts = self.reported_concepts
+        return all((namespace, name) in reported_concepts for name in names)
+
+    def is_in_networks(self, namespace, *names):
+        """Returns True if all the given concepts are used in calculation or presentation networks."""
+        network_concepts = self.network_concepts
+        return all((namespace, name) in network_concepts for name in names)
+
+
+def dqc_0001(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0001 Axis with Inappropriate Members"""
 
     handled = set()
-    for role in instance.dts.presentation_link_roles():
-        for dim, rels in _get_dimension_values(instance.dts.presentation_network(role)).items():
+    presentation = models.presentation
+    for role in presentation.link_roles:
+        for dim, rels in presentation.dimension_values(role).items():
             rule = dqc_0001_axis_members.get(dim.target_namespace, {}).get(dim.name)
             if rule:
                 for rel in rels:
@@ -510,39 +1111,42 @@ def dqc_0001(instance, error_log, suppress_errors, namespaces):
 
 
 def _dqc_0004(instance, error_log, suppress_errors, rule_id, concept1, concept2):
+    pairs = []
     for fact1 in instance.facts.filter(concept1, allow_nil=False):
         # All comparisons between fact values occur between facts of equivalent dimensions. A rule will produce a message for each occurrence of the compared facts in equivalent dimensions.
         cs = xbrl.ConstraintSet(fact1)
         cs[xbrl.Aspect.CONCEPT] = concept2
         for fact2 in instance.facts.filter(cs, allow_nil=False, allow_additional_dimensions=False):
-            if not decimal_comparison(fact1, fact2, equal_within_tolerance):
-                report_error(error_log, suppress_errors, rule_id, fact1=fact1, fact2=fact2)
+            pairs.append((fact1, fact2))
+    for (fact1, fact2), equal in zip(pairs, bulk_decimal_comparison(pairs, equal_within_tolerance)):
+        if not equal:
+            report_error(error_log, suppress_errors, rule_id, fact1=fact1, fact2=fact2)
 
 
-def dqc_0004_16(instance, error_log, suppress_errors, namespaces):
+def dqc_0004_16(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0004 Element Values Are Equal"""
     us_gaap_ns = get_namespace(namespaces, 'us-gaap')
+    if not models.is_reported(us_gaap_ns, 'Assets', 'LiabilitiesAndStockholdersEquity'):
+        return
     concept_Assets = instance.dts.resolve_concept(xml.QName('Assets', us_gaap_ns))
     concept_LiabilitiesAndStockholdersEquity = instance.dts.resolve_concept(xml.QName('LiabilitiesAndStockholdersEquity', us_gaap_ns))
     if concept_Assets and concept_LiabilitiesAndStockholdersEquity:
         _dqc_0004(instance, error_log, suppress_errors, 'DQC.US.0004.16', concept_Assets, concept_LiabilitiesAndStockholdersEquity)
 
 
-def dqc_0004(instance, error_log, suppress_errors, namespaces):
+def dqc_0004(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0004 Element Values Are Equal"""
 
-    dqc_0004_16(instance, error_log, suppress_errors, namespaces)
+    dqc_0004_16(instance, error_log, suppress_errors, namespaces, models)
 
 
-def _dqc_0005(instance, error_log, suppress_errors, rule_id, namespaces, facts, reporting_period_ends, cmp, additional_params={}):
-    dei_ns = get_namespace(namespaces, 'dei')
-    dim_LegalEntityAxis = instance.dts.resolve_concept(xml.QName('LegalEntityAxis', dei_ns))
-    concept_EntityCommonStockSharesOutstanding = instance.dts.resolve_concept(xml.QName('EntityCommonStockSharesOutstanding', dei_ns))
+def _dqc_0005(instance, error_log, suppress_errors, rule_id, profile, facts, cmp, additional_params={}):
+    reporting_period_ends = profile.period_ends
     for fact1 in facts:
 
-        reporting_period_end = reporting_period_ends.get(dimension_value(fact1, dim_LegalEntityAxis))
+        reporting_period_end = reporting_period_ends.get(profile.legal_entity(fact1))
         if not reporting_period_end:
-            reporting_period_end = reporting_period_ends.get(dim_LegalEntityAxis.default_member)
+            reporting_period_end = reporting_period_ends.get(profile.legal_entity_axis.default_member)
 
         if reporting_period_end and not cmp(period_end(fact1), reporting_period_end[1]):
             params = {'fact1': fact1, 'dei:DocumentPeriodEndDate': reporting_period_end[0]}
@@ -550,17 +1154,14 @@ def _dqc_0005(instance, error_log, suppress_errors, rule_id, namespaces, facts,
             report_error(error_log, suppress_errors, rule_id, **params)
 
 
-def dqc_0005_17(instance, error_log, suppress_errors, namespaces, reporting_period_ends):
+def dqc_0005_17(instance, error_log, suppress_errors, namespaces, profile):
     """DQC_0005.17 Entity Common Stock, Shares Outstanding"""
 
-    dei_ns = get_namespace(namespaces, 'dei')
-    concept_EntityCommonStockSharesOutstanding = instance.dts.resolve_concept(xml.QName('EntityCommonStockSharesOutstanding', dei_ns))
+    facts = profile.facts('EntityCommonStockSharesOutstanding')
+    _dqc_0005(instance, error_log, suppress_errors, 'DQC.US.0005.17', profile, facts, operator.ge)
 
-    facts = instance.facts.filter(concept_EntityCommonStockSharesOutstanding)
-    _dqc_0005(instance, error_log, suppress_errors, 'DQC.US.0005.17', namespaces, facts, reporting_period_ends, operator.ge)
 
-
-def dqc_0005_48(instance, error_log, suppress_errors, namespaces, reporting_period_ends):
+def dqc_0005_48(instance, error_log, suppress_errors, namespaces, profile):
     """DQC_0005.48 Subsequent events"""
     us_gaap_ns = get_namespace(namespaces, 'us-gaap')
     dim_SubsequentEventTypeAxis = instance.dts.resolve_concept(xml.QName('SubsequentEventTypeAxis', us_gaap_ns))
@@ -569,10 +1170,10 @@ def dqc_0005_48(instance, error_log, suppress_errors, namespaces, reporting_peri
         cs = xbrl.ConstraintSet()
         cs[dim_SubsequentEventTypeAxis] = xbrl.ExplicitDimensionAspectValue(dim_SubsequentEventTypeAxis, None)
         facts = instance.facts - instance.facts.filter(cs)
-        _dqc_0005(instance, error_log, suppress_errors, 'DQC.US.0005.48', namespaces, facts, reporting_period_ends, operator.gt, {'us-gaap:SubsequentEventTypeAxis': dim_SubsequentEventTypeAxis})
+        _dqc_0005(instance, error_log, suppress_errors, 'DQC.US.0005.48', profile, facts, operator.gt, {'us-gaap:SubsequentEventTypeAxis': dim_SubsequentEventTypeAxis})
 
 
-def dqc_0005_49(instance, error_log, suppress_errors, namespaces, reporting_period_ends):
+def dqc_0005_49(instance, error_log, suppress_errors, namespaces, profile):
     """DQC_0005.49 Subsequent events"""
 
     us_gaap_ns = get_namespace(namespaces, 'us-gaap')
@@ -583,25 +1184,23 @@ def dqc_0005_49(instance, error_log, suppress_errors, namespaces, reporting_peri
         cs = xbrl.ConstraintSet()
         cs[dim_StatementScenarioAxis] = member_ScenarioForecastMember
         facts = instance.facts.filter(cs)
-        _dqc_0005(instance, error_log, suppress_errors, 'DQC.US.0005.49', namespaces, facts, reporting_period_ends, operator.gt, {
+        _dqc_0005(instance, error_log, suppress_errors, 'DQC.US.0005.49', profile, facts, operator.gt, {
                   'us-gaap:StatementScenarioAxis': dim_StatementScenarioAxis, 'us-gaap:ScenarioForecastMember': member_ScenarioForecastMember})
 
 
-def dqc_0005(instance, error_log, suppress_errors, namespaces):
+def dqc_0005(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0005 Context Dates After Period End Date"""
 
-    dei_ns = get_namespace(namespaces, 'dei')
-    concept_DocumentType = instance.dts.resolve_concept(xml.QName('DocumentType', dei_ns))
-    facts_DocumentType = instance.facts.filter(concept_DocumentType)
-    if len(facts_DocumentType) != 1 or facts_DocumentType[0].normalized_value in ('S-1', 'S-3', 'S-4', 'S-6', 'S-8', 'S-11', 'S-20', 'S-1/A', 'S-3/A', 'S-4/A', 'S-6/A', 'S-8/A', 'S-11/A', 'S-20/A'):
+    profile = models.filing_profile
+    document_type = profile.document_type
+    if document_type is None or document_type in ('S-1', 'S-3', 'S-4', 'S-6', 'S-8', 'S-11', 'S-20', 'S-1/A', 'S-3/A', 'S-4/A', 'S-6/A', 'S-8/A', 'S-11/A', 'S-20/A'):
         # Appendix A
         # Exclusions from the rule: S-1, S-3, S-4, S-6, S-8, S-11, S-20, S-1/A, S-3/A, S-4/A, S-6/A, S-8/A, S-11/A and S-20/A
         return
 
-    reporting_periods = reporting_period_ends(instance, dei_ns)
-    dqc_0005_17(instance, error_log, suppress_errors, namespaces, reporting_periods)
-    dqc_0005_48(instance, error_log, suppress_errors, namespaces, reporting_periods)
-    dqc_0005_49(instance, error_log, suppress_errors, namespaces, reporting_periods)
+    dqc_0005_17(instance, error_log, suppress_errors, namespaces, profile)
+    dqc_0005_48(instance, error_log, suppress_errors, namespaces, profile)
+    dqc_0005_49(instance, error_log, suppress_errors, namespaces, profile)
 
 
 def _dqc_0006(instance, error_log, suppress_errors, dim_LegalEntityAxis, period_focus_for_legal_entity, facts):
@@ -617,24 +1216,19 @@ def _dqc_0006(instance, error_log, suppress_errors, dim_LegalEntityAxis, period_
                 report_error(error_log, suppress_errors, 'DQC.US.0006.14', **{'fact1': fact1, 'dei:DocumentFiscalPeriodFocus': period_focus})
 
 
-def dqc_0006(instance, error_log, suppress_errors, namespaces):
+def dqc_0006(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0006 DEI and Block Tag Date Contexts"""
 
-    dei_ns = get_namespace(namespaces, 'dei')
-    concept_DocumentType = instance.dts.resolve_concept(xml.QName('DocumentType', dei_ns))
-    facts_DocumentType = instance.facts.filter(concept_DocumentType)
-    if len(facts_DocumentType) != 1 or facts_DocumentType[0].normalized_value.endswith('T') or facts_DocumentType[0].normalized_value.endswith('T/A'):
+    profile = models.filing_profile
+    document_type = profile.document_type
+    if document_type is None or document_type.endswith('T') or document_type.endswith('T/A'):
         # This rule also does not test any transition period filings, which are identified by the letter "T" in the form name.
         # Transition period filings are submitted when a filer changes their fiscal year.
         # Transition period filings may cover periods which are different from the general quarter or annual length.
         return
 
-    dim_LegalEntityAxis = instance.dts.resolve_concept(xml.QName('LegalEntityAxis', dei_ns))
-    concept_DocumentFiscalPeriodFocus = instance.dts.resolve_concept(xml.QName('DocumentFiscalPeriodFocus', dei_ns))
-
-    period_focus_for_legal_entity = {}
-    for fact in instance.facts.filter(concept_DocumentFiscalPeriodFocus):
-        period_focus_for_legal_entity[dimension_value(fact, dim_LegalEntityAxis)] = fact
+    dim_LegalEntityAxis = profile.legal_entity_axis
+    period_focus_for_legal_entity = profile.fiscal_period_focus
 
     fact_names = [
         'AmendmentDescription',
@@ -650,48 +1244,51 @@ def dqc_0006(instance, error_log, suppress_errors, namespaces):
     ]
 
     for name in fact_names:
-        concept = instance.dts.resolve_concept(xml.QName(name, dei_ns))
-        if concept:
-            _dqc_0006(instance, error_log, suppress_errors, dim_LegalEntityAxis, period_focus_for_legal_entity, instance.facts.filter(concept))
+        if profile.concept(name):
+            _dqc_0006(instance, error_log, suppress_errors, dim_LegalEntityAxis, period_focus_for_legal_entity, profile.facts(name))
 
-    _dqc_0006(instance, error_log, suppress_errors, dim_LegalEntityAxis, period_focus_for_legal_entity, textblock_facts(instance))
+    _dqc_0006(instance, error_log, suppress_errors, dim_LegalEntityAxis, period_focus_for_legal_entity, textblock_facts(instance, models.concept_classifier))
 
 
-def dqc_0008(instance, error_log, suppress_errors, namespaces):
+def dqc_0008(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0008 Reversed Calculation"""
-    dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
     us_gaap_calc = dqc_0008_calculations.get(ns)
     if us_gaap_calc:
-        for linkrole in dts.calculation_link_roles(arcrole_summation_item):
-            nw = dts.calculation_network(linkrole, arcrole_summation_item)
-            for rel in nw.relationships:
+        graph = models.calc_graph
+        for linkrole in graph.link_roles:
+            for rel in graph.relationships(linkrole):
                 us_gaap_items = us_gaap_calc.get(rel.target_concept.name, [])
                 if rel.source_concept.name in us_gaap_items:
                     report_error(error_log, suppress_errors, 'DQC.US.0008.6819', extCalcTarget=rel.target_concept, extCalcSource=rel.source_concept)
 
 
-def dqc_0009(instance, error_log, suppress_errors, namespaces):
+def dqc_0009(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0009 Element A must be less than or equal to Element B"""
 
     for rule_id, prefix1, name1, prefix2, name2 in dqc_0009_facts:
         concept1 = instance.dts.resolve_concept(xml.QName(name1, get_namespace(namespaces, prefix1)))
         concept2 = instance.dts.resolve_concept(xml.QName(name2, get_namespace(namespaces, prefix2)))
         if concept1 and concept2:
+            pairs = []
             for fact1 in instance.facts.filter(concept1, allow_nil=False):
                 # All comparisons between fact values occur between facts of equivalent dimensions.  A rule will produce a message for each occurrence of the compared facts in equivalent dimensions.
                 cs = xbrl.ConstraintSet(fact1)
                 cs[xbrl.Aspect.CONCEPT] = concept2
                 for fact2 in instance.facts.filter(cs, allow_nil=False, allow_additional_dimensions=False):
-                    if not decimal_comparison(fact1, fact2, less_or_equal):
-                        report_error(error_log, suppress_errors, rule_id, fact1=fact1, fact2=fact2)
+                    pairs.append((fact1, fact2))
+            for (fact1, fact2), less_equal in zip(pairs, bulk_decimal_comparison(pairs, less_or_equal)):
+                if not less_equal:
+                    report_error(error_log, suppress_errors, rule_id, fact1=fact1, fact2=fact2)
 
 
-def dqc_0011(instance, error_log, suppress_errors, namespaces):
+def dqc_0011(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0011 Dimensional Equivalents """
 
     ns = get_namespace(namespaces, 'us-gaap')
     for rule_id, lineItemName, dimItemName, axisName, memberName, weight in dqc_0011_facts:
+        if not models.is_reported(ns, lineItemName, dimItemName):
+            continue
         lineConcept = instance.dts.resolve_concept(xml.QName(lineItemName, ns))
         dimConcept = instance.dts.resolve_concept(xml.QName(dimItemName, ns))
         axisConcept = instance.dts.resolve_concept(xml.QName(axisName, ns))
@@ -739,7 +1336,7 @@ def _dqc_0013_precondition_check(instance, namespaces, context):
     return None
 
 
-def dqc_0013(instance, error_log, suppress_errors, namespaces):
+def dqc_0013(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0013 Negative Values with Dependence"""
 
     cache = {}
@@ -765,7 +1362,7 @@ def has_dimensions(context):
         return False
 
 
-def dqc_0014(instance, error_log, suppress_errors, namespaces):
+def dqc_0014(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0014 Negative Values with No Dimensions"""
 
     for rule_id, prefix, name in dqc_0014_facts:
@@ -776,37 +1373,46 @@ def dqc_0014(instance, error_log, suppress_errors, namespaces):
                     report_error(error_log, suppress_errors, rule_id, fact1=fact1)
 
 
-def _dqc_0015_member_exclusions_test_contains(rule, dim_aspect):
-    name = dim_aspect.value.name if rule['dim'] == 'member' else dim_aspect.dimension.name
-    return re.search(rule['text'], name, re.IGNORECASE)
-
-
-def _dqc_0015_member_exclusions_test_equals(rule, dim_aspect):
-    name = dim_aspect.value.name if rule['dim'] == 'member' else dim_aspect.dimension.name
-    return name == rule['name']
-
-
-def _dqc_0015_member_exclusions_test(rule, dim_aspect):
+def _dqc_0015_compile_member_exclusion(rule):
+    """Compiles a member exclusion rule into a predicate taking the dimension and member names."""
     if rule['test'] == 'contains':
-        return _dqc_0015_member_exclusions_test_contains(rule, dim_aspect)
+        regex = re.compile(rule['text'], re.IGNORECASE)
+        if rule['dim'] == 'member':
+            return lambda dim_name, member_name: regex.search(member_name) is not None
+        return lambda dim_name, member_name: regex.search(dim_name) is not None
     elif rule['test'] == 'equals':
-        return _dqc_0015_member_exclusions_test_equals(rule, dim_aspect)
+        name = rule['name']
+        if rule['dim'] == 'member':
+            return lambda dim_name, member_name: member_name == name
+        return lambda dim_name, member_name: dim_name == name
     elif rule['test'] == 'and':
-        return _dqc_0015_member_exclusions_test(rule['arg1'], dim_aspect) and _dqc_0015_member_exclusions_test(rule['arg2'], dim_aspect)
+        arg1 = _dqc_0015_compile_member_exclusion(rule['arg1'])
+        arg2 = _dqc_0015_compile_member_exclusion(rule['arg2'])
+        return lambda dim_name, member_name: arg1(dim_name, member_name) and arg2(dim_name, member_name)
     elif rule['test'] == 'or':
-        return _dqc_0015_member_exclusions_test(rule['arg1'], dim_aspect) or _dqc_0015_member_exclusions_test(rule['arg2'], dim_aspect)
+        arg1 = _dqc_0015_compile_member_exclusion(rule['arg1'])
+        arg2 = _dqc_0015_compile_member_exclusion(rule['arg2'])
+        return lambda dim_name, member_name: arg1(dim_name, member_name) or arg2(dim_name, member_name)
     raise RuntimeError('Unknown member exclusion test '+rule['test'])
 
 
+_dqc_0015_member_exclusion_tests = [_dqc_0015_compile_member_exclusion(rule) for rule in dqc_0015_member_exclusions]
+
+
+@functools.lru_cache(maxsize=4096)
+def _dqc_0015_is_excluded_member(dim_name, member_name):
+    """Returns True if the given dimension/member combination matches any of the member exclusion rules."""
+    return any(test(dim_name, member_name) for test in _dqc_0015_member_exclusion_tests)
+
+
 def _dqc_0015_member_exclusions_check(fact):
     for dim_aspect in fact.context.dimension_aspect_values:
-        for rule in dqc_0015_member_exclusions:
-            if _dqc_0015_member_exclusions_test(rule, dim_aspect):
-                return True
+        if _dqc_0015_is_excluded_member(dim_aspect.dimension.name, dim_aspect.value.name):
+            return True
     return False
 
 
-def dqc_0015(instance, error_log, suppress_errors, namespaces):
+def dqc_0015(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0015 Negative Values"""
 
     for rule_id, prefix, name in dqc_0015_facts:
@@ -824,7 +1430,7 @@ def _dqc_0018(error_log, suppress_errors, us_gaap, deprecated_concepts, network,
         _dqc_0018(error_log, suppress_errors, us_gaap, deprecated_concepts, network, network.relationships_from(rel.target))
 
 
-def dqc_0018(instance, error_log, suppress_errors, namespaces):
+def dqc_0018(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0018 Deprecated Element is Used in the Filing"""
 
     us_gaap = get_namespace(namespaces, 'us-gaap')
@@ -838,19 +1444,16 @@ def dqc_0018(instance, error_log, suppress_errors, namespaces):
                 _dqc_0018(error_log, suppress_errors, us_gaap, deprecated_concepts, network, network.relationships_from(root))
 
 
-def dqc_0033(instance, error_log, suppress_errors, namespaces):
+def dqc_0033(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0033 Document Period End Date Context"""
 
-    dei_namespace = get_namespace(namespaces, 'dei')
-    dim_LegalEntityAxis = instance.dts.resolve_concept(xml.QName('LegalEntityAxis', dei_namespace))
+    profile = models.filing_profile
+    dei_namespace = profile.dei_namespace
+    dim_LegalEntityAxis = profile.legal_entity_axis
 
     reporting_periods = {}
-    concept_DocumentPeriodEndDate = instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate', dei_namespace))
-    for fact1 in instance.facts.filter(concept_DocumentPeriodEndDate):
-        end_date = datetime.datetime.combine(fact1.element.schema_actual_value.value, datetime.time()) + datetime.timedelta(days=1)
-        is_valid = abs((end_date - fact1.period_aspect_value.end).days) <= 3
-        legal_entity = dimension_value(fact1, dim_LegalEntityAxis)
-        reporting_periods[legal_entity] = (fact1, is_valid)
+    for fact1, is_valid in profile.document_period_end_checks:
+        reporting_periods[profile.legal_entity(fact1)] = (fact1, is_valid)
 
     for fact1 in facts_in_namespace(instance, dei_namespace, ('EntityCommonStockSharesOutstanding', 'EntityPublicFloat', 'DocumentPeriodEndDate', 'EntityNumberOfEmployees', 'EntityListingDepositoryReceiptRatio')):
 
@@ -862,17 +1465,15 @@ def dqc_0033(instance, error_log, suppress_errors, namespaces):
             report_error(error_log, suppress_errors, 'DQC.US.0033.2', **{'fact1': fact1, 'dei:DocumentPeriodEndDate': reporting_period[0]})
 
 
-def dqc_0036(instance, error_log, suppress_errors, namespaces):
+def dqc_0036(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0036 Document Period End Date Context / Fact Value Check"""
 
-    concept_DocumentPeriodEndDate = instance.dts.resolve_concept(xml.QName('DocumentPeriodEndDate', get_namespace(namespaces, 'dei')))
-    for fact1 in instance.facts.filter(concept_DocumentPeriodEndDate):
-        end_date = datetime.datetime.combine(fact1.element.schema_actual_value.value, datetime.time()) + datetime.timedelta(days=1)
-        if abs((end_date - fact1.period_aspect_value.end).days) > 3:
+    for fact1, is_valid in models.filing_profile.document_period_end_checks:
+        if not is_valid:
             report_error(error_log, suppress_errors, 'DQC.US.0036.1', fact1=fact1)
 
 
-def dqc_0041(instance, error_log, suppress_errors, namespaces):
+def dqc_0041(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0041 Axis with a Default Member that Differs from the US GAAP Taxonomy"""
 
     for dim in instance.dts.dimensions:
@@ -886,7 +1487,7 @@ def dqc_0041(instance, error_log, suppress_errors, namespaces):
                     xml.QName(usgaap_default_member, dim.target_namespace)), default=default_member)
 
 
-def _dqc_0043_recurse(instance, rule_id, error_log, suppress_errors, exclude, ncf, ocf, nw, child, effective_weight):
+def _dqc_0043_recurse(instance, rule_id, error_log, suppress_errors, exclude, ncf, ocf, graph, linkrole, child, effective_weight):
     if child.name not in exclude:
         if child.balance == xbrl.taxonomy.Balance.DEBIT:
             if effective_weight < 0:
@@ -897,38 +1498,36 @@ def _dqc_0043_recurse(instance, rule_id, error_log, suppress_errors, exclude, nc
                 report_error(error_log, suppress_errors, rule_id, child, 'credit', fact1=child, NetCashProvidedByUsedInOperatingActivities=ncf,
                              NetCashProvidedByUsedInOperatingActivitiesContinuingOperations=ocf)
 
-    for rel in nw.relationships_from(child):
-        _dqc_0043_recurse(instance, rule_id, error_log, suppress_errors, exclude, ncf, ocf, nw, rel.target_concept, effective_weight*rel.weight)
+    for rel in graph.children(linkrole, child):
+        _dqc_0043_recurse(instance, rule_id, error_log, suppress_errors, exclude, ncf, ocf, graph, linkrole, rel.target_concept, effective_weight*rel.weight)
 
 
-def dqc_0043(instance, error_log, suppress_errors, namespaces):
+def dqc_0043(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0043 Incorrect Calculation Weights in Operating Cash Flows"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
     ncf = dts.resolve_concept(xml.QName('NetCashProvidedByUsedInOperatingActivities', ns))
     exclude = set(dqc_0043_data['exclude'])
+    graph = models.calc_graph
     for rule_id, ocf_name in dqc_0043_data['rules']:
         ocf = dts.resolve_concept(xml.QName(ocf_name, ns))
         if not ocf:
             continue
 
         ocf_found = False
-        for linkrole in dts.calculation_link_roles(arcrole_summation_item):
-            nw = dts.calculation_network(linkrole, arcrole_summation_item)
-            for rel in nw.relationships_from(ocf):
+        for linkrole in graph.link_roles:
+            for rel in graph.children(linkrole, ocf):
                 ocf_found = True
-                _dqc_0043_recurse(instance, rule_id, error_log, suppress_errors, exclude, ncf, ocf, nw, rel.target_concept, rel.weight)
+                _dqc_0043_recurse(instance, rule_id, error_log, suppress_errors, exclude, ncf, ocf, graph, linkrole, rel.target_concept, rel.weight)
 
         # stop at first operating cash flow element used in calculation linkbase
         if ocf_found:
             break
 
 
-def traverse_calc_multi(instance, error_log, suppress_errors, parents, level, function, *args):
-    dts = instance.dts
-    for linkrole in dts.calculation_link_roles(arcrole_summation_item):
-        nw = dts.calculation_network(linkrole, arcrole_summation_item)
+def traverse_calc_multi(instance, graph, error_log, suppress_errors, parents, level, function, *args):
+    for linkrole in graph.link_roles:
         visited = set()
         for parent in parents:
             if not parent:
@@ -939,15 +1538,15 @@ def traverse_calc_multi(instance, error_log, suppress_errors, parents, level, fu
                 if concept in visited:
                     continue
                 visited.add(concept)
-                for rel in nw.relationships_from(concept):
+                for rel in graph.children(linkrole, concept):
                     if function(instance, error_log, suppress_errors, rel, parent, *args):
                         cur_level = cur_level - 1
                         if cur_level > 0:
                             todo.append((rel.target_concept, cur_level))
 
 
-def traverse_calc_single(instance, error_log, suppress_errors, parent, level, function, *args):
-    return traverse_calc_multi(instance, error_log, suppress_errors, [parent], level, function, *args)
+def traverse_calc_single(instance, graph, error_log, suppress_errors, parent, level, function, *args):
+    return traverse_calc_multi(instance, graph, error_log, suppress_errors, [parent], level, function, *args)
 
 
 def _dqc_0044_check_item(instance, error_log, suppress_errors, rel, parent, rule_id, accrual_concepts):
@@ -960,7 +1559,7 @@ def _dqc_0044_check_item(instance, error_log, suppress_errors, rel, parent, rule
     return True  # continue traversing the subtree of item
 
 
-def dqc_0044(instance, error_log, suppress_errors, namespaces):
+def dqc_0044(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0044 Accrual Items used in Investing/Financing Cash flow Reconciliation"""
 
     dts = instance.dts
@@ -969,11 +1568,16 @@ def dqc_0044(instance, error_log, suppress_errors, namespaces):
     dqc_0044_rules = dqc_0044_data['rules']
     if ns in dqc_0044_concepts:
         accrual_concepts = set(dqc_0044_concepts[ns])
+        if accrual_concepts.isdisjoint(name for _, name in models.reported_concepts):
+            return
+        graph = models.calc_graph
         for rule_id, parent_name in dqc_0044_rules:
             parent_concept = dts.resolve_concept(xml.QName(parent_name, ns))
             if not parent_concept:
                 continue
-            traverse_calc_single(instance, error_log, suppress_errors, parent_concept, -1, _dqc_0044_check_item, rule_id, accrual_concepts)
+            if not any(concept.name in accrual_concepts for concept in graph.merged_descendants(parent_concept)):
+                continue
+            traverse_calc_single(instance, graph, error_log, suppress_errors, parent_concept, -1, _dqc_0044_check_item, rule_id, accrual_concepts)
 
 
 def _dqc_0045_check_item(instance, error_log, suppress_errors, rel, extension_parent, rule_id, us_gaap_parent, us_gaap_items):
@@ -987,7 +1591,7 @@ def _dqc_0045_check_item(instance, error_log, suppress_errors, rel, extension_pa
     return True  # continue traversing the subtree of item
 
 
-def dqc_0045(instance, error_log, suppress_errors, namespaces):
+def dqc_0045(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0045 Movement of Concepts between Calculation Trees"""
 
     dts = instance.dts
@@ -1008,7 +1612,10 @@ def dqc_0045(instance, error_log, suppress_errors, namespaces):
             if not items:
                 continue
 
-            traverse_calc_single(instance, error_log, suppress_errors, extension_concept, -1, _dqc_0045_check_item, rule_id, us_gaap_concept, items)
+            graph = models.calc_graph
+            if not any(concept.name in items for concept in graph.merged_descendants(extension_concept)):
+                continue
+            traverse_calc_single(instance, graph, error_log, suppress_errors, extension_concept, -1, _dqc_0045_check_item, rule_id, us_gaap_concept, items)
 
 
 def _dqc_0046_check_item(instance, error_log, suppress_errors, rel, parent, rules):
@@ -1019,16 +1626,19 @@ def _dqc_0046_check_item(instance, error_log, suppress_errors, rel, parent, rule
     return True  # continue traversing the subtree of item
 
 
-def dqc_0046(instance, error_log, suppress_errors, namespaces):
+def dqc_0046(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0046 Inappropriate Calculation Descendent"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
+    graph = models.calc_graph
     for parent_name, level, rules in dqc_0046_data:
         parent_concept = dts.resolve_concept(xml.QName(parent_name, ns))
         if not parent_concept:
             continue
-        traverse_calc_single(instance, error_log, suppress_errors, parent_concept, level, _dqc_0046_check_item, rules)
+        if not any(concept.name in rules for concept in graph.merged_descendants(parent_concept)):
+            continue
+        traverse_calc_single(instance, graph, error_log, suppress_errors, parent_concept, level, _dqc_0046_check_item, rules)
 
 
 def _dqc_0047_check_item(instance, error_log, suppress_errors, rel, parent):
@@ -1039,43 +1649,28 @@ def _dqc_0047_check_item(instance, error_log, suppress_errors, rel, parent):
     return True  # continue traversing the subtree of item
 
 
-def dqc_0047(instance, error_log, suppress_errors, namespaces):
+def dqc_0047(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0047 Calculation Descendants with No Balance Type """
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
     parent_concepts = [dts.resolve_concept(xml.QName(_, ns)) for _ in ['NetCashProvidedByUsedInOperatingActivities', 'NetCashProvidedByUsedInOperatingActivitiesContinuingOperations']]
-    traverse_calc_multi(instance, error_log, suppress_errors, parent_concepts, -1, _dqc_0047_check_item)
-
+    traverse_calc_multi(instance, models.calc_graph, error_log, suppress_errors, parent_concepts, -1, _dqc_0047_check_item)
 
-def _get_cashflow_linkroles(dts, ns):
-    """Returns the linkroles of cash flow presentation trees."""
-    linkroles = set()
-    statementOfCashFlowsAbstract = dts.resolve_concept(xml.QName('StatementOfCashFlowsAbstract', ns))
-    for linkrole in dts.presentation_link_roles(arcrole_parent_child):
-        linkrole_lower = linkrole.lower()
-        roleDef = dts.role_definition(linkrole)
-        if roleDef and roleDef.find('- Statement') != -1 and linkrole_lower.find('parenthetical') == -1:
-            nw = dts.presentation_network(linkrole, arcrole_parent_child)
-            if linkrole_lower.find('cashflow') != -1 or (statementOfCashFlowsAbstract is not None and any(nw.relationships_from(statementOfCashFlowsAbstract))):
-                linkroles.add(linkrole)
 
-    return linkroles
-
-
-def dqc_0048(instance, error_log, suppress_errors, namespaces):
+def dqc_0048(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0048 Required Calculation Parent Element in the Cash Flow Statement"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
-    presentation_linkroles = _get_cashflow_linkroles(dts, ns)
+    presentation_linkroles = models.statements.cashflow_link_roles
+    graph = models.calc_graph
     calculation_linkroles = []
     calculation_roots = set()
     for linkrole in presentation_linkroles:
-        nw = dts.calculation_network(linkrole, arcrole_summation_item)
-        if nw:
+        if graph.has_link_role(linkrole):
             calculation_linkroles.append(linkrole)
-            calculation_roots.update(nw.roots)
+            calculation_roots.update(graph.roots(linkrole))
 
     if calculation_linkroles:
         valid = False
@@ -1096,17 +1691,17 @@ def _dqc_0049_root_filter(concept):
             concept.name != 'NoncashOrPartNoncashAcquisitionNetNonmonetaryAssetsAcquiredLiabilitiesAssumed1')
 
 
-def dqc_0049(instance, error_log, suppress_errors, namespaces):
+def dqc_0049(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0049 Single Calculation Tree for Change in Cash Flows"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
-    presentation_linkroles = _get_cashflow_linkroles(dts, ns)
+    presentation_linkroles = models.statements.cashflow_link_roles
     requiredRoots = set([dts.resolve_concept(xml.QName(_, ns)) for _ in dqc_0049_roots])
+    graph = models.calc_graph
     for linkrole in presentation_linkroles:
-        nw = dts.calculation_network(linkrole, arcrole_summation_item)
-        if nw:
-            roots = set(filter(_dqc_0049_root_filter, nw.roots))
+        if graph.has_link_role(linkrole):
+            roots = set(filter(_dqc_0049_root_filter, graph.roots(linkrole)))
             if len(roots) > 1 and not roots.isdisjoint(requiredRoots):
                 report_error(error_log, suppress_errors, "DQC.US.0049.7483", None, networkRole=linkrole, elementNames=sorted(roots))
 
@@ -1132,23 +1727,21 @@ def _dqc_0051_check_item(instance, error_log, suppress_errors, rel, parent, tax_
     return True  # continue traversing the subtree of item
 
 
-def dqc_0051(instance, error_log, suppress_errors, namespaces):
+def dqc_0051(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0051 Before Tax Items"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
     income_tax_items = set(dqc_0051_data['tax_items'])
     parent_concepts = [dts.resolve_concept(xml.QName(_, ns)) for _ in dqc_0051_data['rules'].keys()]
-    traverse_calc_multi(instance, error_log, suppress_errors, parent_concepts, -1, _dqc_0051_check_item, income_tax_items)
+    traverse_calc_multi(instance, models.calc_graph, error_log, suppress_errors, parent_concepts, -1, _dqc_0051_check_item, income_tax_items)
 
 
-def dqc_0052(instance, error_log, suppress_errors, namespaces):
+def dqc_0052(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0052 Member Values"""
 
     dts = instance.dts
-    ns, year = get_namespace_and_year(namespaces, 'us-gaap')
-    if int(year) < 2017:
-        return
+    ns = get_namespace(namespaces, 'us-gaap')
     for rule, dim_name, member_name in dqc_0052_data:
         dimension = dts.resolve_concept(xml.QName(dim_name, ns))
         member = dts.resolve_concept(xml.QName(member_name, ns))
@@ -1159,13 +1752,11 @@ def dqc_0052(instance, error_log, suppress_errors, namespaces):
                 report_error(error_log, suppress_errors, rule, fact, fact1=fact, axis=dimension, member=member)
 
 
-def dqc_0053(instance, error_log, suppress_errors, namespaces):
+def dqc_0053(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0053 Excluded Members from an Axis"""
 
     dts = instance.dts
-    ns, year = get_namespace_and_year(namespaces, 'us-gaap')
-    if int(year) < 2017:
-        return
+    ns = get_namespace(namespaces, 'us-gaap')
     for rule, dim_name, member_name in dqc_0053_data:
         dimension = dts.resolve_concept(xml.QName(dim_name, ns))
         member = dts.resolve_concept(xml.QName(member_name, ns))
@@ -1188,7 +1779,7 @@ def dqc_0053(instance, error_log, suppress_errors, namespaces):
                         todo.extend(drs.consecutive_relationships(rel))
 
 
-def dqc_0054(instance, error_log, suppress_errors, namespaces):
+def dqc_0054(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0054 Excluded Dimensions from a Table"""
 
     dts = instance.dts
@@ -1205,27 +1796,25 @@ def dqc_0054(instance, error_log, suppress_errors, namespaces):
                         break
 
 
-def dqc_0055(instance, error_log, suppress_errors, namespaces):
+def dqc_0055(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0055 Required Member on An Axis"""
 
     dts = instance.dts
-    ns, year = get_namespace_and_year(namespaces, 'us-gaap')
-    if int(year) < 2017:
-        return
+    ns = get_namespace(namespaces, 'us-gaap')
     for rule, axis_name, domain_name, member_names in dqc_0055_data:
         axis = dts.resolve_concept(xml.QName(axis_name, ns))
         domain = dts.resolve_concept(xml.QName(domain_name, ns))
         members = set(dts.resolve_concept(xml.QName(_, ns)) for _ in member_names)
         if axis is not None and domain is not None and all(_ is not None for _ in members):
-            for linkrole in dts.presentation_link_roles():
-                rels = _subtree_children(dts.presentation_network(linkrole, arcrole_parent_child), axis)
-                children = set(_.target_concept for _ in rels)
+            presentation = models.presentation
+            for linkrole in presentation.link_roles:
+                children = presentation.subtree_concepts(linkrole, axis)
                 if children and children.isdisjoint(members):
                     if domain not in children or len(children) > 1:
-                        report_error(error_log, suppress_errors, rule, rels[0].from_locator, axis=axis, members=sorted(members), networkRole=linkrole)
+                        report_error(error_log, suppress_errors, rule, presentation.subtree(linkrole, axis)[0].from_locator, axis=axis, members=sorted(members), networkRole=linkrole)
 
 
-def dqc_0057(instance, error_log, suppress_errors, namespaces):
+def dqc_0057(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0057 Cash Flow Opening and Closing Balances"""
 
     dts = instance.dts
@@ -1233,11 +1822,11 @@ def dqc_0057(instance, error_log, suppress_errors, namespaces):
 
     expectedBalanceElements = set(filter(lambda x: x is not None, [dts.resolve_concept(xml.QName(_, ns)) for _ in dqc_0057_data]))
 
-    for linkrole in _get_cashflow_linkroles(dts, ns):
-        nw = dts.presentation_network(linkrole, arcrole_parent_child)
+    presentation = models.presentation
+    for linkrole in models.statements.cashflow_link_roles:
         balanceElements = set()
-        for root in nw.roots:
-            for rel in _subtree_children(nw, root):
+        for root in presentation.roots(linkrole):
+            for rel in presentation.subtree(linkrole, root):
                 if rel.preferred_label in opening_label_roles or rel.preferred_label in closing_label_roles:
                     location = rel.arc
                     balanceElements.add(rel.target_concept)
@@ -1245,13 +1834,15 @@ def dqc_0057(instance, error_log, suppress_errors, namespaces):
             report_error(error_log, suppress_errors, 'DQC.US.0057.7494', None, elementNames=dqc_0057_data, balanceElements=sorted(balanceElements), networkRole=linkrole)
 
 
-def dqc_0060(instance, error_log, suppress_errors, namespaces):
+def dqc_0060(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0060 Element Dependence for Specific Elements"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
 
     for rule, reported_name, dependent_names, general_name in dqc_0060_data:
+        if not models.is_reported(ns, reported_name):
+            continue
         reported_concept = dts.resolve_concept(xml.QName(reported_name, ns))
         general_concept = dts.resolve_concept(xml.QName(general_name, ns))
         dependent_concepts = [dts.resolve_concept(xml.QName(_, ns)) for _ in dependent_names]
@@ -1271,40 +1862,30 @@ def dqc_0060(instance, error_log, suppress_errors, namespaces):
                 report_error(error_log, suppress_errors, rule, fact, fact1=fact, DependentElements=dependent_concepts, GeneralElement=general_concept)
 
 
-def _dqc_0061_is_ancestor_of(nw, ancestor, descendant):
-    """Returns True if ancestor is an ancestor of descendant within relationship network nw"""
-    if ancestor == descendant:
-        return True
-    for rel in nw.relationships_to(descendant):
-        if _dqc_0061_is_ancestor_of(nw, ancestor, rel.source_concept):
-            return True
-    return False
-
-
-def dqc_0061(instance, error_log, suppress_errors, namespaces):
+def dqc_0061(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0061 Cash Flow Continuing Operations Elements not Used"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
 
+    graph = models.calc_graph
     for rule, parent_name, child_name in dqc_0061_data:
         parent_concept = dts.resolve_concept(xml.QName(parent_name, ns))
         child_concept = dts.resolve_concept(xml.QName(child_name, ns))
         if parent_concept is None or child_concept is None:
             continue
-        for linkrole in dts.calculation_link_roles(arcrole_summation_item):
-            nw = dts.calculation_network(linkrole, arcrole_summation_item)
-            for root_concept in [_.source_concept for _ in nw.relationships_to(parent_concept)]:
-                if _dqc_0061_is_ancestor_of(nw, root_concept, child_concept) and not _dqc_0061_is_ancestor_of(nw, parent_concept, child_concept):
+        for linkrole in graph.link_roles:
+            for root_concept in [_.source_concept for _ in graph.parents(linkrole, parent_concept)]:
+                if graph.is_ancestor_of(linkrole, root_concept, child_concept) and not graph.is_ancestor_of(linkrole, parent_concept, child_concept):
                     report_error(error_log, suppress_errors, rule, None, ParentElement=parent_concept, ChildElement=child_concept, changeInCashElement=root_concept)
 
 
-def dqc_0062(instance, error_log, suppress_errors, namespaces):
+def dqc_0062(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0062 No Fact Value for Change in Cash"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
-    cashflow_linkroles = _get_cashflow_linkroles(dts, ns)
+    cashflow_linkroles = models.statements.cashflow_link_roles
     if cashflow_linkroles:
         for fact_name in dqc_0062_data:
             concept = dts.resolve_concept(xml.QName(fact_name, ns))
@@ -1317,11 +1898,13 @@ def dqc_0062(instance, error_log, suppress_errors, namespaces):
         report_error(error_log, suppress_errors, "DQC.US.0062.7501")
 
 
-def dqc_0065(instance, error_log, suppress_errors, namespaces):
+def dqc_0065(instance, error_log, suppress_errors, namespaces, models):
     """DQC_0065 Interest Paid Net (Operating) Not on Cash Flow"""
 
     dts = instance.dts
     ns = get_namespace(namespaces, 'us-gaap')
+    if not models.is_reported(ns, 'InterestPaid') or not models.is_in_networks(ns, 'SupplementalCashFlowInformationAbstract', 'InterestPaid'):
+        return
 
     cashflow_concept = dts.resolve_concept(xml.QName('SupplementalCashFlowInformationAbstract', ns))
     interestPaid_concept = dts.resolve_concept(xml.QName('InterestPaid', ns))
@@ -1330,9 +1913,9 @@ def dqc_0065(instance, error_log, suppress_errors, namespaces):
     if cashflow_concept is None or interestPaid_concept is None:
         return
 
-    for linkrole in dts.presentation_link_roles(arcrole_parent_child):
-        nw = dts.presentation_network(linkrole, arcrole_parent_child)
-        children = set(_.target_concept for _ in _subtree_children(dts.presentation_network(linkrole, arcrole_parent_child), cashflow_concept))
+    presentation = models.presentation
+    for linkrole in presentation.link_roles:
+        children = presentation.subtree_concepts(linkrole, cashflow_concept)
         if interestPaid_concept in children and interestPaidNet_concept not in children and interestPaidCapitalized_concept not in children:
             constraintSet = xbrl.ConstraintSet()
             constraintSet.add(xbrl.ConceptAspectValue(interestPaid_concept))
@@ -1342,6 +1925,226 @@ def dqc_0065(instance, error_log, suppress_errors, namespaces):
             break
 
 
+DqcRule = collections.namedtuple('DqcRule', ['id', 'function', 'namespaces', 'min_year', 'resources'])
+
+# All DQC rules in execution order together with the standard namespace prefixes they require, the minimum us-gaap taxonomy year and the shared ModelCache models they use.
+dqc_rules = [
+    DqcRule('DQC_0001', dqc_0001, (), None, ('presentation',)),
+    DqcRule('DQC_0004', dqc_0004, (), None, ()),
+    DqcRule('DQC_0005', dqc_0005, ('dei',), None, ()),
+    DqcRule('DQC_0006', dqc_0006, ('dei',), None, ()),
+    DqcRule('DQC_0008', dqc_0008, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0009', dqc_0009, (), None, ()),
+    DqcRule('DQC_0011', dqc_0011, ('us-gaap',), None, ()),
+    DqcRule('DQC_0013', dqc_0013, (), None, ()),
+    DqcRule('DQC_0014', dqc_0014, (), None, ()),
+    DqcRule('DQC_0015', dqc_0015, (), None, ()),
+    DqcRule('DQC_0018', dqc_0018, ('us-gaap',), None, ()),
+    DqcRule('DQC_0033', dqc_0033, ('dei',), None, ()),
+    DqcRule('DQC_0036', dqc_0036, ('dei',), None, ()),
+    DqcRule('DQC_0041', dqc_0041, (), None, ()),
+    # dqc v5 checks
+    DqcRule('DQC_0043', dqc_0043, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0044', dqc_0044, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0045', dqc_0045, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0046', dqc_0046, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0047', dqc_0047, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0048', dqc_0048, ('us-gaap',), None, ('calc_graph', 'statements')),
+    DqcRule('DQC_0049', dqc_0049, ('us-gaap',), None, ('calc_graph', 'statements')),
+    DqcRule('DQC_0051', dqc_0051, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0052', dqc_0052, ('us-gaap',), 2017, ()),
+    DqcRule('DQC_0053', dqc_0053, ('us-gaap',), 2017, ()),
+    DqcRule('DQC_0054', dqc_0054, ('us-gaap',), None, ()),
+    DqcRule('DQC_0055', dqc_0055, ('us-gaap',), 2017, ('presentation',)),
+    DqcRule('DQC_0057', dqc_0057, ('us-gaap',), None, ('statements', 'presentation')),
+    DqcRule('DQC_0060', dqc_0060, ('us-gaap',), None, ()),
+    DqcRule('DQC_0061', dqc_0061, ('us-gaap',), None, ('calc_graph',)),
+    DqcRule('DQC_0062', dqc_0062, ('us-gaap',), None, ('statements',)),
+    DqcRule('DQC_0065', dqc_0065, ('us-gaap',), None, ('presentation',)),
+]
+
+
+def _rule_number(rule_id):
+    """Returns the rule number of a DQC rule or error code (e.g. DQC_0015, DQC.US.0015.1234 or 15) as an int."""
+    m = re.match(r'(?:DQC[._]?(?:US\.)?)?0*(\d+)', rule_id.strip(), re.IGNORECASE)
+    if not m:
+        raise RuntimeError('Invalid DQC rule %s' % rule_id)
+    return int(m.group(1))
+
+
+def is_applicable_rule(rule, namespaces):
+    """Returns True if all namespaces and the minimum us-gaap taxonomy year required by the rule are present."""
+    if not all(prefix in namespaces for prefix in rule.namespaces):
+        return False
+    if rule.min_year is not None:
+        _, year = get_namespace_and_year(namespaces, 'us-gaap')
+        if int(year) < rule.min_year:
+            return False
+    return True
+
+
+def selected_rules(params):
+    """Returns the list of DqcRule entries selected by the dqcRules and dqcSkipRules script parameters."""
+    rules = dqc_rules
+    val = params.get('dqcRules', None)
+    if val:
+        numbers = set(_rule_number(_) for _ in val.split('|') if _.strip())
+        rules = [rule for rule in rules if _rule_number(rule.id) in numbers]
+    val = params.get('dqcSkipRules', None)
+    if val:
+        numbers = set(_rule_number(_) for _ in val.split('|') if _.strip())
+        rules = [rule for rule in rules if _rule_number(rule.id) not in numbers]
+    return rules
+
+
+class _CountingFactSet:
+    """Proxy of an xbrl.FactSet which counts the facts returned by iterations and filter() calls."""
+
+    def __init__(self, facts, counter):
+        self._facts = facts
+        self._counter = counter
+
+    def __iter__(self):
+        for fact in self._facts:
+            self._counter[0] += 1
+            yield fact
+
+    def __len__(self):
+        return len(self._facts)
+
+    def filter(self, *args, **kwargs):
+        facts = self._facts.filter(*args, **kwargs)
+        self._counter[0] += len(facts)
+        return facts
+
+    def _counted(self, facts):
+        self._counter[0] += len(facts)
+        return facts
+
+    # Operators are looked up on the type and therefore never reach __getattr__
+    def __sub__(self, other):
+        return self._counted(self._facts - _unwrap_facts(other))
+
+    def __rsub__(self, other):
+        return self._counted(_unwrap_facts(other) - self._facts)
+
+    def __or__(self, other):
+        return self._counted(self._facts | _unwrap_facts(other))
+
+    __ror__ = __or__
+
+    def __and__(self, other):
+        return self._counted(self._facts & _unwrap_facts(other))
+
+    __rand__ = __and__
+
+    def __contains__(self, fact):
+        return fact in self._facts
+
+    def __bool__(self):
+        return len(self._facts) > 0
+
+    def __getattr__(self, name):
+        return getattr(self._facts, name)
+
+
+def _unwrap_facts(facts):
+    return facts._facts if isinstance(facts, _CountingFactSet) else facts
+
+
+class _ProfiledInstance:
+    """Proxy of an xbrl.Instance which counts the fact lookups of a DQC rule."""
+
+    def __init__(self, instance):
+        self._instance = instance
+        self.fact_lookups = [0]
+        self.facts = _CountingFactSet(instance.facts, self.fact_lookups)
+
+    def __getattr__(self, name):
+        return getattr(self._instance, name)
+
+
+class _CountingErrorLog:
+    """Proxy of an xml.ErrorLog which counts the reported findings of a DQC rule."""
+
+    def __init__(self, error_log):
+        self._error_log = error_log
+        self.findings = 0
+
+    def report(self, error):
+        self.findings += 1
+        self._error_log.report(error)
+
+    def __getattr__(self, name):
+        return getattr(self._error_log, name)
+
+
+def run_rule(rule, instance, error_log, suppress_errors, namespaces, models, profile=None):
+    """Executes a single DQC rule and appends its wall time, fact lookups and findings to profile if given."""
+    if profile is None:
+        rule.function(instance, error_log, suppress_errors, namespaces, models)
+        return
+    profiled_instance = _ProfiledInstance(instance)
+    counting_error_log = _CountingErrorLog(error_log)
+    start = time.perf_counter()
+    try:
+        rule.function(profiled_instance, counting_error_log, suppress_errors, namespaces, models)
+    finally:
+        profile.append(collections.OrderedDict([
+            ('rule', rule.id),
+            ('time', time.perf_counter() - start),
+            ('facts', profiled_instance.fact_lookups[0]),
+            ('findings', counting_error_log.findings),
+        ]))
+
+
+class _BufferedErrorLog:
+    """Collects the findings of a single DQC rule until they can be flushed in rule order."""
+
+    def __init__(self):
+        self.errors = []
+
+    def report(self, error):
+        self.errors.append(error)
+
+    def flush(self, error_log):
+        for error in self.errors:
+            error_log.report(error)
+        self.errors = []
+
+
+def run_rules_concurrently(rules, instance, error_log, suppress_errors, namespaces, models, profile, workers):
+    """Executes the DQC rules on a thread pool and reports their buffered findings in rule order, exactly as the sequential execution would."""
+    logs = [_BufferedErrorLog() for _ in rules]
+    profiles = [[] if profile is not None else None for _ in rules]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_rule, rule, instance, log, suppress_errors, namespaces, models, rule_profile) for rule, log, rule_profile in zip(rules, logs, profiles)]
+        try:
+            for future, log, rule_profile in zip(futures, logs, profiles):
+                future.result()
+                log.flush(error_log)
+                if profile is not None:
+                    profile.extend(rule_profile)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def report_profile(instance, error_log, profile, params):
+    """Reports the per-rule profile as INFO messages and writes it to the dqcProfileFile if specified."""
+    path = params.get('dqcProfileFile', None)
+    if path:
+        with open(path, 'w') as f:
+            json.dump(profile, f, indent=2)
+    for entry in profile:
+        error_log.report(xbrl.Error.create(
+            '[%s] %.3f s, %d fact lookups, %d findings' % (entry['rule'], entry['time'], entry['facts'], entry['findings']),
+            severity=xml.ErrorSeverity.INFO,
+            location=instance
+        ))
+
+
 def standard_namespaces(dts):
     """Returns a dict of prefix and (namespace,year) key/value pairs for standard namespaces."""
     namespaces = {}
@@ -1362,7 +2165,7 @@ def parse_suppress_errors(params):
     return val.split('|')
 
 
-def validate(instance, error_log, **params):
+def validate(instance, error_log, models=None, **params):
     """Performs additional validation of xBRL instance according to DQC rules."""
     if instance:
         error_log.report(xbrl.Error.create(
@@ -1373,40 +2176,20 @@ def validate(instance, error_log, **params):
         ))
         suppress_errors = set(code.strip() for code in parse_suppress_errors(params))
         namespaces = standard_namespaces(instance.dts)
+        if models is None:
+            models = ModelCache(instance, namespaces)
+        profile = [] if params.get('dqcProfile', 'false') == 'true' or params.get('dqcProfileFile') else None
         if 'dei' in namespaces:
             try:
-                dqc_0001(instance, error_log, suppress_errors, namespaces)
-                dqc_0004(instance, error_log, suppress_errors, namespaces)
-                dqc_0005(instance, error_log, suppress_errors, namespaces)
-                dqc_0006(instance, error_log, suppress_errors, namespaces)
-                dqc_0008(instance, error_log, suppress_errors, namespaces)
-                dqc_0009(instance, error_log, suppress_errors, namespaces)
-                dqc_0011(instance, error_log, suppress_errors, namespaces)
-                dqc_0013(instance, error_log, suppress_errors, namespaces)
-                dqc_0014(instance, error_log, suppress_errors, namespaces)
-                dqc_0015(instance, error_log, suppress_errors, namespaces)
-                dqc_0018(instance, error_log, suppress_errors, namespaces)
-                dqc_0033(instance, error_log, suppress_errors, namespaces)
-                dqc_0036(instance, error_log, suppress_errors, namespaces)
-                dqc_0041(instance, error_log, suppress_errors, namespaces)
-                # dqc v5 checks
-                dqc_0043(instance, error_log, suppress_errors, namespaces)
-                dqc_0044(instance, error_log, suppress_errors, namespaces)
-                dqc_0045(instance, error_log, suppress_errors, namespaces)
-                dqc_0046(instance, error_log, suppress_errors, namespaces)
-                dqc_0047(instance, error_log, suppress_errors, namespaces)
-                dqc_0048(instance, error_log, suppress_errors, namespaces)
-                dqc_0049(instance, error_log, suppress_errors, namespaces)
-                dqc_0051(instance, error_log, suppress_errors, namespaces)
-                dqc_0052(instance, error_log, suppress_errors, namespaces)
-                dqc_0053(instance, error_log, suppress_errors, namespaces)
-                dqc_0054(instance, error_log, suppress_errors, namespaces)
-                dqc_0055(instance, error_log, suppress_errors, namespaces)
-                dqc_0057(instance, error_log, suppress_errors, namespaces)
-                dqc_0060(instance, error_log, suppress_errors, namespaces)
-                dqc_0061(instance, error_log, suppress_errors, namespaces)
-                dqc_0062(instance, error_log, suppress_errors, namespaces)
-                dqc_0065(instance, error_log, suppress_errors, namespaces)
+                rules = [rule for rule in selected_rules(params) if is_applicable_rule(rule, namespaces)]
+                workers = int(params.get('dqcWorkers', 1))
+                if workers > 1:
+                    run_rules_concurrently(rules, instance, error_log, suppress_errors, namespaces, models, profile, workers)
+                else:
+                    for rule in rules:
+                        run_rule(rule, instance, error_log, suppress_errors, namespaces, models, profile)
+                if profile is not None:
+                    report_profile(instance, error_log, profile, params)
             except RuntimeError as e:
                 if str(e) != "Error limit exceeded":
                    raise
@@ -20,7 +20,10 @@ __version__ = '8.0'
 # The following script parameters can be additionally specified:
 #
 #   dqcRepositoryPath               The path to the DQC XULE rules repository.
+#   dqcReloadRules                  Set to true to discard the cached XULE processor and reload all rulesets.
 #   suppressErrors                  A list of DQC.US.nnnn.mmm error codes separated by | characters.
+#   xuleRunOnly                     Only the given XULE rules (e.g. DQC.US.0015) are evaluated. The value is passed as is to the XULE processor.
+#   xuleSkip                        A list of XULE rules (e.g. DQC.US.0015 or DQC.US.0015.1234) separated by | characters whose results are not reported.
 #
 # Example invocations
 #
@@ -29,6 +32,8 @@ __version__ = '8.0'
 #   raptorxmlxbrl valxbrl --script=dqc_validation_xule.py --script-param=dqcRepositoryPath:/path/to/dqc_us_rules-8.0.0/ instance.xml
 # Suppress a specific error
 #   raptorxmlxbrl valxbrl --script=dqc_validation_xule.py --script-param=suppressErrors:DQC.US.0004.16 instance.xml
+# Evaluate only a single rule
+#   raptorxmlxbrl valxbrl --script=dqc_validation_xule.py --script-param=xuleRunOnly:DQC.US.0015 instance.xml
 #
 # Using Altova RaptorXML+XBRL Server with XMLSpy client:
 #
@@ -44,6 +49,10 @@ __version__ = '8.0'
 # 8.    Validate instance file with XML|Validate XML on Server (Ctrl+F8)
 
 import json
+import os
+import threading
+import urllib.parse
+import urllib.request
 from altova_api.v2 import xml, xsd, xbrl, beta, open, ProductInfo
 xbrl.xule = beta.xbrl.xule
 
@@ -121,13 +130,62 @@ def create_catalog(dqcRepositoryPath):
 </catalog>
 """.format(dqcRepositoryPath=dqcRepositoryPath).encode()).result
 
+ruleset_map_url = 'https://github.com/DataQualityCommittee/dqc_us_rules/blob/v8/plugin/xule/rulesetMap.json?raw=true'
+
+# Cached (signature, processor) tuples keyed by dqcRepositoryPath. The processor is kept for the lifetime of the RaptorXML server process and only rebuilt if the signature changes.
+_xule_processors = {}
+_xule_processors_lock = threading.Lock()
+
+def load_ruleset_map(catalog):
+    with open(ruleset_map_url, catalog=catalog, mode='r') as f:
+        return f.read()
+
+def local_file_stat(url, catalog):
+    """Returns the (path, mtime, size) tuple of the local file the given URL is mapped to or None."""
+    resolved = catalog.resolve_uri(url) or url
+    parts = urllib.parse.urlsplit(resolved)
+    if parts.scheme == 'file':
+        path = urllib.request.url2pathname(parts.path)
+    elif not parts.scheme or len(parts.scheme) == 1:
+        path = resolved.partition('?')[0]
+    else:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_mtime_ns, st.st_size)
+
+def ruleset_signature(ruleset_map_text, catalog):
+    """Returns a signature of the ruleset map content and the modification times and sizes of all local ruleset files it references."""
+    ruleset_map = json.loads(ruleset_map_text)
+    files = []
+    for ruleset in sorted(set(_ for _ in ruleset_map.values() if isinstance(_, str))):
+        files.append(local_file_stat(urllib.parse.urljoin(ruleset_map_url, ruleset), catalog))
+    return (ruleset_map_text, tuple(files))
+
 def setup_xule_processor(dqcRepositoryPath):
     catalog = create_catalog(dqcRepositoryPath)
-    with open('https://github.com/DataQualityCommittee/dqc_us_rules/blob/v8/plugin/xule/rulesetMap.json?raw=true', catalog=catalog, mode='r') as f:
-        ruleset_map = json.load(f)
-
+    ruleset_map = json.loads(load_ruleset_map(catalog))
     return xbrl.xule.Processor(ruleset_map, catalog=catalog)
 
+def cached_xule_processor(dqcRepositoryPath, reload=False):
+    """Returns the cached XULE processor for the given repository path and creates a new one on first use, if reload is True or if the rulesets have changed."""
+    with _xule_processors_lock:
+        catalog = create_catalog(dqcRepositoryPath)
+        ruleset_map_text = load_ruleset_map(catalog)
+        signature = ruleset_signature(ruleset_map_text, catalog)
+        cached = _xule_processors.get(dqcRepositoryPath)
+        if reload or cached is None or cached[0] != signature:
+            cached = (signature, xbrl.xule.Processor(json.loads(ruleset_map_text), catalog=catalog))
+            _xule_processors[dqcRepositoryPath] = cached
+        return cached[1]
+
+def clear_xule_processor_cache():
+    """Discards all cached XULE processors."""
+    with _xule_processors_lock:
+        _xule_processors.clear()
+
 def parse_suppress_errors(params):
     """Returns a list with suppressed error codes."""
     val = params.get('suppressErrors', None)
@@ -135,6 +193,17 @@ def parse_suppress_errors(params):
         return []
     return val.split('|')
     
+def parse_xule_skip(params):
+    """Returns a list with the names of skipped XULE rules."""
+    val = params.get('xuleSkip', None)
+    if not val:
+        return []
+    return [name.strip() for name in val.split('|') if name.strip()]
+
+def is_rule_selected(rule_name, names):
+    """Returns True if rule_name equals one of the given rule names or is one of their sub rules."""
+    return any(rule_name == name or rule_name.startswith(name + '.') for name in names)
+
 def validate(instance, error_log, **params):
     """Performs additional validation checks using the given XULE rules."""
     error_log.report(xbrl.Error.create(
@@ -146,9 +215,12 @@ def validate(instance, error_log, **params):
     ))
     
     suppress_errors = parse_suppress_errors(params)
-    xp = setup_xule_processor(params.get('dqcRepositoryPath', None)) #'file:///C:/Projects/trunk/test/dqc_us_rules-8.0.0/'))
-    for result in xp.execute(instance):
-        if not len(suppress_errors) or result.effective_rule_name in suppress_errors:
+    xule_skip = parse_xule_skip(params)
+    xule_run_only = params.get('xuleRunOnly', None)
+    xp = cached_xule_processor(params.get('dqcRepositoryPath', None), params.get('dqcReloadRules', 'false') == 'true') #'file:///C:/Projects/trunk/test/dqc_us_rules-8.0.0/'))
+    results = xp.execute(instance, xule_run_only) if xule_run_only else xp.execute(instance)
+    for result in results:
+        if result.effective_rule_name not in suppress_errors and not is_rule_selected(result.effective_rule_name, xule_skip):
             error_log.report(create_error(result))
 
 def on_xbrl_finished_dts(job, dts):
@@ -28,23 +28,39 @@ __license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
 #   raptorxmlxbrl script efm_testsuite.py /path/to/efm-47-180610/conf/testcases.xml --log efm_testsuite.log --xml-report efm_testsuite.xml
 # Run only specific testcases
 #   raptorxmlxbrl script efm_testsuite.py /path/to/efm-47-180610/conf/testcases.xml --log efm_testsuite.log --csv-report efm_testsuite.xml --testcase "605-01" "605-02"
+# Re-execute all variations even if their inputs and the validation scripts did not change
+#   raptorxmlxbrl script efm_testsuite.py /path/to/efm-47-180610/conf/testcases.xml --log efm_testsuite.log --csv-report efm_testsuite.csv --force
+# Run the testsuite on two hosts and merge the reports
+#   raptorxmlxbrl script efm_testsuite.py /path/to/efm-47-180610/conf/testcases.xml --csv-report efm_shard1.csv --shard 1/2
+#   raptorxmlxbrl script efm_testsuite.py /path/to/efm-47-180610/conf/testcases.xml --csv-report efm_shard2.csv --shard 2/2
+#   raptorxmlxbrl script efm_testsuite.py merge /path/to/efm-47-180610/conf/testcases.xml efm_shard1.csv efm_shard2.csv --csv-report efm_testsuite.csv
+# Execute the variations in a pool of worker processes
+#   raptorxmlxbrl script efm_testsuite.py /path/to/efm-47-180610/conf/testcases.xml --log efm_testsuite.log --csv-report efm_testsuite.csv --executor process
 
 import altova_api.v2.xml as xml
 import altova_api.v2.xsd as xsd
 import altova_api.v2.xbrl as xbrl
+from altova_api.v2 import ProductInfo
 import efm_validation
+import testsuite_cache
 
 import argparse
 import collections
 import concurrent.futures
 import datetime
+import decimal
+import functools
+import hashlib
 import logging
 import multiprocessing
 import os
 import re
+import sys
+import threading
 import time
 import urllib.parse
 from pathlib import Path
+from xml.parsers import expat
 
 
 re_error_code = re.compile(r'\[EFM\.(\d+\.\d+(\.\d+)?)\] ')
@@ -224,11 +240,18 @@ def load_testcase(testcase_uri):
     return testcase
 
 
-def load_testsuite(index_uri):
-    """Loads the testcases specified in the given testsuite index file and returns a dict with all testcase meta-information."""
+def load_testsuite(index_uri, max_workers=None, cache_path=None):
+    """Loads the testcases specified in the given testsuite index file concurrently and returns a dict with all testcase meta-information.
+    The result is cached in cache_path as long as the index, the testcase files and this script remain unchanged."""
     logging.info('Start loading testsuite index %s', index_uri)
     start = time.time()
 
+    context = {'runner': 'efm_testsuite', 'script': testsuite_cache.file_digest(os.path.abspath(__file__))}
+    testsuite = testsuite_cache.load_testsuite_model(cache_path, index_uri, context)
+    if testsuite is not None:
+        logging.info('Finished loading testsuite index %s from cache %s in %fs', index_uri, cache_path, time.time() - start)
+        return testsuite
+
     # Load the testcase index file
     instance, log = xml.Instance.create_from_url(index_uri)
     # Check for any fatal errors
@@ -242,76 +265,184 @@ def load_testsuite(index_uri):
         'date': attr_val(testcases_elem, 'date')
     }
 
-    # Iterate over all <testcase> child elements and parse the testcase file
-    testcases = []
+    # Iterate over all <testcase> child elements and parse the testcase files concurrently
+    testcase_uris = []
     for testcase_elem in testcases_elem.element_children():
         if testcase_elem.local_name == 'testcase':
             # Get the value of the @uri attribute and make any relative uris absolute to the base uri
             uri = urllib.parse.urljoin(testcase_elem.base_uri, attr_val(testcase_elem, 'uri'))
-            # Load the testcase file
-            testcases.append(load_testcase(uri))
-    testsuite['testcases'] = testcases
+            testcase_uris.append(uri)
+    testsuite['testcases'] = testsuite_cache.load_testcases(testcase_uris, load_testcase, max_workers)
+    testsuite_cache.save_testsuite_model(cache_path, index_uri, context, testsuite)
 
     runtime = time.time() - start
     logging.info('Finished loading testsuite index %s in %fs', index_uri, runtime)
     return testsuite
 
 
-def hash_element_content(elem, refs):
-    if len(list(elem.element_children())) == 0:
-        text = elem.text_content()
-        if text:
-            if '/>' in text or '</' in text:
-                instance, log = xml.Instance.create_from_buffer(('<root xmlns="%s">%s</root>' % (efm_validation.xhtml_namespace, text)).encode('utf-8'))  # assume xhtml as default namespace
-                if not log.has_errors():
-                    s = set()
-                    for child in instance.document_element.element_children():
-                        s.add(hash_element(child))
-                    return frozenset(s)
-            elif elem.schema_actual_value is not None and not isinstance(elem.schema_actual_value, xsd.string):
-                return elem.schema_actual_value
-
-            text = re_collapse.sub(' ', text.strip())  # collapse whitespace (v-equal of non-numeric items)
-            try:
-                text = float(text)
-            except BaseException:
-                pass
-        return text
+def digest(*parts):
+    """Returns the SHA-256 digest of the given str or bytes parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        h.update(b'\0')
+    return h.digest()
 
-    s = set()
-    for child in elem.element_children():
-        s.add(hash_element(child, refs))
-    return frozenset(s)
 
+def digest_set(digests):
+    """Returns an order-independent digest of the child digests. As in a set, duplicates are ignored."""
+    return digest('set', *sorted(set(digests)))
 
-def hash_element(elem, refs=None):
-    d = {
-        'name': elem.qname,
-        'value': hash_element_content(elem, refs)
-    }
+
+def canonical_value(value):
+    """Returns the canonical string of a typed value, which is equal for two values exactly if the typed values are equal.
+    Numeric values are compared as exact decimals, all other values by their type and the canonical form of their Python value."""
+    actual = getattr(value, 'value', value)
+    if isinstance(actual, (decimal.Decimal, int, float)) and not isinstance(actual, bool):
+        number = decimal.Decimal(actual)
+        if number.is_finite():
+            # Strip trailing zeros without rounding to the precision of the default context
+            number = number.normalize(decimal.Context(prec=max(len(number.as_tuple().digits), 1))) if number else decimal.Decimal(0)
+        return 'd' + str(number)
+    if isinstance(actual, datetime.datetime) and actual.tzinfo is not None:
+        actual = actual.astimezone(datetime.timezone.utc)
+    return 'v%s:%s' % (type(value).__name__, actual.isoformat() if hasattr(actual, 'isoformat') else str(actual))
+
+
+def expanded_name(item):
+    return '{%s}%s' % (item.namespace_name or '', item.local_name)
+
+
+def describe_element(elem):
+    """Returns a short label of the element, e.g. context[@id=c1] or Revenues[@contextRef=c1]."""
+    for name in ('id', 'contextRef', 'roleURI', 'arcroleURI', xml.QName('role', efm_validation.xlink_namespace), xml.QName('href', efm_validation.xlink_namespace)):
+        attr = elem.find_attribute(name)
+        if attr is not None:
+            return '%s[@%s=%s]' % (elem.local_name, attr.local_name, attr.normalized_value)
+    return elem.local_name
+
+
+def excluded_attributes(elem):
     exclude_attrs = [xml.QName('label', efm_validation.xlink_namespace), xml.QName('from', efm_validation.xlink_namespace), xml.QName('to', efm_validation.xlink_namespace), xml.QName('order')]
     if elem.qname == xml.QName('schemaRef', efm_validation.link_namespace):
         exclude_attrs.append(xml.QName('arcrole', efm_validation.xlink_namespace))
     if elem.qname != xml.QName('footnote', efm_validation.link_namespace):
         exclude_attrs.append(xml.QName('lang', efm_validation.xml_namespace))
+    return exclude_attrs
+
+
+def canonical_attributes(elem, refs=None):
+    """Returns the sorted list of canonical name=value strings of the compared attributes and records the referenced contexts, units and roles in refs."""
+    exclude_attrs = excluded_attributes(elem)
+    attrs = []
     for attr in elem.attributes:
         if attr.qname not in exclude_attrs:
-            value = attr.schema_actual_value if attr.schema_actual_value is not None else attr.normalized_value
-            d[attr.qname] = value
+            value = attr.schema_actual_value
+            attrs.append('%s=%s' % (expanded_name(attr), canonical_value(value) if value is not None and not isinstance(value, xsd.string) else 's' + attr.normalized_value))
             if refs is not None:
                 if attr.qname == xml.QName('contextRef'):
-                    refs['contexts'].add(value)
+                    refs['contexts'].add(attr.normalized_value)
                 elif attr.qname == xml.QName('unitRef'):
-                    refs['units'].add(value)
+                    refs['units'].add(attr.normalized_value)
                 elif attr.qname == xml.QName('role', efm_validation.xlink_namespace):
-                    refs['roleRefs'].add(value)
+                    refs['roleRefs'].add(attr.normalized_value)
                 elif attr.qname == xml.QName('arcrole', efm_validation.xlink_namespace):
-                    refs['arcroleRefs'].add(value)
-    return frozenset(d.items())
+                    refs['arcroleRefs'].add(attr.normalized_value)
+    return sorted(attrs)
+
+
+def collapsed_text(text):
+    """Returns the canonical string of plain text content; whitespace is collapsed (v-equal of non-numeric items) and numbers compare by their value."""
+    text = re_collapse.sub(' ', (text or '').strip())
+    try:
+        return 'n%r' % float(text)
+    except ValueError:
+        return 't' + text
+
+
+def markup_text(text):
+    """Returns the canonical string of text content which may contain embedded (escaped) XHTML markup."""
+    if text and ('/>' in text or '</' in text):
+        markup = digest_markup(text)
+        if markup is not None:
+            return 'm' + markup[0].hex()
+    return collapsed_text(text)
+
+
+def markup_name(name):
+    """Returns the expanded name of an expat 'namespace local' name."""
+    return '{%s}%s' % tuple(name.split(' ', 1)) if ' ' in name else '{}%s' % name
+
+
+markup_excluded_attrs = frozenset([efm_validation.xlink_namespace + ' label', efm_validation.xlink_namespace + ' from', efm_validation.xlink_namespace + ' to', 'order', efm_validation.xml_namespace + ' lang'])
+
+
+@functools.lru_cache(maxsize=256)
+def digest_markup(text):
+    """Digests embedded XHTML markup (e.g. of escaped footnotes) in a single streaming pass without building a tree. Returns the
+    (digest, children) tuple, where children lists the (label, digest) tuples of the top-level elements, or None if the markup is
+    not well-formed. Results are memoized, so that the mismatch report does not parse the same text again."""
+    parser = expat.ParserCreate(namespace_separator=' ')
+    # Each open element holds its name, attributes, child digests and character data
+    stack = [(None, None, [], [])]
+    children = []
+
+    def start_element(name, attrs):
+        stack.append((name, attrs, [], []))
+
+    def end_element(_):
+        name, attrs, child_digests, text = stack.pop()
+        if len(stack) == 1:
+            # The wrapper element, whose content is the content of the digested text
+            stack[0][2].append(digest_set(child_digests))
+            return
+        attributes = sorted('%s=s%s' % (markup_name(attr), value) for attr, value in attrs.items() if attr not in markup_excluded_attrs)
+        elem_digest = digest('element', markup_name(name), *attributes, digest_set(child_digests) if child_digests else content_digest(markup_text(''.join(text))))
+        stack[-1][2].append(elem_digest)
+        if len(stack) == 2:
+            children.append(('%s[@id=%s]' % (markup_name(name).split('}')[1], attrs['id']) if 'id' in attrs else markup_name(name).split('}')[1], elem_digest))
+
+    def character_data(data):
+        stack[-1][3].append(data)
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    try:
+        parser.Parse('<root xmlns="%s">%s</root>' % (efm_validation.xhtml_namespace, text), True)  # assume xhtml as default namespace
+    except expat.ExpatError:
+        return None
+    return stack[0][2][0], children
+
+
+def content_digest(content):
+    """Returns the digest of a canonical leaf content; embedded markup is represented by the digest of its elements."""
+    return bytes.fromhex(content[1:]) if content.startswith('m') else digest(content)
+
+
+def leaf_content(elem):
+    """Returns the canonical content of an element without element children."""
+    text = elem.text_content()
+    if text and not ('/>' in text or '</' in text) and elem.schema_actual_value is not None and not isinstance(elem.schema_actual_value, xsd.string):
+        return canonical_value(elem.schema_actual_value)
+    return markup_text(text)
+
+
+def digest_element_content(elem, refs):
+    child_digests = [digest_element(child, refs) for child in elem.element_children()]
+    if child_digests:
+        return digest_set(child_digests)
+    return content_digest(leaf_content(elem))
+
+
+def digest_element(elem, refs=None):
+    """Returns the canonical digest of the element subtree computed from the digests of its children (order-independent)."""
+    return digest('element', expanded_name(elem), *canonical_attributes(elem, refs), digest_element_content(elem, refs))
 
 
-def hash_footnoteLink(link, refs):
-    arcs = []
+def digest_footnoteLink(link, refs, arcs):
+    """Adds the digests of all (arc, from, to) relationships of the footnote link to the arcs dict mapping them to their labels."""
+    arc_elems = []
     labels = {}
     for child in link.element_children():
         if child.qname == xml.QName('loc', efm_validation.link_namespace):
@@ -320,58 +451,203 @@ def hash_footnoteLink(link, refs):
             labels.setdefault(child.find_attribute(xml.QName('label', efm_validation.xlink_namespace)).normalized_value, []).append(child)
             refs['roleRefs'].add(child.find_attribute(xml.QName('role', efm_validation.xlink_namespace)).normalized_value)
         elif child.qname == xml.QName('footnoteArc', efm_validation.link_namespace):
-            arcs.append(child)
+            arc_elems.append(child)
             refs['arcroleRefs'].add(child.find_attribute(xml.QName('arcrole', efm_validation.xlink_namespace)).normalized_value)
         else:
             raise Exception('Unexpected element ' + str(child.qname))
 
-    s = set()
-    for arc in arcs:
+    for arc in arc_elems:
+        arc_digest = digest_element(arc)
         for _from in labels[arc.find_attribute(xml.QName('from', efm_validation.xlink_namespace)).normalized_value]:
             for _to in labels[arc.find_attribute(xml.QName('to', efm_validation.xlink_namespace)).normalized_value]:
-                s.add(frozenset({
-                    'arc': hash_element(arc),
-                    'from': hash_element(_from),
-                    'to': hash_element(_to),
-                }.items()))
-    return frozenset(s)
+                arcs[digest('arc', arc_digest, digest_element(_from), digest_element(_to))] = '%s from %s to %s' % (describe_element(arc), describe_element(_from), describe_element(_to))
 
 
-def hash_instance(elem):
+OutputItem = collections.namedtuple('OutputItem', ['label', 'element', 'arcs'])
+
+
+def digest_instance(elem):
+    """Returns a dict mapping the digests of all compared top-level items of the instance to OutputItem tuples. Contexts, units,
+    roleRefs, arcroleRefs and footnote links only count if they are referenced."""
     refs = {'contexts': set(), 'units': set(), 'roleRefs': set(), 'arcroleRefs': set(), 'footnoteLinks': set()}
     refElems = {'contexts': {}, 'units': {}, 'roleRefs': {}, 'arcroleRefs': {}, 'footnoteLinks': {}}
-    s = set()
+    items = {}
+    footnote_arcs = {}
     for child in elem.element_children():
-        if child.qname == xml.QName('schemaRef', efm_validation.link_namespace):
-            s.add(hash_element(child))
-        elif child.qname == xml.QName('linkbaseRef', efm_validation.link_namespace):
-            s.add(hash_element(child))
+        if child.qname == xml.QName('schemaRef', efm_validation.link_namespace) or child.qname == xml.QName('linkbaseRef', efm_validation.link_namespace):
+            items[digest_element(child)] = OutputItem(describe_element(child), child, None)
         elif child.qname == xml.QName('roleRef', efm_validation.link_namespace):
-            refElems['roleRefs'][child.find_attribute('roleURI').normalized_value] = hash_element(child)
+            refElems['roleRefs'][child.find_attribute('roleURI').normalized_value] = (digest_element(child), child)
         elif child.qname == xml.QName('arcroleRef', efm_validation.link_namespace):
-            refElems['arcroleRefs'][child.find_attribute('arcroleURI').normalized_value] = hash_element(child)
+            refElems['arcroleRefs'][child.find_attribute('arcroleURI').normalized_value] = (digest_element(child), child)
         elif child.qname == xml.QName('context', efm_validation.xbrli_namespace):
-            refElems['contexts'][child.find_attribute('id').normalized_value] = hash_element(child)
+            refElems['contexts'][child.find_attribute('id').normalized_value] = (digest_element(child), child)
         elif child.qname == xml.QName('unit', efm_validation.xbrli_namespace):
-            refElems['units'][child.find_attribute('id').normalized_value] = hash_element(child)
+            refElems['units'][child.find_attribute('id').normalized_value] = (digest_element(child), child)
         elif child.qname == xml.QName('footnoteLink', efm_validation.link_namespace):
             role = child.find_attribute(xml.QName('role', efm_validation.xlink_namespace)).normalized_value
             refs['roleRefs'].add(role)
             refs['footnoteLinks'].add(role)
-            refElems['footnoteLinks'][role] = refElems['footnoteLinks'].get(role, frozenset()) | hash_footnoteLink(child, refs)
+            digest_footnoteLink(child, refs, footnote_arcs.setdefault(role, {}))
         else:
-            s.add(hash_element(child, refs))
+            items[digest_element(child, refs)] = OutputItem(describe_element(child), child, None)
+    for role, arcs in footnote_arcs.items():
+        refElems['footnoteLinks'][role] = (digest_set(arcs.keys()), arcs)
     for key in refs.keys():
-        for ref in refs[key]:
+        for ref in sorted(refs[key]):
             if ref in refElems[key]:
-                s.add(refElems[key][ref])
-    return frozenset(s)
-
-
-def cmp_output(l, r):
-    hash_left = hash_instance(l)
-    hash_right = hash_instance(r)
-    return hash_left == hash_right
+                item_digest, item = refElems[key][ref]
+                if key == 'footnoteLinks':
+                    items[item_digest] = OutputItem('footnoteLink[@role=%s]' % ref, None, item)
+                else:
+                    items[item_digest] = OutputItem(describe_element(item), item, None)
+    return items
+
+
+def describe_difference(l, r, path):
+    """Descends into the first differing child of the two elements and returns a description of the first difference."""
+    if expanded_name(l) != expanded_name(r):
+        return '%s: element %s differs from %s' % (path, expanded_name(l), expanded_name(r))
+    l_attrs, r_attrs = canonical_attributes(l), canonical_attributes(r)
+    if l_attrs != r_attrs:
+        return '%s: attributes [%s] differ from [%s]' % (path, ' '.join(sorted(set(l_attrs) - set(r_attrs))), ' '.join(sorted(set(r_attrs) - set(l_attrs))))
+
+    l_children, r_children = list(l.element_children()), list(r.element_children())
+    if not l_children and not r_children:
+        l_content, r_content = leaf_content(l), leaf_content(r)
+        if l_content.startswith('m') and r_content.startswith('m'):
+            # Compare the top-level elements of the embedded markup, which digest_markup has already memoized
+            l_markup, r_markup = digest_markup(l.text_content())[1], digest_markup(r.text_content())[1]
+            l_only = [label for label, child_digest in l_markup if child_digest not in set(_[1] for _ in r_markup)]
+            r_only = [label for label, child_digest in r_markup if child_digest not in set(_[1] for _ in l_markup)]
+            for label in l_only:
+                if label in r_only:
+                    return '%s/%s: content differs' % (path, label)
+            if l_only:
+                return '%s: %s is missing' % (path, l_only[0])
+            if r_only:
+                return '%s: %s is not expected' % (path, r_only[0])
+            return '%s: content differs' % path
+        return '%s: value %.100r differs from %.100r' % (path, l.text_content() if l_content.startswith('m') else l_content[1:], r.text_content() if r_content.startswith('m') else r_content[1:])
+
+    l_digests = {digest_element(child): child for child in l_children}
+    r_digests = {digest_element(child): child for child in r_children}
+    l_only = [child for child_digest, child in l_digests.items() if child_digest not in r_digests]
+    r_only = [child for child_digest, child in r_digests.items() if child_digest not in l_digests]
+    for child in l_only:
+        for other in r_only:
+            if describe_element(other) == describe_element(child):
+                return describe_difference(child, other, '%s/%s' % (path, describe_element(child)))
+    if l_only:
+        return '%s: %s is missing' % (path, describe_element(l_only[0]))
+    if r_only:
+        return '%s: %s is not expected' % (path, describe_element(r_only[0]))
+    return '%s: content differs' % path
+
+
+def diff_output(l, r):
+    """Compares the reference output l with the actual output r and returns None if they are equivalent or a description of the first differing subtree."""
+    left = digest_instance(l)
+    right = digest_instance(r)
+    if left.keys() == right.keys():
+        return None
+    l_only = [item for item_digest, item in left.items() if item_digest not in right]
+    r_only = [item for item_digest, item in right.items() if item_digest not in left]
+    for item in l_only:
+        for other in r_only:
+            if other.label == item.label:
+                if item.element is not None and other.element is not None:
+                    return describe_difference(item.element, other.element, item.label)
+                missing = [label for arc_digest, label in item.arcs.items() if arc_digest not in other.arcs]
+                unexpected = [label for arc_digest, label in other.arcs.items() if arc_digest not in item.arcs]
+                return '%s: %s' % (item.label, '%s is missing' % missing[0] if missing else '%s is not expected' % unexpected[0])
+    if l_only:
+        return '%s is missing' % l_only[0].label
+    return '%s is not expected' % r_only[0].label
+
+
+xsd_namespace = 'http://www.w3.org/2001/XMLSchema'
+
+# Cached UTR determinations keyed by the sorted tuple of variation schema uris and by standard schema uri
+utr_by_schemas = {}
+utr_by_standard_schema = {}
+utr_cache_lock = threading.Lock()
+utr_key_locks = {}
+
+
+def cached_UTR_determination(cache, key, determine):
+    """Returns the cached UTR determination for key, calling determine() while holding a lock for this key, so that concurrent variations wait for a pending determination instead of loading the same DTS again."""
+    with utr_cache_lock:
+        if key in cache:
+            return cache[key]
+        key_lock = utr_key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        with utr_cache_lock:
+            if key in cache:
+                return cache[key]
+        result = determine()
+        with utr_cache_lock:
+            cache[key] = result
+        return result
+
+
+def dts_declares_UTR(uris, standard_namespace2uris):
+    dts, _ = xbrl.taxonomy.DTS.create_from_url(uris)
+    return bool(dts) and efm_validation.check_for_UTR_concept(dts, standard_namespace2uris)
+
+
+def standard_schema_declares_UTR(uri, standard_namespace2uris):
+    """Returns True if the DTS of the given standard schema declares the UTR concept. The DTS of each standard schema is only loaded once."""
+    return cached_UTR_determination(utr_by_standard_schema, uri, lambda: dts_declares_UTR(uri, standard_namespace2uris))
+
+
+def scan_schemas_for_UTR(schema_uris, standard_namespace2uris):
+    """Determines if the UTR concept is declared in the DTS of the given schemas by scanning the xs:import and xs:include elements of the non-standard schemas.
+    Returns None if a schema cannot be loaded or references linkbases, whose loc hrefs may discover further schemas; the full DTS must be loaded in that case."""
+    standard_uris = set(uri for uris in standard_namespace2uris.values() for uri in uris)
+    visited = set()
+    pending = list(schema_uris)
+    while pending:
+        uri = pending.pop()
+        if uri in visited:
+            continue
+        visited.add(uri)
+        if uri in standard_uris:
+            if standard_schema_declares_UTR(uri, standard_namespace2uris):
+                return True
+            continue
+        instance, _ = xml.Instance.create_from_url(uri)
+        if not instance:
+            return None
+        schema_elem = instance.document_element
+        declares_standard_namespace = attr_val(schema_elem, 'targetNamespace') in standard_namespace2uris
+        for elem in schema_elem.element_children():
+            if elem.namespace_name != xsd_namespace:
+                continue
+            if elem.local_name in ('import', 'include', 'redefine'):
+                location = attr_val(elem, 'schemaLocation')
+                if location:
+                    pending.append(urllib.parse.urljoin(elem.base_uri, location))
+            elif elem.local_name == 'element' and declares_standard_namespace and attr_val(elem, 'name') == 'UTR':
+                return True
+            elif elem.local_name == 'annotation':
+                for appinfo in elem.element_children():
+                    if appinfo.namespace_name == xsd_namespace and appinfo.local_name == 'appinfo':
+                        if any(child.namespace_name == efm_validation.link_namespace for child in appinfo.element_children()):
+                            return None  # link:linkbaseRef or embedded link:linkbase
+    return False
+
+
+def is_UTR_enabled(schema_uris, standard_namespace2uris):
+    """Returns True if UTR checks should be enabled for the given variation schemas. The result is cached per unique set of schemas and falls back to loading the full DTS if the schemas cannot be scanned."""
+    key = tuple(sorted(schema_uris))
+
+    def determine():
+        bEnableUTR = scan_schemas_for_UTR(key, standard_namespace2uris)
+        if bEnableUTR is None:
+            bEnableUTR = dts_declares_UTR(list(key), standard_namespace2uris)
+        return bEnableUTR
+    return cached_UTR_determination(utr_by_schemas, key, determine)
 
 
 def execute_variation(testcase, variation, global_params, standard_namespace2uris):
@@ -403,9 +679,7 @@ def execute_variation(testcase, variation, global_params, standard_namespace2uri
     if forceUtrValidationParam:
         bEnableUTR = forceUtrValidationParam[0]['value'] == 'true'
     else:
-        dts, _ = xbrl.taxonomy.DTS.create_from_url(schema['uri'] for schema in variation['data']['schemas'])
-        if dts:
-            bEnableUTR = efm_validation.check_for_UTR_concept(dts, standard_namespace2uris)
+        bEnableUTR = is_UTR_enabled([schema['uri'] for schema in variation['data']['schemas']], standard_namespace2uris)
 
     bNotEDGARDependent = 'Not EDGAR Dependent' in testcase['name']
     has_ixbrl_warnings = False
@@ -496,7 +770,9 @@ def execute_variation(testcase, variation, global_params, standard_namespace2uri
     if passed and instance is not None and 'instance' in variation['result'].keys():
         ref_instance, ref_error_log = xbrl.Instance.create_from_url(variation['result']['instance'])
         if ref_instance is not None:
-            if not cmp_output(ref_instance.document_element, instance.document_element):
+            difference = diff_output(ref_instance.document_element, instance.document_element)
+            if difference is not None:
+                logging.info('[%s%s] Output differs from %s: %s', testcase['number'], variation['id'], variation['result']['instance'], difference)
                 conformance = 'OUTPUT MISMATCH'
 
     error_counts = error_counts['err'] + error_counts['wrn']
@@ -504,6 +780,48 @@ def execute_variation(testcase, variation, global_params, standard_namespace2uri
     return conformance, error_counts
 
 
+# Per process state of the process pool workers, set up once by init_worker
+worker_state = {}
+
+
+def init_worker(global_params, args):
+    """Initializes a process pool worker by setting up logging and loading the EDGAR standard taxonomy data once per process."""
+    setup_logging(args, worker=True)
+    edgar_version, standard_taxonomies = efm_validation.parse_edgar_taxonomies(global_params['edgar-taxonomies-url'], xml.Catalog.root_catalog(), None)
+    worker_state['global_params'] = global_params
+    worker_state['standard_namespace2uris'] = efm_validation.get_standard_namespace2uris(standard_taxonomies)
+
+
+def execute_variation_in_worker(testcase, variation):
+    """Executes the variation within a process pool worker and returns the picklable (status, error counts) tuple."""
+    return execute_variation(testcase, variation, worker_state['global_params'], worker_state['standard_namespace2uris'])
+
+
+def create_result_cache(global_params, args):
+    """Returns the result cache for the current validation scripts, data files and runner parameters or None if disabled."""
+    if not args.result_cache:
+        return None
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    context = {
+        'runner': 'efm_testsuite',
+        'product': ProductInfo.full_product_name,
+        'scripts': testsuite_cache.files_digest([os.path.join(script_dir, name) for name in ('efm_testsuite.py', 'efm_validation.py', 'dqc_validation.py', 'dqc_data')]),
+        'params': global_params,
+        'inputs': [testsuite_cache.uri_digest(uri) for _, uri in sorted(global_params.items())],
+    }
+    return testsuite_cache.ResultCache(args.result_cache, context)
+
+
+def variation_cache_key(cache, testcase, variation):
+    """Returns the result cache key of the variation from its meta-information and the digests of all its input and expected output files."""
+    data = variation.get('data', {})
+    uris = [entry['uri'] for kind in ('instances', 'linkbases', 'schemas', 'images') for entry in data.get(kind, [])]
+    if 'instance' in variation.get('result', {}):
+        uris.append(variation['result']['instance'])
+    meta = {'testcase': testcase['number'], 'name': testcase.get('name'), 'variation': variation}
+    return cache.key(meta, [testsuite_cache.uri_digest(uri) for uri in uris])
+
+
 def execute_testsuite(testsuite, args):
     """Runs all testcase variations in parallel and returns a dict with the results of each testcase variation."""
     logging.info('Start executing %s variations in %d testcases', sum(len(testcase['variations']) for testcase in testsuite['testcases']), len(testsuite['testcases']))
@@ -519,30 +837,77 @@ def execute_testsuite(testsuite, args):
         'edbody-url': basepath + '/lib/edbody.dtd'
     }
         
-    edgar_version, standard_taxonomies = efm_validation.parse_edgar_taxonomies(global_params['edgar-taxonomies-url'], xml.Catalog.root_catalog(), None)
-    standard_namespace2uris = efm_validation.get_standard_namespace2uris(standard_taxonomies)    
-    
+    if args.executor == 'process':
+        # Each worker process loads the standard taxonomy data itself, only the testcase metadata and the results are pickled
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.max_workers, mp_context=multiprocessing.get_context('fork'), initializer=init_worker, initargs=(global_params, args))
+    else:
+        edgar_version, standard_taxonomies = efm_validation.parse_edgar_taxonomies(global_params['edgar-taxonomies-url'], xml.Catalog.root_catalog(), None)
+        standard_namespace2uris = efm_validation.get_standard_namespace2uris(standard_taxonomies)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers)
+
+    cache = create_result_cache(global_params, args)
+    cache_keys = {}
+    timings = testsuite_cache.TimingDatabase(args.timing_db)
+
     results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+    with executor:
 
-        # Schedule processing of all variations as futures
-        futures = {}
+        # Collect all selected variations of this shard
+        selected = []
         for testcase in testsuite['testcases']:
             if args.testcase_numbers and testcase['number'] not in args.testcase_numbers:
                 continue
+            testcase_info = {key: value for key, value in testcase.items() if key != 'variations'} if args.executor == 'process' else testcase
             for variation in testcase['variations']:
                 if args.variation_ids and variation['id'] not in args.variation_ids:
                     continue
-                futures[executor.submit(execute_variation, testcase, variation, global_params, standard_namespace2uris)] = (testcase['uri'], variation['id'])
+                selected.append((testcase, testcase_info, variation))
+        shard_name = lambda x: x[0]['number'] + x[2]['id']
+        selected = testsuite_cache.select_shard(selected, shard_name, args.shard, (lambda x: timings.predict(shard_name(x))) if args.shard_by == 'runtime' else None)
+
+        # Collect all variations which need to be executed
+        tasks = []
+        for testcase, testcase_info, variation in selected:
+            variation_key = (testcase['uri'], variation['id'])
+            if cache is not None:
+                cache_keys[variation_key] = variation_cache_key(cache, testcase, variation)
+                cached = cache.get(cache_keys[variation_key]) if not args.force else None
+                if cached is not None:
+                    logging.info('[%s%s] Using cached result: %s', testcase['number'], variation['id'], cached[0])
+                    results[variation_key] = cached
+                    continue
+            if args.executor == 'process':
+                task = (execute_variation_in_worker, testcase_info, variation)
+            else:
+                task = (execute_variation, testcase, variation, global_params, standard_namespace2uris)
+            tasks.append((variation_key, testcase['number'] + variation['id'], task))
+
+        # Schedule processing of all variations as futures, longest first according to the timings of previous runs
+        tasks = testsuite_cache.longest_first(tasks, lambda task: timings.predict(task[1]))
+        predicted = testsuite_cache.predict_makespan([timings.predict(name) for _, name, _ in tasks], args.max_workers)
+        submitted = time.time()
+        futures = {}
+        for variation_key, name, task in tasks:
+            futures[executor.submit(testsuite_cache.timed_call, *task)] = (variation_key, name)
 
         # Wait for all futures to finish
+        runtimes = []
         for future in concurrent.futures.as_completed(futures):
-            variation_key = futures[future]
+            variation_key, name = futures[future]
             try:
-                results[variation_key] = future.result()
+                results[variation_key], variation_runtime = future.result()
+                timings.record(name, variation_runtime)
+                runtimes.append(variation_runtime)
             except BaseException:
                 results[variation_key] = 'EXCEPTION', collections.Counter()
                 logging.exception('[%s%s] Exception raised during testcase execution:', variation_key[0], variation_key[1])
+            if cache is not None:
+                cache.put(cache_keys[variation_key], results[variation_key])
+        testsuite_cache.report_makespan(predicted, time.time() - submitted, runtimes, args.max_workers)
+
+    if cache is not None:
+        cache.save()
+    timings.save()
 
     runtime = time.time() - start
     logging.info('Finished executing testcase variations in %fs', runtime)
@@ -560,7 +925,7 @@ def calc_conformance(results):
             skipped += 1
         else:
             failed += 1
-    conformance = (total - failed) * 100 / total
+    conformance = (total - failed) * 100 / total if total > 0 else 100
     return total, failed, skipped, conformance
 
 
@@ -647,7 +1012,7 @@ def print_results(testsuite, results, runtime):
 def run_xbrl_testsuite(uri, args):
     """Load and execute the conformance testsuite."""
     try:
-        testsuite = load_testsuite(uri)
+        testsuite = load_testsuite(uri, args.max_workers, args.testsuite_cache)
         results, runtime = execute_testsuite(testsuite, args)
         logging.info('Start generating testsuite report')
         if args.csv_file:
@@ -661,10 +1026,13 @@ def run_xbrl_testsuite(uri, args):
         logging.exception('Testsuite run aborted with exception:')
 
 
-def setup_logging(args):
-    """Initializes Python logging module."""
+def setup_logging(args, worker=False):
+    """Initializes Python logging module. Process pool workers append to the log file of the main process."""
+    if worker:
+        for handler in logging.getLogger().handlers[:]:
+            logging.getLogger().removeHandler(handler)
     if args.log_file:
-        logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', filename=args.log_file, filemode='w', level=logging.DEBUG if args.log_level == 'DEBUG' else logging.INFO)
+        logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', filename=args.log_file, filemode='a' if worker else 'w', level=logging.DEBUG if args.log_level == 'DEBUG' else logging.INFO)
     else:
         logging.getLogger().addHandler(logging.NullHandler())
     console = logging.StreamHandler()
@@ -685,10 +1053,56 @@ def parse_args():
     parser.add_argument('-t', '--testcase', metavar='TESTCASE_NUMBER', dest='testcase_numbers', nargs='*', help='limit execution to only this testcase number')
     parser.add_argument('-v', '--variation', metavar='VARIATION_ID', dest='variation_ids', nargs='*', help='limit execution to only this variation id')
     parser.add_argument('-w', '--workers', metavar='MAX_WORKERS', type=int, dest='max_workers', default=multiprocessing.cpu_count(), help='limit number of workers')
-    return parser.parse_args()
+    parser.add_argument('--executor', dest='executor', choices=['thread', 'process'], default='thread', help='execute variations in a thread or process pool (thread|process); process pools fork the RaptorXML process and are therefore not available on Windows')
+    parser.add_argument('--result-cache', metavar='CACHE_FILE', dest='result_cache', default='efm_testsuite_results.json', help='cache file for the results of unchanged variations (default efm_testsuite_results.json, empty to disable)')
+    parser.add_argument('--force', dest='force', action='store_true', help='re-execute all variations and ignore cached results')
+    parser.add_argument('--timing-db', metavar='TIMING_FILE', dest='timing_db', default='efm_testsuite_timings.json', help='file with the runtimes of previous runs used for longest-first scheduling (default efm_testsuite_timings.json, empty to disable)')
+    parser.add_argument('--testsuite-cache', metavar='CACHE_FILE', dest='testsuite_cache', default='efm_testsuite_index.pickle', help='cache file for the parsed testsuite index and testcase files (default efm_testsuite_index.pickle, empty to disable)')
+    parser.add_argument('--shard', metavar='INDEX/COUNT', dest='shard', type=testsuite_cache.parse_shard, help='execute only the INDEX-th of COUNT slices of the variations (INDEX counting from 1)')
+    parser.add_argument('--shard-by', dest='shard_by', choices=['hash', 'runtime'], default='hash', help='partition variations by a stable hash of their id or balance the runtimes of a timing database shared by all shards (hash|runtime)')
+    args = parser.parse_args()
+    if args.executor == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+        # Spawned workers would start sys.executable, which is the RaptorXML binary and not a Python interpreter
+        parser.error('--executor process requires the fork start method which is not available on this platform')
+    return args
+
+
+def parse_merge_args():
+    """Parse command line arguments of the merge subcommand"""
+    parser = argparse.ArgumentParser(prog='efm_testsuite.py merge', description='Merge the CSV reports of several testsuite shards into a single report')
+    parser.add_argument('uri', metavar='INDEX', help='main testsuite index file')
+    parser.add_argument('shard_reports', metavar='SHARD_CSV', nargs='+', help='csv report of a testsuite shard')
+    parser.add_argument('-l', '--log', metavar='LOG_FILE', dest='log_file', help='log output file')
+    parser.add_argument('--log-level', metavar='LOG_LEVEL', dest='log_level', choices=['INFO', 'DEBUG'], default='INFO', help='log level (INFO|DEBUG)')
+    parser.add_argument('--csv-report', metavar='CSV_FILE', dest='csv_file', help='write merged testsuite results to csv')
+    parser.add_argument('--xml-report', metavar='XML_FILE', dest='xml_file', help='write merged testsuite results to xml')
+    parser.add_argument('--relative-uris', dest='relative_uris', action='store_true', help='write testcase uris relative to testsuite index file')
+    parser.add_argument('--testsuite-cache', metavar='CACHE_FILE', dest='testsuite_cache', default='efm_testsuite_index.pickle', help='cache file for the parsed testsuite index and testcase files (default efm_testsuite_index.pickle, empty to disable)')
+    return parser.parse_args(sys.argv[2:])
+
+
+def merge_shard_reports(args):
+    """Combines the per-shard CSV reports and writes the merged report."""
+    try:
+        testsuite = load_testsuite(args.uri, cache_path=args.testsuite_cache)
+        results, runtime = testsuite_cache.merge_csv_reports(args.shard_reports, testsuite)
+        if args.csv_file:
+            write_csv_report(args.csv_file, testsuite, results, runtime, args.relative_uris)
+        if args.xml_file:
+            write_xml_report(args.xml_file, testsuite, results, runtime, args.relative_uris)
+        if not args.csv_file and not args.xml_file:
+            print_results(testsuite, results, runtime)
+    except BaseException:
+        logging.exception('Merging shard reports aborted with exception:')
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        args = parse_merge_args()
+        setup_logging(args)
+        merge_shard_reports(args)
+        return
+
     # Parse command line arguments
     args = parse_args()
 
@@ -445,20 +445,6 @@ def parse_edbody_dtd(uri_edbody_dtd, catalog, error_log):
     return edbody_dtd
 
 
-def calc_base_to_derived_types(schema):
-    base_to_derived_types = {}
-    for type in schema.type_definitions:
-        derived_types = base_to_derived_types.setdefault(type.base_type_definition, [])
-        derived_types.append(type)
-    return base_to_derived_types
-
-
-def get_derived_types(base_to_derived_types, type, derived_types):
-    derived_types.add(type)
-    for derived_type in base_to_derived_types.get(type, set()):
-        get_derived_types(base_to_derived_types, derived_type, derived_types)
-
-
 def validate_contexts(instance, error_log, CIK, contextrefs, used_concepts, standard_namespace2uris):
     contexts_with_start_date = []
     for context in instance.contexts:
@@ -555,7 +541,7 @@ def v_equals(fact, fact2):
     return fact.normalized_value == fact2.normalized_value
 
 
-def validate_facts(instance, error_log, catalog, domainItemTypes, textBlockItemTypes, edbody_dtd, is_ixbrl):
+def validate_facts(instance, error_log, catalog, concept_classifier, edbody_dtd, is_ixbrl):
     unique_facts = {}
     contextrefs = set()
     used_concepts = {}
@@ -564,6 +550,7 @@ def validate_facts(instance, error_log, catalog, domainItemTypes, textBlockItemT
             used_concepts[fact.concept] = True
         if isinstance(fact, xbrl.Item):
             contextrefs.add(fact.contextRef)
+            concept_kind = concept_classifier.kind(fact.concept)
 
             # 6.5.12 An instance must not have more than one fact having the same element name, equal contextRef attributes, and if they are present, equal unitRef attributes and xml:lang attributes, respectively, unless their fact values are the same.
             key = (fact.qname, fact.contextRef, fact.unitRef, 'en-US' if fact.xml_lang is None else fact.xml_lang)
@@ -574,7 +561,7 @@ def validate_facts(instance, error_log, catalog, domainItemTypes, textBlockItemT
 
             # 6.5.15 If the un-escaped content of a fact with base type us-types:textBlockItemType or a type equal to or derived by restriction of the type 'escapedItemType' in a standard taxonomy schema namespace contains the '<' character followed by a QName and whitespace, '/>' or '>', then the un-escaped content must contain only a sequence of text and XML nodes.
             # 6.5.16 Facts of type 'text block' whose un-escaped content contains markup must satisfy the content model of the BODY tag as defined in 5.2.2.
-            if not is_ixbrl and not fact.xsi_nil and fact.concept.type_definition in textBlockItemTypes:
+            if not is_ixbrl and not fact.xsi_nil and (concept_kind.textblock or concept_kind.escaped):
                 if re_html_stag.search(fact.normalized_value):
                     html = ''.join(('<body>', fact.normalized_value, '</body>'))
                     (xsi, log) = xml.Instance.create_from_buffer(html.encode(), dtd=edbody_dtd, catalog=catalog)
@@ -593,7 +580,7 @@ def validate_facts(instance, error_log, catalog, domainItemTypes, textBlockItemT
                 error_log.report(xbrl.Error.create('[EFM.6.5.17] Attribute {precision} is not allowed on fact {fact}.', location=fact.element.find_attribute('precision'), precision=fact.element.find_attribute('precision'), fact=fact))
 
             # 6.5.25 Elements with a type attribute equal to or a restriction of 'domainItemType' in a standard taxonomy schema target namespace must not appear as facts in an instance.
-            if fact.concept.type_definition in domainItemTypes:
+            if concept_kind.domain_item:
                 error_log.report(xbrl.Error.create('[EFM.6.5.25] Domain item {fact} must not appear as fact in the instance.', fact=fact))
 
             # 6.5.37 The decimals attribute value must not cause non-zero digits in the fact value to be interpreted as zero.
@@ -614,9 +601,11 @@ def validate_facts(instance, error_log, catalog, domainItemTypes, textBlockItemT
     return contextrefs, used_concepts
 
 
-def validate_required_facts(instance, error_log, taxonomy_per_type, required_contexts, cikValue, cikNames, submissionType):
+def validate_required_facts(instance, error_log, taxonomy_per_type, filing_profile, cikNames, submissionType):
     main_prefix = 'us-gaap' if 'us-gaap' in taxonomy_per_type else 'ifrs-full' if 'ifrs-full' in taxonomy_per_type else None
-    dei_namespace = None if 'dei' not in taxonomy_per_type else taxonomy_per_type['dei'][0].target_namespace
+    dei_namespace = filing_profile.dei_namespace
+    required_contexts = filing_profile.required_contexts
+    cikValue = filing_profile.cik
     qname_DocumentType = xml.QName('DocumentType', dei_namespace, 'dei')
     qname_DocumentPeriodEndDate = xml.QName('DocumentPeriodEndDate', dei_namespace, 'dei')
     qname_AmendmentFlag = xml.QName('AmendmentFlag', dei_namespace, 'dei')
@@ -667,7 +656,7 @@ def validate_required_facts(instance, error_log, taxonomy_per_type, required_con
         error_log.report(xbrl.Error.create('[EFM.6.5.19] Instance {xbrl} must contain a required context.', xbrl=instance.document_element))
     else:
         # 6.5.20 For each required Document Information element, an instance must contain a fact with that element and a contextRef attribute referring to its Required Context.
-        facts = [fact for fact in instance.facts.filter(qname_DocumentType) if fact.context in required_contexts]
+        facts = [fact for fact in filing_profile.facts('DocumentType') if fact.context in required_contexts]
         for fact in facts:
             document_type = fact
             document_type_value = document_type.normalized_value
@@ -697,13 +686,13 @@ def validate_required_facts(instance, error_log, taxonomy_per_type, required_con
             error_log.report(xbrl.Error.create('[EFM.6.5.20] Instance {xbrl} must contain a {qname} fact in %s.' % required_context_text, xbrl=instance.document_element, qname=qname_DocumentType, context=required_context))
 
         # 6.5.20 For each required Document Information element, an instance must contain a fact with that element and a contextRef attribute referring to its Required Context.
-        facts = [fact for fact in instance.facts.filter(qname_DocumentPeriodEndDate) if fact.context in required_contexts]
+        facts = [fact for fact in filing_profile.facts('DocumentPeriodEndDate') if fact.context in required_contexts]
         if not facts:
             error_log.report(xbrl.Error.create('[EFM.6.5.20] Instance {xbrl} must contain a {qname} fact in %s.' % required_context_text, xbrl=instance.document_element, qname=qname_DocumentPeriodEndDate, context=required_context))
 
         # 6.5.20 For each required Document Information element, an instance must contain a fact with that element and a contextRef attribute referring to its Required Context.
         amendment_flag = None
-        facts = [fact for fact in instance.facts.filter(qname_AmendmentFlag) if fact.context in required_contexts]
+        facts = [fact for fact in filing_profile.facts('AmendmentFlag') if fact.context in required_contexts]
         if not facts:
             error_log.report(xbrl.Error.create('[EFM.6.5.20] Instance {xbrl} must contain a {qname} fact in %s.' % required_context_text, severity=xml.ErrorSeverity.WARNING, xbrl=instance.document_element, qname=qname_AmendmentFlag, context=required_context))
         else:
@@ -711,7 +700,7 @@ def validate_required_facts(instance, error_log, taxonomy_per_type, required_con
         amendment_flag_value = amendment_flag.element.schema_actual_value if amendment_flag is not None else False
 
         # 6.5.20 For each required Document Information element, an instance must contain a fact with that element and a contextRef attribute referring to its Required Context.
-        facts = [fact for fact in instance.facts.filter(qname_AmendmentDescription) if fact.context in required_contexts]
+        facts = [fact for fact in filing_profile.facts('AmendmentDescription') if fact.context in required_contexts]
         if not facts and amendment_flag_value:
             error_log.report(xbrl.Error.create('[EFM.6.5.20] Instance {xbrl} must contain a {qname} fact in the required context {context} when {amendment_flag} was set to {amendment_flag:value}.',
                                                severity=xml.ErrorSeverity.WARNING, xbrl=instance.document_element, qname=qname_AmendmentDescription, context=amendment_flag.context, amendment_flag=amendment_flag))
@@ -722,7 +711,7 @@ def validate_required_facts(instance, error_log, taxonomy_per_type, required_con
 
         # 6.5.21 An instance must contain one non-empty fact for each required Entity Information element, each with a contextRef attribute referring to a Required Context. The value of an EntityPublicFloat fact in an instance will be 0 for an entity that has only public debt.
         for qname in required_entity_elements.get(document_type_value, []):
-            facts = [fact for fact in instance.facts.filter(qname) if fact.context in required_contexts or (fact.context.period.is_instant() and fact.context.entity.segment is None)]
+            facts = [fact for fact in filing_profile.facts(qname.local_name) if fact.context in required_contexts or (fact.context.period.is_instant() and fact.context.entity.segment is None)]
             if not facts or not any(not fact.xsi_nil for fact in facts):
                 severity = xml.ErrorSeverity.ERROR if qname in (qname_EntityRegistrantName, qname_EntityCentralIndexKey) else xml.ErrorSeverity.WARNING
                 concept = instance.dts.resolve_concept(qname)
@@ -742,7 +731,7 @@ def validate_required_facts(instance, error_log, taxonomy_per_type, required_con
         if document_type_value in ('10-K', '10-Q', '20-F', '10-KT', '10-QT', '40-F'):
             required_context_fact = []
             class_of_stock_facts = {}
-            facts = instance.facts.filter(qname_EntityCommonStockSharesOutstanding, allow_nil=False)
+            facts = [fact for fact in filing_profile.facts('EntityCommonStockSharesOutstanding') if not fact.xsi_nil]
             for fact in facts:
                 if fact.context.entity.segment is None:
                     class_of_stock_facts.setdefault(None, []).append(fact)
@@ -871,6 +860,12 @@ def validate(instance_uri, instance, error_log, catalog=xml.Catalog.root_catalog
         error_log.report(xbrl.Error.create('Instance {xbrl} does not appear to be a SEC filing.', xbrl=instance.document_element))
         return
 
+    # The DEI facts and the shared DTS models are computed only once for the EFM and the DQC rules
+    namespaces = dqc_validation.standard_namespaces(instance.dts)
+    filing_profile = dqc_validation.FilingProfile(instance, taxonomy_per_type['dei'][0].target_namespace, *dqc_validation.get_namespace_and_year(namespaces, 'us-gaap'))
+    concept_classifier = dqc_validation.ConceptClassifier(instance.dts, standard_namespace2uris)
+    models = dqc_validation.ModelCache(instance, namespaces, filing_profile=filing_profile, concept_classifier=concept_classifier)
+
     # 6.22 Supported Versions of XBRL Standard Taxonomies
     for prefix, taxonomies in taxonomy_per_type.items():
         if prefix == 'us-gaap':
@@ -938,20 +933,7 @@ def validate(instance_uri, instance, error_log, catalog=xml.Catalog.root_catalog
     # 6.3.11 Attribute xml:base must not appear in any Interactive Data document.
     check_xml_base(instance.document_element, error_log)
 
-    base_to_derived_types = calc_base_to_derived_types(instance.dts.schema)
-
-    domainItemTypes = set()
-    textBlockItemTypes = set()
-    for ns in standard_namespace2uris:
-        domainItemType = instance.dts.schema.resolve_type_definition(('domainItemType', ns))
-        if domainItemType is not None:
-            get_derived_types(base_to_derived_types, domainItemType, domainItemTypes)
-        textBlockItemType = instance.dts.schema.resolve_type_definition(('textBlockItemType', ns))
-        if textBlockItemType is not None:
-            get_derived_types(base_to_derived_types, textBlockItemType, textBlockItemTypes)
-        escapedItemType = instance.dts.schema.resolve_type_definition(('escapedItemType', ns))
-        if escapedItemType is not None:
-            get_derived_types(base_to_derived_types, escapedItemType, textBlockItemTypes)
+    domainItemTypes = concept_classifier.domain_item_types
 
     for doc in instance.dts.documents:
         if doc.uri in standard_mapped_uris:
@@ -1243,7 +1225,7 @@ def validate(instance_uri, instance, error_log, catalog=xml.Catalog.root_catalog
 
     edbody_dtd = parse_edbody_dtd(uri_edbody_dtd, catalog, error_log)
 
-    contextrefs, used_concepts = validate_facts(instance, error_log, catalog, domainItemTypes, textBlockItemTypes, edbody_dtd, instance_uri.endswith('.htm'))
+    contextrefs, used_concepts = validate_facts(instance, error_log, catalog, concept_classifier, edbody_dtd, instance_uri.endswith('.htm'))
 
     for link in instance.footnote_links:
         to_labels = set()
@@ -1306,10 +1288,10 @@ def validate(instance_uri, instance, error_log, catalog=xml.Catalog.root_catalog
             if label_attr.normalized_value not in to_labels:
                 error_log.report(xbrl.Error.create('[EFM.6.5.33] Non-empty footnote {footnote} must be linked to at least one fact.', location=elem, footnote=elem))
 
-    cikValue, required_contexts = validate_contexts(instance, error_log, CIK, contextrefs, used_concepts, standard_namespace2uris)
+    filing_profile.cik, filing_profile.required_contexts = validate_contexts(instance, error_log, CIK, contextrefs, used_concepts, standard_namespace2uris)
     validate_units(instance, error_log)
 
-    validate_required_facts(instance, error_log, taxonomy_per_type, required_contexts, cikValue, cikNames, submissionType)
+    validate_required_facts(instance, error_log, taxonomy_per_type, filing_profile, cikNames, submissionType)
 
     positive_axes = set()
     negative_axis_rels = []
@@ -1715,7 +1697,7 @@ def validate(instance_uri, instance, error_log, catalog=xml.Catalog.root_catalog
     validate_labels(instance_uri, instance.dts, error_log)
 
     if params.get('enableDqcValidation', 'false') == 'true':
-        dqc_validation.validate(instance, error_log, **params)
+        dqc_validation.validate(instance, error_log, models=models, **params)
 
 # Main entry point, will be called by RaptorXML after the DTS discovery from XBRL instance has finished
 
@@ -0,0 +1,321 @@
+# Copyright 2015-2019 Altova GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+__copyright__ = 'Copyright 2015-2019 Altova GmbH'
+__license__ = 'http://www.apache.org/licenses/LICENSE-2.0'
+
+# Helpers shared by the testsuite runner scripts (efm_testsuite.py, dqc_testsuite.py, dqc_testsuite_xule.py) to skip variations whose
+# inputs have not changed and to schedule the remaining variations by their historical runtime.
+#
+# The result cache is a JSON file mapping a digest of the variation meta-information, the contents of its input files, the
+# validation scripts and the runner parameters to the (status, error counts) result of the variation.
+#
+# The timing database is a JSON file mapping variation names to their last measured runtimes. Variations are submitted
+# longest-first (LPT scheduling) so that a slow variation does not end up at the tail of the run.
+#
+# Large runs can be split into shards executed on several hosts (--shard INDEX/COUNT). The CSV reports of all shards are
+# combined again by the merge subcommand of the runners.
+#
+# The testcase files of the testsuite index are parsed concurrently and the resulting testsuite model is pickled to disk, keyed by
+# the digests of the index and all testcase files, so that unchanged testsuites are not parsed again on the next run.
+
+import collections
+import concurrent.futures
+import csv
+import hashlib
+import heapq
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+# Memoized file digests keyed by (path, mtime, size)
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """Returns the SHA-256 hex digest of the file contents or None if the file does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _file_digests_lock:
+        if key in _file_digests:
+            return _file_digests[key]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _file_digests_lock:
+        _file_digests[key] = digest
+    return digest
+
+
+def uri_digest(uri, catalog=None):
+    """Returns the digest of the local file the uri refers to (after catalog resolution). Remote resources are assumed to be immutable and are identified by their uri."""
+    if catalog is not None:
+        uri = catalog.resolve_uri(uri) or uri
+    parts = urllib.parse.urlparse(uri)
+    if parts.scheme == 'file':
+        return file_digest(urllib.request.url2pathname(parts.path.split('%7Czip/')[0].split('|zip/')[0]))
+    if not parts.scheme or len(parts.scheme) == 1:
+        return file_digest(uri)
+    return uri
+
+
+def files_digest(paths):
+    """Returns a combined digest of the given files; directories contribute all files they contain."""
+    h = hashlib.sha256()
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                h.update(('%s=%s\n' % (name, file_digest(os.path.join(path, name)))).encode())
+        else:
+            h.update(('%s=%s\n' % (os.path.basename(path), file_digest(path))).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Persistent cache of variation results keyed by the digests of their inputs."""
+
+    def __init__(self, path, context):
+        self.path = path
+        self.context = json.dumps(context, sort_keys=True)
+        self.results = {}
+        self.updated = False
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.results = json.load(f)
+            except (OSError, ValueError):
+                logging.warning('Ignoring invalid result cache %s', path)
+
+    def key(self, variation, input_digests):
+        """Returns the cache key of a variation given its meta-information and the digests of its input files."""
+        h = hashlib.sha256(self.context.encode())
+        h.update(json.dumps(variation, sort_keys=True, default=str).encode())
+        for digest in input_digests:
+            h.update(('\n%s' % digest).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """Returns the cached (status, error counts) tuple or None."""
+        if key not in self.results:
+            return None
+        status, error_counts = self.results[key]
+        return status, collections.Counter(error_counts)
+
+    def put(self, key, result):
+        status, error_counts = result
+        if status == 'EXCEPTION':
+            # Exceptions are usually caused by the environment and are always re-executed
+            return
+        self.results[key] = [status, dict(error_counts)]
+        self.updated = True
+
+    def save(self):
+        if self.path and self.updated:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.results, f)
+            os.replace(tmp_path, self.path)
+            self.updated = False
+
+
+class TimingDatabase:
+    """Persistent per-variation runtimes used to predict the runtime of future runs."""
+
+    def __init__(self, path):
+        self.path = path
+        self.timings = {}
+        self.updated = False
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.timings = json.load(f)
+            except (OSError, ValueError):
+                logging.warning('Ignoring invalid timing database %s', path)
+
+    def default(self):
+        """Returns the runtime assumed for variations without history, i.e. the mean of all known runtimes."""
+        return sum(self.timings.values()) / len(self.timings) if self.timings else 1.0
+
+    def predict(self, name, default=None):
+        return self.timings.get(name, self.default() if default is None else default)
+
+    def record(self, name, runtime):
+        self.timings[name] = runtime
+        self.updated = True
+
+    def save(self):
+        if self.path and self.updated:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.timings, f, indent=0, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.updated = False
+
+
+def longest_first(tasks, predicted):
+    """Returns the tasks sorted by descending predicted runtime; ties keep their original order."""
+    return [task for _, _, task in sorted(((-predicted(task), i, task) for i, task in enumerate(tasks)), key=lambda x: x[:2])]
+
+
+def predict_makespan(runtimes, workers):
+    """Returns the makespan of greedily assigning the runtimes in the given order to the least loaded of the workers."""
+    loads = [0.0] * max(1, min(workers, len(runtimes)))
+    for runtime in runtimes:
+        heapq.heapreplace(loads, loads[0] + runtime)
+    return max(loads)
+
+
+def timed_call(function, *args):
+    """Calls the function and returns a (result, runtime) tuple. Used as picklable wrapper for worker pools."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def report_makespan(predicted, actual, runtimes, workers):
+    """Reports the predicted and the actual makespan of the executed variations together with the lower bound of total work divided by workers."""
+    if not runtimes:
+        return
+    total = sum(runtimes)
+    logging.info('Makespan: predicted %.1fs, actual %.1fs, total work %.1fs on %d workers (lower bound %.1fs)', predicted, actual, total, workers, max(total / workers, max(runtimes)))
+
+
+def parse_shard(value):
+    """Parses a shard specification INDEX/COUNT (e.g. 2/4, INDEX counting from 1) and returns the (index, count) tuple."""
+    m = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value or '')
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        raise ValueError('Invalid shard %s, expected INDEX/COUNT with 1 <= INDEX <= COUNT' % value)
+    return int(m.group(1)), int(m.group(2))
+
+
+def select_shard(tasks, name, shard, predicted=None):
+    """Returns the tasks belonging to the given (index, count) shard. Tasks are assigned by a stable hash of their name or, if predicted
+    is given, by balancing the predicted runtimes across the shards. All shards must use the same timing database in the latter case."""
+    if shard is None:
+        return tasks
+    index, count = shard
+    if predicted is None:
+        return [task for task in tasks if int(hashlib.sha1(name(task).encode()).hexdigest(), 16) % count == index - 1]
+    loads = [(0.0, i) for i in range(count)]
+    selected = set()
+    for task in sorted(tasks, key=lambda task: (-predicted(task), name(task))):
+        load, i = heapq.heappop(loads)
+        if i == index - 1:
+            selected.add(name(task))
+        heapq.heappush(loads, (load + predicted(task), i))
+    return [task for task in tasks if name(task) in selected]
+
+
+def parse_error_counts(actual):
+    """Parses the actual errors column of a CSV report (e.g. '2xDQC.US.0004.16 other' or '60403 60535') into a Counter."""
+    error_counts = collections.Counter()
+    for token in actual.split():
+        m = re.fullmatch(r'(\d+)x(.+)', token)
+        if m:
+            error_counts[m.group(2)] += int(m.group(1))
+        else:
+            error_counts[token] += 1
+    return error_counts
+
+
+def read_csv_report(path):
+    """Reads the CSV report of a testsuite run and returns the runtime and a dict mapping (testcase number, variation id) to the (status, error counts) result."""
+    results = {}
+    runtime = 0.0
+    with open(path, newline='') as csvfile:
+        rows = csv.reader(csvfile)
+        header = next(rows)
+        columns = {name: i for i, name in enumerate(header)}
+        summary = next(rows)
+        runtime = float(summary[columns['Runtime']])
+        testcase = None
+        for row in rows:
+            cell = lambda name: row[columns[name]] if columns[name] < len(row) else ''
+            if cell('Testcase'):
+                testcase = cell('Testcase')
+            elif cell('Variation'):
+                results[(testcase, cell('Variation'))] = cell('Status'), parse_error_counts(cell('Actual'))
+    return runtime, results
+
+
+def merge_csv_reports(paths, testsuite):
+    """Combines the CSV reports of several shards and returns the results keyed by (testcase uri, variation id) as expected by the report writers
+    together with the runtime of the slowest shard."""
+    testcase_uris = {testcase['number']: testcase['uri'] for testcase in testsuite['testcases']}
+    results = {}
+    runtime = 0.0
+    for path in paths:
+        shard_runtime, shard_results = read_csv_report(path)
+        runtime = max(runtime, shard_runtime)
+        for (number, variation_id), result in shard_results.items():
+            if number not in testcase_uris:
+                logging.warning('Ignoring unknown testcase %s in shard report %s', number, path)
+                continue
+            variation_key = (testcase_uris[number], variation_id)
+            if variation_key in results:
+                logging.warning('Variation %s%s is contained in several shard reports', number, variation_id)
+            results[variation_key] = result
+    return results, runtime
+
+
+def load_testcases(uris, load_testcase, max_workers=None):
+    """Loads the testcase files concurrently and returns the testcases in the order of the uris."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load_testcase, uris))
+
+
+def load_testsuite_model(path, index_uri, context):
+    """Returns the pickled testsuite model if neither the index, nor any of its testcase files, nor the context have changed, otherwise None."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception:
+        logging.warning('Ignoring invalid testsuite cache %s', path)
+        return None
+    if cached.get('index') != index_uri or cached.get('context') != context or cached.get('index_digest') != uri_digest(index_uri):
+        return None
+    for uri, digest in cached['testcase_digests'].items():
+        if uri_digest(uri) != digest:
+            return None
+    return cached['testsuite']
+
+
+def save_testsuite_model(path, index_uri, context, testsuite):
+    """Pickles the testsuite model together with the digests of the index and all testcase files."""
+    if not path:
+        return
+    cached = {
+        'index': index_uri,
+        'context': context,
+        'index_digest': uri_digest(index_uri),
+        'testcase_digests': {testcase['uri']: uri_digest(testcase['uri']) for testcase in testsuite['testcases']},
+        'testsuite': testsuite,
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(cached, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)